@@ -0,0 +1,7 @@
+"""
+Utilidades compartidas por los agentes de GlobalPodcaster.
+
+Los agentes viven en directorios con guiones (no importables como paquete),
+así que cada uno añade ``backend/agents`` a ``sys.path`` antes de importar
+``common``.
+"""
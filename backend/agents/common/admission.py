@@ -0,0 +1,82 @@
+"""
+Admisión de episodios detectados en la cola de procesamiento.
+
+Los monitores no encolan todo lo que encuentran: la cola tiene una marca de
+nivel alto (``QUEUE_HIGH_WATER`` jobs sin terminar) y solo se admiten los
+episodios que caben, los más recientes primero. Los que no caben no se
+marcan como vistos, así que vuelven a detectarse en la siguiente revisión y
+entran al ritmo al que las etapas vacían la cola.
+
+Los jobs admitidos entran con clase ``BACKFILL`` y como tenant su podcast
+(el id del feed en el catálogo), de modo que un feed con cientos de
+episodios no acapara los workers frente al resto.
+
+Un feed revisado por primera vez solo aporta sus ``FEED_BACKFILL_EPISODES``
+episodios más recientes; el resto se da por visto.
+"""
+
+import os
+import time
+from typing import Any, Dict, Iterable, List
+
+from common import events
+from common.artifacts import episode_key
+from common.catalog import default_catalog, published_ts
+from common.jobqueue import BACKFILL, JobQueue
+
+QUEUE_HIGH_WATER = int(os.getenv("QUEUE_HIGH_WATER", "50"))
+FEED_BACKFILL_EPISODES = int(os.getenv("FEED_BACKFILL_EPISODES", "5"))
+
+
+def admit(queue: JobQueue, episodes: List[Dict[str, Any]], target_lang: str = "es",
+          first_time_feeds: Iterable[str] = (), high_water: int = QUEUE_HIGH_WATER,
+          backfill: int = FEED_BACKFILL_EPISODES) -> Dict[str, Any]:
+    """
+    Encola los episodios nuevos (cada uno con ``feed_url``) que quepan bajo la
+    marca de nivel alto. Devuelve las listas ``admitted`` (con ``job_id`` y
+    ``status`` del job) y ``skipped`` (se pueden marcar como vistos) y
+    ``deferred`` (no marcar: se reintentan).
+    """
+    first_time_feeds = set(first_time_feeds)
+    # Más recientes primero; a igual fecha se respeta el orden del feed
+    ordered = sorted(episodes, key=published_ts, reverse=True)
+
+    candidates, skipped = [], []
+    per_feed: Dict[str, int] = {}
+    for ep in ordered:
+        feed_url = ep.get("feed_url")
+        if not ep.get("audio_url"):
+            skipped.append(ep)
+            continue
+        if feed_url in first_time_feeds:
+            per_feed[feed_url] = per_feed.get(feed_url, 0) + 1
+            if per_feed[feed_url] > backfill:
+                skipped.append(ep)
+                continue
+        candidates.append(ep)
+
+    free = max(0, high_water - queue.backlog())
+    admitted, deferred = candidates[:free], candidates[free:]
+    catalog = default_catalog()
+    for ep in admitted:
+        feed_url = ep.get("feed_url")
+        # Prioridad = fecha de publicación: los workers toman antes lo más nuevo
+        ep["job_id"] = job_id = queue.enqueue(
+            episode_key(ep["audio_url"]), ep["audio_url"], target_lang,
+            feed_url=feed_url, title=ep.get("title"),
+            podcast_id=catalog.feed_id(feed_url) if feed_url else None,
+            priority=published_ts(ep) or time.time(), priority_class=BACKFILL,
+        )
+        events.publish(job_id, "detected", {
+            "title": ep.get("title"), "audio_url": ep["audio_url"], "feed_url": ep.get("feed_url"),
+        })
+    # Un episodio ya procesado antes (mismo audio) conserva su job y su estado
+    states = queue.states([ep["job_id"] for ep in admitted])
+    for ep in admitted:
+        ep["status"] = states.get(ep["job_id"])
+    return {
+        "admitted": admitted,
+        "deferred": deferred,
+        "skipped": skipped,
+        "queue": queue.depth(),
+    }
@@ -0,0 +1,339 @@
+"""
+Caché local de artefactos de texto por episodio (transcripción y traducciones).
+
+Los artefactos se guardan en ``STORAGE_DIR/artifacts/<episode_key>/`` para que
+las etapas posteriores (subtítulos, búsqueda, reintentos) los lean sin volver
+a llamar a los proveedores.
+
+Formato: ``<lang>.json.zst``, el Transcript en JSON con los tiempos en deltas
+(enteros pequeños y repetitivos) comprimido con zstd y un diccionario
+entrenado por idioma. Los diccionarios viven en ``artifacts/_dicts/``; el
+primero de cada idioma se entrena solo, en un proceso aparte, al reunir
+``ARTIFACT_DICT_SAMPLES`` muestras (guardar un artefacto no espera al
+entrenamiento) y se puede reentrenar con:
+  python -m common.artifacts train [lang ...]
+El id del diccionario va en la cabecera de cada frame zstd, así que los
+artefactos antiguos se siguen leyendo tras reentrenar. Los ``<lang>.json``
+sin comprimir de versiones anteriores se leen igual.
+
+La cola de trabajos solo guarda referencias (``text_ref``); el texto se
+descomprime cuando alguien lo pide (``load_text``).
+"""
+
+import argparse
+import fcntl
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+import zstandard
+
+from common.media_store import STORAGE_DIR
+from common.transcript import Transcript
+
+ARTIFACTS_SUBDIR = "artifacts"
+ORIGINAL = "original"
+
+ARTIFACT_ZSTD_LEVEL = int(os.getenv("ARTIFACT_ZSTD_LEVEL", "19"))
+ARTIFACT_DICT_SIZE = int(os.getenv("ARTIFACT_DICT_SIZE", str(112 * 1024)))
+# Muestras (prefijos de artefactos) reunidas antes de entrenar el primer diccionario de un idioma
+ARTIFACT_DICT_SAMPLES = int(os.getenv("ARTIFACT_DICT_SAMPLES", "64"))
+_SAMPLE_BYTES = 64 * 1024
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SUFFIX = ".json.zst"
+_LEGACY_SUFFIX = ".json"
+
+# Las claves y los idiomas acaban en rutas: solo se aceptan con esta forma
+_KEY_RE = re.compile(r"[0-9a-f]{16}")
+_LANG_RE = re.compile(r"[A-Za-z0-9_-]{1,32}")
+
+
+def episode_key(audio_url: str) -> str:
+    """Identificador estable de un episodio a partir de su URL de audio."""
+    return hashlib.sha1(audio_url.encode()).hexdigest()[:16]
+
+
+def check_key(key: str) -> str:
+    """Devuelve ``key`` si tiene la forma de ``episode_key``; si no, ValueError."""
+    if not isinstance(key, str) or not _KEY_RE.fullmatch(key):
+        raise ValueError(f"Invalid episode key: {key!r}")
+    return key
+
+
+def check_lang(lang: str) -> str:
+    """Devuelve ``lang`` si es un nombre de idioma válido en una ruta; si no, ValueError."""
+    if not isinstance(lang, str) or not _LANG_RE.fullmatch(lang):
+        raise ValueError(f"Invalid language: {lang!r}")
+    return lang
+
+
+def _episode_dir(key: str) -> str:
+    return os.path.join(STORAGE_DIR, ARTIFACTS_SUBDIR, check_key(key))
+
+
+def _artifact_path(key: str, lang: str) -> str:
+    return os.path.join(_episode_dir(key), f"{check_lang(lang)}{_SUFFIX}")
+
+
+def _dicts_dir() -> str:
+    return os.path.join(STORAGE_DIR, ARTIFACTS_SUBDIR, "_dicts")
+
+
+# --- Serialización compacta ---
+
+def _pack(transcript: Transcript) -> bytes:
+    d = transcript.to_dict()
+    starts, ends = d["starts"], d["ends"]
+    d["v"] = 2
+    # Inicio como delta del anterior y fin como duración de la palabra
+    d["starts"] = [s - p for s, p in zip(starts, [0] + starts[:-1])]
+    d["ends"] = [e - s for e, s in zip(ends, starts)]
+    return json.dumps(d, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _unpack(data: bytes) -> Transcript:
+    d = json.loads(data)
+    if d.pop("v", 1) == 2:
+        starts, total = [], 0
+        for delta in d["starts"]:
+            total += delta
+            starts.append(total)
+        d["ends"] = [s + length for s, length in zip(starts, d["ends"])]
+        d["starts"] = starts
+    return Transcript.from_dict(d)
+
+
+# --- Diccionarios por idioma ---
+
+class _Dictionaries:
+    """
+    Diccionarios cargados bajo demanda: el actual de cada idioma (para
+    comprimir) y cualquiera por id (para descomprimir). Los compresores de
+    zstd no son seguros entre hilos, así que se crea uno por operación.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current_by_lang: Dict[str, Any] = {}
+        self._by_id: Dict[int, Any] = {}
+
+    def _current(self, lang: str) -> Optional[str]:
+        paths = glob.glob(os.path.join(_dicts_dir(), f"{lang}-*.dict"))
+        return max(paths, key=os.path.getmtime) if paths else None
+
+    def _load(self, path: str):
+        with open(path, "rb") as f:
+            dictionary = zstandard.ZstdCompressionDict(f.read())
+        self._by_id[dictionary.dict_id()] = dictionary
+        return dictionary
+
+    def compressor(self, lang: str):
+        with self._lock:
+            dictionary = self._current_by_lang.get(lang)
+            if dictionary is None:
+                path = self._current(lang)
+                if path is not None:
+                    dictionary = self._current_by_lang[lang] = self._load(path)
+                    dictionary.precompute_compress(level=ARTIFACT_ZSTD_LEVEL)
+        if dictionary is None:
+            return zstandard.ZstdCompressor(level=ARTIFACT_ZSTD_LEVEL)
+        return zstandard.ZstdCompressor(dict_data=dictionary)
+
+    def decompressor(self, dict_id: int):
+        dictionary = None
+        if dict_id:
+            with self._lock:
+                dictionary = self._by_id.get(dict_id)
+                if dictionary is None:
+                    paths = glob.glob(os.path.join(_dicts_dir(), f"*-{dict_id}.dict"))
+                    if not paths:
+                        raise FileNotFoundError(f"zstd dictionary {dict_id} not found")
+                    dictionary = self._load(paths[0])
+        return zstandard.ZstdDecompressor(dict_data=dictionary)
+
+    def reset(self, lang: str):
+        with self._lock:
+            self._current_by_lang.pop(lang, None)
+
+
+_dicts = _Dictionaries()
+
+
+def _add_sample(lang: str, data: bytes):
+    """Guarda una muestra mientras el idioma no tiene diccionario; entrena al reunir suficientes."""
+    if _dicts._current(lang) is not None:
+        return
+    sample_dir = os.path.join(_dicts_dir(), "samples", lang)
+    os.makedirs(sample_dir, exist_ok=True)
+    with open(os.path.join(sample_dir, hashlib.sha1(data).hexdigest()[:16]), "wb") as f:
+        f.write(data[:_SAMPLE_BYTES])
+    if len(os.listdir(sample_dir)) >= ARTIFACT_DICT_SAMPLES:
+        start_training(lang)
+
+
+_training_started = set()
+
+
+def start_training(lang: str):
+    """Lanza en segundo plano el entrenamiento del primer diccionario del idioma (una vez por proceso)."""
+    if lang in _training_started:
+        return
+    _training_started.add(lang)
+    subprocess.Popen(
+        [sys.executable, "-m", "common.artifacts", "train", "--if-missing", lang],
+        cwd=AGENTS_DIR,
+        # El hijo corre en AGENTS_DIR: STORAGE_DIR relativo apuntaría a otro sitio
+        env={**os.environ, "STORAGE_DIR": os.path.abspath(STORAGE_DIR)},
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _samples(lang: str) -> List[bytes]:
+    """Muestras para entrenar: las reunidas y, si no hay, los artefactos existentes del idioma."""
+    sample_dir = os.path.join(_dicts_dir(), "samples", lang)
+    paths = glob.glob(os.path.join(sample_dir, "*"))
+    if paths:
+        out = []
+        for path in paths:
+            with open(path, "rb") as f:
+                out.append(f.read())
+        return out
+    out = []
+    for path in glob.glob(os.path.join(STORAGE_DIR, ARTIFACTS_SUBDIR, "*", f"*{_SUFFIX}")):
+        transcript = _read(path)
+        if transcript.lang == lang:
+            out.append(_pack(transcript)[:_SAMPLE_BYTES])
+    return out
+
+
+def train_dictionary(lang: str, if_missing: bool = False) -> Optional[int]:
+    """
+    Entrena (o reentrena) el diccionario de un idioma; devuelve su id. Un
+    entrenamiento por idioma a la vez; con ``if_missing`` no hace nada si el
+    idioma ya tiene diccionario.
+    """
+    os.makedirs(_dicts_dir(), exist_ok=True)
+    with open(os.path.join(_dicts_dir(), f"{lang}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if if_missing and _dicts._current(lang) is not None:
+            return None
+        return _train(lang)
+
+
+def _train(lang: str) -> Optional[int]:
+    samples = _samples(lang)
+    if len(samples) < 8:
+        return None
+    dictionary = zstandard.train_dictionary(ARTIFACT_DICT_SIZE, samples, level=ARTIFACT_ZSTD_LEVEL)
+    path = os.path.join(_dicts_dir(), f"{lang}-{dictionary.dict_id()}.dict")
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(dictionary.as_bytes())
+    os.replace(tmp, path)
+    for sample in glob.glob(os.path.join(_dicts_dir(), "samples", lang, "*")):
+        os.remove(sample)
+    _dicts.reset(lang)
+    return dictionary.dict_id()
+
+
+# --- Lectura y escritura ---
+
+def _read(path: str) -> Transcript:
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(_SUFFIX):
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        data = _dicts.decompressor(dict_id).decompress(data)
+    return _unpack(data)
+
+
+def save_transcript(key: str, transcript: Transcript, lang: str = ORIGINAL) -> str:
+    """Guarda un Transcript (``lang=ORIGINAL`` para el idioma de origen)."""
+    os.makedirs(_episode_dir(key), exist_ok=True)
+    path = _artifact_path(key, lang)
+    data = _pack(transcript)
+    _add_sample(transcript.lang, data)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_dicts.compressor(transcript.lang).compress(data))
+    os.replace(tmp, path)
+    legacy = os.path.join(_episode_dir(key), f"{lang}{_LEGACY_SUFFIX}")
+    if os.path.exists(legacy):
+        os.remove(legacy)
+    return path
+
+
+def load_transcript(key: str, lang: str = ORIGINAL) -> Optional[Transcript]:
+    for path in (_artifact_path(key, lang), os.path.join(_episode_dir(key), f"{lang}{_LEGACY_SUFFIX}")):
+        if os.path.exists(path):
+            return _read(path)
+    return None
+
+
+def list_languages(key: str) -> List[str]:
+    """Idiomas guardados para un episodio (incluye ``ORIGINAL`` si existe)."""
+    directory = _episode_dir(key)
+    if not os.path.isdir(directory):
+        return []
+    langs = set()
+    for name in os.listdir(directory):
+        for suffix in (_SUFFIX, _LEGACY_SUFFIX):
+            if name.endswith(suffix):
+                langs.add(name[:-len(suffix)])
+                break
+    return sorted(langs)
+
+
+# --- Referencias ---
+
+def text_ref(key: str, transcript: Transcript, lang: str = ORIGINAL) -> Dict[str, Any]:
+    """Guarda el artefacto y devuelve la referencia que se guarda en la cola."""
+    path = save_transcript(key, transcript, lang)
+    return {"artifact": lang, "lang": transcript.lang, "chars": len(transcript.text),
+            "bytes": os.path.getsize(path)}
+
+
+def load_text(key: str, result: Optional[Dict[str, Any]]) -> Optional[Transcript]:
+    """
+    Transcript de un resultado de etapa: lo descomprime desde el artefacto
+    referenciado o, en jobs anteriores a las referencias, lo toma del propio
+    resultado (``model``/``text``).
+    """
+    if not result:
+        return None
+    if "artifact" in result:
+        return load_transcript(key, result["artifact"])
+    if result.get("model"):
+        return Transcript.from_dict(result["model"])
+    if result.get("text"):
+        return Transcript.from_text(result["text"])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diccionarios zstd de los artefactos de texto")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="(re)entrena el diccionario de los idiomas indicados o de todos")
+    train.add_argument("langs", nargs="*")
+    train.add_argument("--if-missing", action="store_true", help="solo los idiomas sin diccionario")
+    args = parser.parse_args()
+
+    langs = args.langs
+    if not langs:
+        langs = sorted({_read(path).lang for path in
+                        glob.glob(os.path.join(STORAGE_DIR, ARTIFACTS_SUBDIR, "*", f"*{_SUFFIX}"))})
+    print(json.dumps({lang: train_dictionary(lang, args.if_missing) for lang in langs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Segmentación de audio por silencios (VAD basado en energía).
+
+Decodifica el audio a PCM mono de 16 bits con ffmpeg, calcula la energía RMS
+por tramas con NumPy y corta el episodio en los silencios más cercanos a la
+duración objetivo. Cada segmento se clasifica como ``speech``, ``music`` o
+``silence`` para que el agente de transcripción pueda omitir los que no
+tienen voz.
+"""
+
+import io
+import os
+import subprocess
+import wave
+from typing import List, NamedTuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+
+# Duración objetivo/máxima de cada segmento y silencio mínimo para cortar
+SEGMENT_TARGET_S = float(os.getenv("TRANSCRIBE_SEGMENT_SECONDS", "300"))
+SEGMENT_MAX_S = float(os.getenv("TRANSCRIBE_SEGMENT_MAX_SECONDS", "480"))
+MIN_SILENCE_S = float(os.getenv("TRANSCRIBE_MIN_SILENCE_SECONDS", "0.4"))
+
+# Umbral de silencio relativo a la mediana de energía, con un mínimo absoluto
+SILENCE_RATIO = 0.1
+SILENCE_FLOOR = 50.0
+
+# La voz tiene muchas tramas de baja energía (pausas entre sílabas); la
+# música mantiene la energía estable. Por debajo de este ratio es música.
+MUSIC_LOW_ENERGY_RATIO = 0.08
+
+# Bloques de tramas procesados a la vez para no duplicar en float32 todo el PCM
+_ENERGY_BLOCK_FRAMES = 20000
+
+
+class Segment(NamedTuple):
+    start: float  # segundos
+    end: float
+    kind: str  # "speech" | "music" | "silence"
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+def decode_pcm(source: str, sample_rate: int = SAMPLE_RATE) -> np.ndarray:
+    """Decodifica una URL o fichero a PCM int16 mono usando ffmpeg."""
+    cmd = [
+        "ffmpeg", "-nostdin", "-loglevel", "error",
+        "-i", source,
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed for {source}: {proc.stderr.decode(errors='replace')}")
+    return np.frombuffer(proc.stdout, dtype=np.int16)
+
+
+def frame_energy(pcm: np.ndarray, sample_rate: int = SAMPLE_RATE, frame_ms: int = FRAME_MS) -> np.ndarray:
+    """Energía RMS por trama (float32), calculada por bloques."""
+    frame_len = sample_rate * frame_ms // 1000
+    n_frames = len(pcm) // frame_len
+    frames = pcm[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.empty(n_frames, dtype=np.float32)
+    for i in range(0, n_frames, _ENERGY_BLOCK_FRAMES):
+        block = frames[i:i + _ENERGY_BLOCK_FRAMES].astype(np.float32)
+        rms[i:i + _ENERGY_BLOCK_FRAMES] = np.sqrt(np.mean(block * block, axis=1))
+    return rms
+
+
+def silence_threshold(rms: np.ndarray) -> float:
+    if len(rms) == 0:
+        return SILENCE_FLOOR
+    return max(SILENCE_FLOOR, float(np.median(rms)) * SILENCE_RATIO)
+
+
+def find_silences(rms: np.ndarray, threshold: float, min_frames: int) -> np.ndarray:
+    """Devuelve un array (N, 2) con los rangos [inicio, fin) de tramas en silencio."""
+    quiet = np.concatenate(([False], rms < threshold, [False]))
+    edges = np.flatnonzero(np.diff(quiet.astype(np.int8)))
+    runs = edges.reshape(-1, 2)
+    return runs[(runs[:, 1] - runs[:, 0]) >= min_frames]
+
+
+def classify(rms: np.ndarray, threshold: float) -> str:
+    """Clasifica un tramo de energía como voz, música o silencio."""
+    if len(rms) == 0 or np.mean(rms >= threshold) < 0.05:
+        return "silence"
+    low_energy_ratio = float(np.mean(rms < 0.5 * np.mean(rms)))
+    if low_energy_ratio < MUSIC_LOW_ENERGY_RATIO:
+        return "music"
+    return "speech"
+
+
+def plan_segments(
+    pcm: np.ndarray,
+    sample_rate: int = SAMPLE_RATE,
+    target_s: float = SEGMENT_TARGET_S,
+    max_s: float = SEGMENT_MAX_S,
+    min_silence_s: float = MIN_SILENCE_S,
+) -> List[Segment]:
+    """
+    Calcula los puntos de corte del episodio.
+
+    Se corta en el centro del silencio más cercano a ``target_s`` desde el
+    último corte; si no hay silencios antes de ``max_s`` se corta en la
+    trama de menor energía de la ventana.
+    """
+    rms = frame_energy(pcm, sample_rate)
+    if len(rms) == 0:
+        return []
+    frame_s = FRAME_MS / 1000.0
+    threshold = silence_threshold(rms)
+    silences = find_silences(rms, threshold, max(1, int(min_silence_s / frame_s)))
+    cut_candidates = (silences[:, 0] + silences[:, 1]) // 2
+
+    target = int(target_s / frame_s)
+    max_frames = int(max_s / frame_s)
+    total = len(rms)
+    cuts = [0]
+    while total - cuts[-1] > max_frames:
+        start = cuts[-1]
+        window = cut_candidates[(cut_candidates > start) & (cut_candidates <= start + max_frames)]
+        if len(window):
+            cut = int(window[np.argmin(np.abs(window - (start + target)))])
+        else:
+            lo = start + target // 2
+            cut = lo + int(np.argmin(rms[lo:start + max_frames]))
+        cuts.append(cut)
+    cuts.append(total)
+
+    segments = []
+    for a, b in zip(cuts[:-1], cuts[1:]):
+        segments.append(Segment(a * frame_s, b * frame_s, classify(rms[a:b], threshold)))
+    return segments
+
+
+def to_wav_bytes(pcm: np.ndarray, start_s: float, end_s: float, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """Empaqueta un tramo del PCM como WAV en memoria."""
+    chunk = pcm[int(start_s * sample_rate):int(end_s * sample_rate)]
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(chunk.tobytes())
+    return buf.getvalue()
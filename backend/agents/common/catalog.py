@@ -0,0 +1,352 @@
+"""
+Catálogo local de feeds, episodios, transcripciones y traducciones.
+
+Los monitores indexan cada entrada que descargan y el pipeline añade los
+textos según se completan las etapas, así que listar los episodios de un
+feed o buscar "qué episodios mencionan X" se resuelve contra SQLite (FTS5)
+sin volver a descargar nada.
+"""
+
+import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from common.artifacts import episode_key, load_text
+from common.db import connect, db_path
+from common.projection import decode_cursor, encode_cursor
+
+# Tipos de texto indexados por episodio
+META, TRANSCRIPT, TRANSLATION = "meta", "transcript", "translation"
+
+
+def published_ts(episode: Dict[str, Any]) -> float:
+    """Fecha de publicación (RFC 822 en RSS) como epoch; 0 si no se puede leer."""
+    try:
+        return parsedate_to_datetime(episode.get("published") or "").timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def fts_query(q: str) -> str:
+    """Convierte la búsqueda del usuario en términos FTS5 literales (sin operadores)."""
+    terms = ['"' + term.replace('"', '""') + '"' for term in q.split()]
+    return " ".join(terms)
+
+
+class Catalog:
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.RLock()
+        self.conn = connect(path or db_path("catalog.db"))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS feeds (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                title TEXT,
+                episode_count INTEGER NOT NULL DEFAULT 0,
+                indexed REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS episodes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                episode_key TEXT NOT NULL UNIQUE,
+                feed_url TEXT,
+                guid TEXT,
+                title TEXT,
+                published TEXT,
+                published_ts REAL NOT NULL DEFAULT 0,
+                audio_url TEXT NOT NULL,
+                indexed REAL NOT NULL
+            );
+            -- Orden de los listados (published_ts, id): la paginación por cursor
+            -- busca en el índice en lugar de recorrer y ordenar la tabla
+            DROP INDEX IF EXISTS episodes_feed;
+            CREATE INDEX IF NOT EXISTS episodes_feed_page ON episodes (feed_url, published_ts DESC, id DESC);
+            CREATE INDEX IF NOT EXISTS episodes_page ON episodes (published_ts DESC, id DESC);
+            CREATE TABLE IF NOT EXISTS texts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                episode_id INTEGER NOT NULL REFERENCES episodes (id),
+                kind TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                body TEXT NOT NULL,
+                UNIQUE (episode_id, kind, lang)
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(
+                body, content='texts', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+            );
+            CREATE TRIGGER IF NOT EXISTS texts_ai AFTER INSERT ON texts BEGIN
+                INSERT INTO texts_fts (rowid, body) VALUES (new.id, new.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS texts_ad AFTER DELETE ON texts BEGIN
+                INSERT INTO texts_fts (texts_fts, rowid, body) VALUES ('delete', old.id, old.body);
+            END;
+            CREATE TRIGGER IF NOT EXISTS texts_au AFTER UPDATE ON texts BEGIN
+                INSERT INTO texts_fts (texts_fts, rowid, body) VALUES ('delete', old.id, old.body);
+                INSERT INTO texts_fts (rowid, body) VALUES (new.id, new.body);
+            END;
+        """)
+
+    # --- Escritura incremental ---
+
+    def _upsert_episode(self, feed_url: Optional[str], entry: Dict[str, Any], now: float,
+                        meta: bool = True) -> int:
+        audio_url = entry["audio_url"]
+        key = episode_key(audio_url)
+        self.conn.execute(
+            "INSERT INTO episodes (episode_key, feed_url, guid, title, published, published_ts, audio_url, indexed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (episode_key) DO UPDATE SET "
+            "feed_url = COALESCE(excluded.feed_url, feed_url), guid = COALESCE(excluded.guid, guid), "
+            "title = COALESCE(excluded.title, title), published = COALESCE(excluded.published, published), "
+            "published_ts = MAX(excluded.published_ts, published_ts), indexed = excluded.indexed",
+            (key, feed_url, entry.get("guid"), entry.get("title"), entry.get("published"),
+             published_ts(entry), audio_url, now),
+        )
+        episode_id = self.conn.execute("SELECT id FROM episodes WHERE episode_key = ?", (key,)).fetchone()["id"]
+        body = "\n".join(part for part in (entry.get("title"), entry.get("summary")) if part)
+        if meta and body:
+            self._set_text(episode_id, META, "", body)
+        return episode_id
+
+    def _set_text(self, episode_id: int, kind: str, lang: str, body: str):
+        self.conn.execute(
+            "INSERT INTO texts (episode_id, kind, lang, body) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (episode_id, kind, lang) DO UPDATE SET body = excluded.body "
+            "WHERE body != excluded.body",
+            (episode_id, kind, lang, body),
+        )
+
+    def index_feed(self, feed_url: str, entries: Iterable[Dict[str, Any]], title: Optional[str] = None) -> int:
+        """Indexa (o actualiza) las entradas de un feed recién descargado en una transacción."""
+        now = time.time()
+        count = 0
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry in entries:
+                    if entry.get("audio_url"):
+                        self._upsert_episode(feed_url, entry, now)
+                        count += 1
+                self.conn.execute(
+                    "INSERT INTO feeds (url, title, indexed) VALUES (?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                    "title = COALESCE(excluded.title, title), indexed = excluded.indexed",
+                    (feed_url, title, now),
+                )
+                self.conn.execute(
+                    "UPDATE feeds SET episode_count = (SELECT COUNT(*) FROM episodes WHERE feed_url = ?) "
+                    "WHERE url = ?", (feed_url, feed_url),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def index_text(self, episode: Dict[str, Any], kind: str, lang: str, body: str):
+        """Añade la transcripción o una traducción de un episodio (lo crea si no estaba)."""
+        if not body:
+            return
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                episode_id = self._upsert_episode(episode.get("feed_url"), episode, time.time(), meta=False)
+                self._set_text(episode_id, kind, lang, body)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def index_metadata(self, items: Iterable[Tuple[Dict[str, Any], str, str]], lang: str) -> int:
+        """
+        Indexa el título y la descripción traducidos (``(entrada, título,
+        descripción)``) como texto ``meta`` del idioma, en una transacción.
+        """
+        count = 0
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for entry, title, summary in items:
+                    if not entry.get("audio_url") or not (title or summary):
+                        continue
+                    row = self.conn.execute(
+                        "SELECT id FROM episodes WHERE episode_key = ?", (episode_key(entry["audio_url"]),)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    # Siempre dos partes: la primera línea es el título
+                    self._set_text(row["id"], META, lang, f"{title}\n{summary}")
+                    count += 1
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def metadata(self, episode_keys: List[str], lang: str) -> Dict[str, Dict[str, str]]:
+        """Título y descripción traducidos a ``lang`` de los episodios que los tengan."""
+        if not episode_keys or not lang:
+            return {}
+        marks = ", ".join("?" * len(episode_keys))
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT e.episode_key, t.body FROM episodes e JOIN texts t ON t.episode_id = e.id "
+                f"WHERE t.kind = ? AND t.lang = ? AND e.episode_key IN ({marks})", [META, lang] + list(episode_keys),
+            ).fetchall()
+        out = {}
+        for row in rows:
+            title, _, summary = row["body"].partition("\n")
+            out[row["episode_key"]] = {"title": title, "summary": summary}
+        return out
+
+    def localize(self, items: List[Dict[str, Any]], lang: Optional[str]) -> List[Dict[str, Any]]:
+        """Añade ``translated_title`` y ``translated_summary`` a los episodios ya traducidos."""
+        translated = self.metadata([item["episode_key"] for item in items], lang)
+        for item in items:
+            meta = translated.get(item["episode_key"])
+            if meta is not None:
+                item["translated_title"] = meta["title"] or None
+                item["translated_summary"] = meta["summary"] or None
+        return items
+
+    def feed_id(self, feed_url: str) -> int:
+        """Id estable del feed (lo registra si aún no estaba); es el ``podcast_id`` por defecto."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO feeds (url, indexed) VALUES (?, ?) ON CONFLICT (url) DO NOTHING", (feed_url, time.time())
+            )
+            return self.conn.execute("SELECT id FROM feeds WHERE url = ?", (feed_url,)).fetchone()["id"]
+
+    # --- Consultas ---
+
+    def list_feeds(self, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT url, title, episode_count, indexed FROM feeds ORDER BY id LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def list_episodes(self, feed_url: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        """Episodios (de un feed o de todos), los más recientes primero."""
+        where, params = "", []
+        if feed_url:
+            where, params = "WHERE feed_url = ?", [feed_url]
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT episode_key, feed_url, guid, title, published, audio_url FROM episodes {where} "
+                "ORDER BY published_ts DESC, id DESC LIMIT ? OFFSET ?", params + [limit, offset],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def page_episodes(self, feed_url: Optional[str] = None, limit: int = 50,
+                      cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Como ``list_episodes`` pero paginado por cursor (clave ``published_ts``,
+        ``id``): cada página es una búsqueda en el índice, no un ``OFFSET``.
+        """
+        key = decode_cursor(cursor)
+        where, params = [], []
+        if feed_url:
+            where.append("feed_url = ?")
+            params.append(feed_url)
+        if key is not None:
+            if len(key) != 2:
+                raise ValueError(f"Invalid cursor: {cursor}")
+            # Comparación de filas: SQLite la resuelve como un rango del índice
+            where.append("(published_ts, id) < (?, ?)")
+            params += [key[0], key[1]]
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT id, published_ts, episode_key, feed_url, guid, title, published, audio_url FROM episodes "
+                f"{clause} ORDER BY published_ts DESC, id DESC LIMIT ?", params + [limit],
+            ).fetchall()
+        items = [dict(row) for row in rows]
+        next_cursor = encode_cursor((items[-1]["published_ts"], items[-1]["id"])) if len(items) == limit else None
+        for item in items:
+            del item["id"], item["published_ts"]
+        return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+    def get_episode(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, episode_key, feed_url, guid, title, published, audio_url FROM episodes "
+                "WHERE episode_key = ?", (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            texts = self.conn.execute(
+                "SELECT kind, lang, body FROM texts WHERE episode_id = ? AND kind != ?", (row["id"], META)
+            ).fetchall()
+        episode = dict(row)
+        del episode["id"]
+        episode["transcripts"] = {t["lang"]: t["body"] for t in texts if t["kind"] == TRANSCRIPT}
+        episode["translations"] = {t["lang"]: t["body"] for t in texts if t["kind"] == TRANSLATION}
+        return episode
+
+    def search(self, q: str, lang: Optional[str] = None, feed_url: Optional[str] = None,
+               limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """
+        Episodios cuyo título, descripción, transcripción o traducción
+        contiene los términos, por relevancia (bm25), con un fragmento.
+        """
+        query = fts_query(q)
+        if not query:
+            return []
+        where, params = "texts_fts MATCH ?", [query]
+        if lang:
+            where += " AND (t.lang = ? OR t.kind = ?)"
+            params += [lang, META]
+        if feed_url:
+            where += " AND e.feed_url = ?"
+            params.append(feed_url)
+        # Un resultado por episodio: el texto (título, transcripción...) mejor puntuado
+        with self._lock:
+            rows = self.conn.execute(
+                "WITH hits AS MATERIALIZED ("
+                " SELECT e.episode_key, e.feed_url, e.title, e.published, e.audio_url, t.kind, t.lang,"
+                " snippet(texts_fts, 0, '[', ']', '…', 12) AS snippet, bm25(texts_fts) AS rank"
+                " FROM texts_fts JOIN texts t ON t.id = texts_fts.rowid JOIN episodes e ON e.id = t.episode_id"
+                f" WHERE {where}) "
+                "SELECT episode_key, feed_url, title, published, audio_url, kind, lang, snippet FROM ("
+                " SELECT *, ROW_NUMBER() OVER (PARTITION BY episode_key ORDER BY rank) AS n FROM hits"
+                ") WHERE n = 1 ORDER BY rank LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+_catalog: Optional[Catalog] = None
+
+
+def default_catalog() -> Catalog:
+    global _catalog
+    if _catalog is None:
+        _catalog = Catalog()
+    return _catalog
+
+
+def index_feed(feed_url: str, entries: Iterable[Dict[str, Any]], title: Optional[str] = None) -> int:
+    """Indexa las entradas de un feed; un fallo aquí no impide admitir sus episodios."""
+    try:
+        return default_catalog().index_feed(feed_url, entries, title)
+    except Exception as e:
+        print(f"WARNING: catalog indexing failed for feed {feed_url}: {e}", file=sys.stderr)
+        return 0
+
+
+def index_stage(job: Dict[str, Any], stage: str, result: Any):
+    """Indexa el texto producido por una etapa; un fallo aquí no detiene el pipeline."""
+    if stage == "transcribe":
+        kind = TRANSCRIPT
+    elif stage == "translate":
+        kind = TRANSLATION
+    else:
+        return
+    try:
+        transcript = load_text(job["episode_key"], result)
+        if transcript is None:
+            return
+        lang = job["target_lang"] if kind == TRANSLATION else transcript.lang or "und"
+        default_catalog().index_text(job, kind, lang, transcript.text)
+    except Exception as e:
+        print(f"WARNING: catalog indexing failed for job {job['id']}: {e}", file=sys.stderr)
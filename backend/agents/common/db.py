@@ -0,0 +1,36 @@
+"""
+Conexiones SQLite compartidas por los agentes.
+
+Todas las bases de datos de estado viven en ``DATA_DIR`` (por defecto
+``backend/data``), una ruta absoluta para que procesos lanzados desde
+directorios distintos compartan los mismos ficheros.
+"""
+
+import os
+import sqlite3
+
+DATA_DIR = os.getenv(
+    "DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "data"),
+)
+
+
+def db_path(name: str) -> str:
+    return os.path.abspath(os.path.join(DATA_DIR, name))
+
+
+def connect(path: str, timeout: float = 30.0) -> sqlite3.Connection:
+    """
+    Abre una conexión en modo WAL (lectores y un escritor concurrentes entre
+    procesos). ``isolation_level=None`` deja las transacciones en manos del
+    llamador (``BEGIN IMMEDIATE`` para lecturas-modificación atómicas).
+
+    La conexión puede usarse desde varios hilos; quien la comparta debe
+    serializar el acceso con un lock.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.row_factory = sqlite3.Row
+    return conn
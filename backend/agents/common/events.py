@@ -0,0 +1,94 @@
+"""
+Eventos de progreso por episodio.
+
+Las etapas del pipeline (y los agentes que reciben ``job_id``) añaden
+eventos a la tabla ``events`` de jobs.db; la API los sirve por SSE a partir
+del último id que vio el cliente. Los resultados parciales (bloques
+traducidos, URL del audio) viajan en el propio evento; transcripción y
+traducción completas solo como referencia (idioma y tamaño), el texto se
+pide aparte a ``/jobs/{id}/transcript`` o ``/jobs/{id}/translation``.
+"""
+
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from common.db import connect, db_path
+
+# Evento publicado al empezar cada etapa y al completarla
+STAGE_STARTED = {
+    "transcribe": "transcribing",
+    "translate": "translating",
+    "tts": "synthesizing",
+    "subtitles": "subtitling",
+}
+TERMINAL_EVENTS = ("done", "failed")
+
+
+def stage_payload(stage: str, result: Any) -> Dict[str, Any]:
+    """Resultado parcial que acompaña al evento de fin de etapa."""
+    result = result or {}
+    if stage == "transcribe":
+        return {"transcript": {k: result.get(k) for k in ("lang", "chars")}}
+    if stage == "translate":
+        return {"translation": {k: result.get(k) for k in ("lang", "chars")}}
+    if stage == "tts":
+        return {"audio_url": result.get("audio_url")}
+    if stage == "subtitles":
+        return {"subtitles": result}
+    return {}
+
+
+class EventLog:
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("jobs.db"))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id INTEGER NOT NULL,
+                event TEXT NOT NULL,
+                data TEXT NOT NULL DEFAULT '{}',
+                ts REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS events_job ON events (job_id, id);
+        """)
+
+    def publish(self, job_id: int, event: str, data: Optional[Dict[str, Any]] = None) -> int:
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO events (job_id, event, data, ts) VALUES (?, ?, ?, ?)",
+                (job_id, event, json.dumps(data or {}), time.time()),
+            )
+            return cur.lastrowid
+
+    def since(self, after_id: int = 0, job_id: Optional[int] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Eventos con id mayor que ``after_id`` (de un job o de todos), en orden."""
+        where, params = "id > ?", [after_id]
+        if job_id is not None:
+            where += " AND job_id = ?"
+            params.append(job_id)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM events WHERE {where} ORDER BY id LIMIT ?", params + [limit]
+            ).fetchall()
+        events = []
+        for row in rows:
+            event = dict(row)
+            event["data"] = json.loads(event["data"])
+            events.append(event)
+        return events
+
+
+_log: Optional[EventLog] = None
+
+
+def publish(job_id: Optional[int], event: str, data: Optional[Dict[str, Any]] = None):
+    """Publica en el log por defecto; sin ``job_id`` (llamada suelta a un agente) no hace nada."""
+    global _log
+    if job_id is None:
+        return
+    if _log is None:
+        _log = EventLog()
+    _log.publish(job_id, event, data)
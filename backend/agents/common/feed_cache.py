@@ -0,0 +1,127 @@
+"""
+Caché en disco de feeds ya analizados, compartida por todos los agentes.
+
+Cada URL se guarda una vez analizada (JSON comprimido con zlib) junto con
+sus validadores HTTP (ETag / Last-Modified). Durante ``FEED_CACHE_TTL``
+segundos se sirve sin tocar la red; después se revalida con una petición
+condicional y un 304 reutiliza las entradas sin volver a analizarlas. Un
+lock de fichero por URL hace que procesos simultáneos descarguen una sola
+vez.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+import zlib
+from typing import Any, Dict, List, Optional
+
+import feedparser
+
+from common.db import DATA_DIR
+
+FEED_CACHE_DIR = os.path.abspath(os.getenv("FEED_CACHE_DIR", os.path.join(DATA_DIR, "feed_cache")))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "20"))
+FEED_FETCH_TIMEOUT = float(os.getenv("FEED_FETCH_TIMEOUT", "30"))
+FEED_MAX_BYTES = int(os.getenv("FEED_MAX_BYTES", str(20 * 1024 * 1024)))
+USER_AGENT = "GlobalPodcaster/1.0"
+
+
+def _paths(url: str):
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    directory = os.path.join(FEED_CACHE_DIR, digest[:2])
+    return os.path.join(directory, digest + ".json.z"), os.path.join(directory, digest + ".lock")
+
+
+def _read(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            return json.loads(zlib.decompress(f.read()))
+    except (OSError, ValueError, zlib.error):
+        return None
+
+
+def _write(path: str, record: Dict[str, Any]):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(zlib.compress(json.dumps(record, separators=(",", ":")).encode(), 6))
+    os.replace(tmp, path)
+
+
+def _entry(entry) -> Dict[str, Any]:
+    """Campos de una entrada que usan los agentes (audio: primer enclosure audio/*)."""
+    enclosures = entry.get("enclosures") or []
+    audio = next((e for e in enclosures if e.get("type", "").startswith("audio/")), None)
+    if audio is None and enclosures:
+        audio = enclosures[0]
+    return {
+        "guid": entry.get("id") or entry.get("link", ""),
+        "title": entry.get("title"),
+        "link": entry.get("link"),
+        "published": entry.get("published"),
+        "summary": entry.get("summary"),
+        "audio_url": audio.get("href") if audio else None,
+    }
+
+
+def _download(url: str, record: Optional[Dict[str, Any]], max_bytes: int):
+    """Descarga condicional; devuelve el cuerpo o None si el servidor respondió 304."""
+    headers = {"User-Agent": USER_AGENT}
+    if record and record.get("etag"):
+        headers["If-None-Match"] = record["etag"]
+    if record and record.get("modified"):
+        headers["If-Modified-Since"] = record["modified"]
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=FEED_FETCH_TIMEOUT) as r:
+            body = r.read(max_bytes + 1)
+            validators = {"etag": r.headers.get("ETag"), "modified": r.headers.get("Last-Modified")}
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and record:
+            return None, {}
+        raise
+    if len(body) > max_bytes:
+        raise ValueError(f"feed larger than {max_bytes} bytes")
+    return body, validators
+
+
+def fetch_feed(url: str, ttl: float = FEED_CACHE_TTL, max_bytes: int = FEED_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Feed analizado: ``{url, title, entries, bytes, etag, modified, fetched}``.
+    ``ttl=0`` fuerza la revalidación (que sigue pudiendo resolverse con un 304).
+    """
+    path, lock_path = _paths(url)
+    record = _read(path)
+    if record and time.time() - record["fetched"] < ttl:
+        return record
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # Otro proceso pudo refrescarla mientras esperábamos el lock
+        record = _read(path)
+        if record and time.time() - record["fetched"] < ttl:
+            return record
+        body, validators = _download(url, record, max_bytes)
+        if body is None:
+            record["fetched"] = time.time()
+        else:
+            feed = feedparser.parse(body)
+            if feed.bozo and not feed.entries:
+                raise ValueError(f"not a valid feed: {feed.bozo_exception}")
+            record = {
+                "url": url,
+                "title": feed.feed.get("title"),
+                "entries": [_entry(e) for e in feed.entries],
+                "bytes": len(body),
+                "fetched": time.time(),
+                **validators,
+            }
+        _write(path, record)
+    return record
+
+
+def fetch_entries(url: str, ttl: float = FEED_CACHE_TTL) -> List[Dict[str, Any]]:
+    return fetch_feed(url, ttl)["entries"]
@@ -0,0 +1,191 @@
+"""
+Registro persistente de feeds.
+
+Sustituye a ``feeds.txt`` (que se importa una vez al crear el registro).
+Los feeds se dan de alta en lote, desde una lista de URLs o un OPML, tras
+validarlos en paralelo: que respondan, que sean RSS con episodios de audio
+y que el documento no supere ``FEED_MAX_BYTES``. El monitor carga la lista
+una vez y solo la vuelve a leer cuando otro proceso modifica el registro.
+
+CLI:
+    python -m common.feed_registry import suscripciones.opml
+    python -m common.feed_registry add https://example.com/rss ...
+    python -m common.feed_registry list
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from common.db import connect, db_path
+from common.feed_cache import fetch_feed
+
+FEED_VALIDATE_CONCURRENCY = int(os.getenv("FEED_VALIDATE_CONCURRENCY", "32"))
+
+ACTIVE, INVALID = "active", "invalid"
+
+
+def parse_opml(data: bytes) -> List[Dict[str, str]]:
+    """Feeds (``url``, ``title``) de un OPML, incluidos los de carpetas anidadas."""
+    root = ET.fromstring(data)
+    feeds = []
+    for outline in root.iter("outline"):
+        url = outline.get("xmlUrl")
+        if url:
+            feeds.append({"url": url.strip(), "title": outline.get("title") or outline.get("text")})
+    return feeds
+
+
+def validate_feed(url: str) -> Dict[str, Any]:
+    """Descarga (a través de la caché de feeds) y analiza un feed; ``error`` es None si es válido."""
+    result: Dict[str, Any] = {"url": url, "title": None, "episodes": 0, "audio_episodes": 0,
+                              "bytes": 0, "error": None}
+    try:
+        feed = fetch_feed(url)
+        result["title"] = feed["title"]
+        result["bytes"] = feed["bytes"]
+        result["episodes"] = len(feed["entries"])
+        result["audio_episodes"] = sum(1 for entry in feed["entries"] if entry["audio_url"])
+        if not result["audio_episodes"]:
+            raise ValueError("no audio enclosures")
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def validate_many(urls: Iterable[str], concurrency: int = FEED_VALIDATE_CONCURRENCY) -> List[Dict[str, Any]]:
+    """Valida los feeds en paralelo (E/S de red), conservando el orden."""
+    urls = list(dict.fromkeys(urls))
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(urls))) as pool:
+        return list(pool.map(validate_feed, urls))
+
+
+class FeedRegistry:
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("feeds.db"))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS feeds (
+                url TEXT PRIMARY KEY,
+                title TEXT,
+                status TEXT NOT NULL,
+                episodes INTEGER NOT NULL DEFAULT 0,
+                audio_episodes INTEGER NOT NULL DEFAULT 0,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                added REAL NOT NULL,
+                validated REAL
+            )
+        """)
+        self._version = None
+        self._active: List[str] = []
+
+    def save(self, results: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Guarda resultados de ``validate_feed`` en una sola transacción."""
+        now = time.time()
+        counts = {ACTIVE: 0, INVALID: 0}
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                for r in results:
+                    status = INVALID if r.get("error") else ACTIVE
+                    counts[status] += 1
+                    self.conn.execute(
+                        "INSERT INTO feeds (url, title, status, episodes, audio_episodes, bytes, error, added, validated) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                        "title = COALESCE(excluded.title, title), status = excluded.status, "
+                        "episodes = excluded.episodes, audio_episodes = excluded.audio_episodes, "
+                        "bytes = excluded.bytes, error = excluded.error, validated = excluded.validated",
+                        (r["url"], r.get("title"), status, r.get("episodes", 0), r.get("audio_episodes", 0),
+                         r.get("bytes", 0), r.get("error"), now, r.get("validated", now)),
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self._version = None  # data_version no refleja los cambios de esta conexión
+        return counts
+
+    def add(self, urls: Iterable[str]) -> Dict[str, Any]:
+        """Valida en paralelo y registra un lote de feeds."""
+        results = validate_many(urls)
+        counts = self.save(results)
+        return {"added": counts[ACTIVE], "invalid": counts[INVALID],
+                "errors": {r["url"]: r["error"] for r in results if r["error"]}}
+
+    def remove(self, url: str) -> bool:
+        with self._lock:
+            self._version = None
+            return self.conn.execute("DELETE FROM feeds WHERE url = ?", (url,)).rowcount > 0
+
+    def list(self, status: Optional[str] = None, limit: int = -1, offset: int = 0) -> List[Dict[str, Any]]:
+        where, params = "", []
+        if status:
+            where, params = "WHERE status = ?", [status]
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM feeds {where} ORDER BY added, rowid LIMIT ? OFFSET ?", params + [limit, offset]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) AS n FROM feeds").fetchone()["n"]
+
+    def active_urls(self) -> List[str]:
+        """
+        URLs activas. Se leen de la base de datos solo si otro proceso la
+        modificó desde la última lectura (``PRAGMA data_version``).
+        """
+        with self._lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._version:
+                rows = self.conn.execute(
+                    "SELECT url FROM feeds WHERE status = ? ORDER BY added, rowid", (ACTIVE,)
+                ).fetchall()
+                self._active = [row["url"] for row in rows]
+                self._version = version
+            return list(self._active)
+
+    def migrate_feeds_txt(self, path: str) -> int:
+        """Importa ``feeds.txt`` (sin validar: ya estaban en uso) si el registro está vacío."""
+        if self.count() or not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        self.save({"url": url, "validated": None} for url in dict.fromkeys(urls))
+        return len(urls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Registro de feeds")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="importa y valida los feeds de un OPML")
+    imp.add_argument("opml")
+    add = sub.add_parser("add", help="valida y registra URLs")
+    add.add_argument("urls", nargs="+")
+    sub.add_parser("list", help="lista los feeds registrados")
+    args = parser.parse_args()
+
+    registry = FeedRegistry()
+    if args.command == "import":
+        with open(args.opml, "rb") as f:
+            result = registry.add(feed["url"] for feed in parse_opml(f.read()))
+    elif args.command == "add":
+        result = registry.add(args.urls)
+    else:
+        result = registry.list()
+    json.dump(result, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
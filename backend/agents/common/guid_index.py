@@ -0,0 +1,232 @@
+"""
+Índice compacto de episodios ya vistos por feed, para monitores residentes.
+
+En lugar de un ``set`` de GUIDs completos por feed (un objeto str por
+episodio), cada feed guarda un array NumPy ordenado de hashes de 64 bits en
+``<feed_id>.npy``, que se abre con ``mmap``: un reinicio no carga nada hasta
+que se consulta el feed y las páginas las comparte el sistema entre
+procesos. La pertenencia de todas las entradas de un feed se resuelve con un
+``searchsorted`` vectorizado.
+
+Con ``GUID_BLOOM_BITS`` > 0, un filtro de Bloom común (también en disco con
+mmap) descarta antes los GUIDs que seguro son nuevos. Un feed escrito por
+otro proceso (quizá sin filtro) se vuelca al filtro antes de consultarlo, así
+que el filtro nunca da falsos negativos. Los ficheros
+``last_check_<feed_id>.json`` del formato anterior se importan la primera
+vez que se consulta cada feed.
+
+Una colisión de 64 bits haría pasar un episodio nuevo por visto; con un
+millón de GUIDs por feed la probabilidad es del orden de 1e-8.
+"""
+
+import fcntl
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Bits del filtro de Bloom (0 = sin filtro); 2**27 bits (16 MiB) ≈ 1% de
+# falsos positivos con 10 millones de GUIDs y 7 funciones hash
+GUID_BLOOM_BITS = int(os.getenv("GUID_BLOOM_BITS", "0"))
+GUID_BLOOM_HASHES = int(os.getenv("GUID_BLOOM_HASHES", "7"))
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """Finalizador de splitmix64: reparte la entropía por los 64 bits."""
+    h = h ^ (h >> np.uint64(30))
+    h = h * np.uint64(0xBF58476D1CE4E5B9)
+    h = h ^ (h >> np.uint64(27))
+    h = h * np.uint64(0x94D049BB133111EB)
+    return h ^ (h >> np.uint64(31))
+
+
+def guid_hashes(guids: List[str]) -> np.ndarray:
+    """
+    Hash de 64 bits (FNV-1a + splitmix64) de cada GUID, calculado columna a
+    columna sobre una matriz de bytes: el bucle recorre posiciones de
+    carácter, no episodios. La matriz se queda en uint8 y solo cada columna
+    se amplía a 64 bits.
+    """
+    if not guids:
+        return np.empty(0, dtype=np.uint64)
+    raw = np.array([g.encode() for g in guids])
+    width = raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(len(raw), width)
+    lengths = np.char.str_len(raw)
+    h = np.full(len(raw), _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for i in range(width):
+            h = np.where(lengths > i, (h ^ chars[:, i].astype(np.uint64)) * _FNV_PRIME, h)
+        return _mix(h)
+
+
+class BloomFilter:
+    """Filtro de Bloom sobre un fichero mapeado en memoria (doble hashing a partir del hash de 64 bits)."""
+
+    def __init__(self, path: str, bits: int, hashes: int = GUID_BLOOM_HASHES):
+        self.path = path
+        self.bits = bits
+        self.hashes = hashes
+        size = (bits + 7) // 8
+        fresh = not os.path.exists(path) or os.path.getsize(path) != size
+        if fresh:
+            with open(path, "wb") as f:
+                f.truncate(size)
+        self.array = np.memmap(path, dtype=np.uint8, mode="r+", shape=(size,))
+        self.fresh = fresh
+
+    def _positions(self, h: np.ndarray) -> np.ndarray:
+        h1 = h & np.uint64(0xFFFFFFFF)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        k = np.arange(self.hashes, dtype=np.uint64)[:, None]
+        with np.errstate(over="ignore"):
+            return (h1 + k * h2) % np.uint64(self.bits)
+
+    def add(self, h: np.ndarray):
+        pos = self._positions(h).ravel()
+        np.bitwise_or.at(self.array, (pos >> np.uint64(3)).astype(np.int64),
+                         (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+
+    def might_contain(self, h: np.ndarray) -> np.ndarray:
+        pos = self._positions(h)
+        bits = self.array[(pos >> np.uint64(3)).astype(np.int64)] >> (pos & np.uint64(7)).astype(np.uint8)
+        return np.all(bits & 1, axis=0)
+
+    def flush(self):
+        self.array.flush()
+
+
+def _salt(feed_id: str) -> np.uint64:
+    """Sal por feed para que el filtro de Bloom común distinga el mismo GUID en feeds distintos."""
+    return guid_hashes([feed_id])[0]
+
+
+class GuidIndex:
+    def __init__(self, directory: str, bloom_bits: int = GUID_BLOOM_BITS):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # feed_id -> ((mtime_ns, size), array mapeado)
+        self._arrays: Dict[str, Tuple[Tuple[int, int], np.ndarray]] = {}
+        self._bloom: Optional[BloomFilter] = None
+        # feed_id -> (mtime_ns, size) de la versión del índice ya volcada al filtro
+        self._bloomed: Dict[str, Tuple[int, int]] = {}
+        if bloom_bits:
+            self._bloom = BloomFilter(os.path.join(directory, "bloom.bits"), bloom_bits)
+
+    def _path(self, feed_id: str) -> str:
+        return os.path.join(self.directory, f"{feed_id}.npy")
+
+    def _legacy_path(self, feed_id: str) -> str:
+        return os.path.join(self.directory, f"last_check_{feed_id}.json")
+
+    def _dir_lock(self):
+        return open(os.path.join(self.directory, ".lock"), "w")
+
+    def _migrate(self, feed_id: str):
+        """Importa los GUIDs de ``last_check_<feed_id>.json`` (formato anterior)."""
+        legacy = self._legacy_path(feed_id)
+        try:
+            with open(legacy) as f:
+                guids = json.load(f).get("episodes", [])
+        except (OSError, ValueError):
+            return
+        self.add(feed_id, guids)
+        os.remove(legacy)
+
+    def _array(self, feed_id: str) -> np.ndarray:
+        """Hashes vistos del feed (mmap, solo lectura); se reabre si otro proceso lo reescribió."""
+        return self._stamped_array(feed_id)[1]
+
+    def _stamped_array(self, feed_id: str) -> Tuple[Optional[Tuple[int, int]], np.ndarray]:
+        path = self._path(feed_id)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            if os.path.exists(self._legacy_path(feed_id)):
+                self._migrate(feed_id)
+                if os.path.exists(path):
+                    return self._stamped_array(feed_id)
+            return None, np.empty(0, dtype=np.uint64)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._arrays.get(feed_id)
+            if cached is None or cached[0] != stamp:
+                cached = (stamp, np.load(path, mmap_mode="r"))
+                self._arrays[feed_id] = cached
+        return cached
+
+    def _sync_bloom(self, feed_id: str, stamp: Tuple[int, int], array: np.ndarray):
+        """
+        Vuelca al filtro la versión del índice del feed si aún no lo estaba: la
+        pudo escribir un proceso sin filtro (o con el filtro recién creado).
+        Los bits son idempotentes; el cerrojo evita perder los de otro escritor.
+        """
+        if self._bloomed.get(feed_id) == stamp:
+            return
+        with self._dir_lock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._bloom.add(array ^ _salt(feed_id))
+        self._bloomed[feed_id] = stamp
+
+    def known(self, feed_id: str) -> bool:
+        """True si el feed ya se revisó alguna vez (tiene índice o estado antiguo)."""
+        return os.path.exists(self._path(feed_id)) or os.path.exists(self._legacy_path(feed_id))
+
+    def count(self, feed_id: str) -> int:
+        return len(self._array(feed_id))
+
+    def contains(self, feed_id: str, guids: List[str]) -> np.ndarray:
+        """Máscara booleana: qué GUIDs ya se vieron en el feed."""
+        h = guid_hashes(guids)
+        seen = np.zeros(len(h), dtype=bool)
+        if not len(h):
+            return seen
+        stamp, array = self._stamped_array(feed_id)
+        if not len(array):
+            return seen
+        candidates = np.ones(len(h), dtype=bool)
+        if self._bloom is not None:
+            self._sync_bloom(feed_id, stamp, array)
+            candidates = self._bloom.might_contain(h ^ _salt(feed_id))
+            if not candidates.any():
+                return seen
+        idx = np.searchsorted(array, h[candidates])
+        seen[candidates] = array[np.minimum(idx, len(array) - 1)] == h[candidates]
+        return seen
+
+    def new_guids(self, feed_id: str, guids: List[str]) -> List[str]:
+        mask = self.contains(feed_id, guids)
+        return [g for g, s in zip(guids, mask) if not s]
+
+    def add(self, feed_id: str, guids: Iterable[str]):
+        """Marca GUIDs como vistos (crea el índice del feed aunque la lista esté vacía)."""
+        h = guid_hashes([g for g in guids if g])
+        with self._dir_lock() as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            path = self._path(feed_id)
+            exists = os.path.exists(path)
+            previous = None
+            if exists:
+                st = os.stat(path)
+                previous = (st.st_mtime_ns, st.st_size)
+            current = np.load(path) if exists else np.empty(0, dtype=np.uint64)
+            merged = np.union1d(current, h).astype(np.uint64)
+            if exists and len(merged) == len(current):
+                return
+            tmp = f"{path}.{os.getpid()}.tmp.npy"
+            np.save(tmp, merged)
+            os.replace(tmp, path)
+            if self._bloom is not None:
+                # Basta con los hashes nuevos si la versión anterior ya estaba en el
+                # filtro; si la escribió otro proceso, se vuelca la versión entera
+                synced = not exists or self._bloomed.get(feed_id) == previous
+                self._bloom.add((h if synced else merged) ^ _salt(feed_id))
+                self._bloom.flush()
+                st = os.stat(path)
+                self._bloomed[feed_id] = (st.st_mtime_ns, st.st_size)
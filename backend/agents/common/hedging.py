@@ -0,0 +1,231 @@
+"""
+Peticiones con cobertura (hedging) entre un proveedor principal y uno de
+respaldo para recortar la latencia de cola.
+
+Si el principal no ha respondido cuando se cumple su percentil observado
+(p90 por defecto), se lanza la misma petición al respaldo (otro proveedor o
+una réplica) y gana el primer resultado correcto. El perdedor se abandona:
+si aún no había empezado se cancela y, si ya estaba en vuelo, su resultado
+se descarta (las llamadas HTTP síncronas no se pueden interrumpir).
+
+Las latencias y las métricas viven en ``DATA_DIR/hedging.db``, compartidas
+por todos los procesos de una etapa. Configuración por etapa, p. ej. para
+``tts``:
+  HEDGE_TTS=1 (activa), HEDGE_TTS_QUANTILE=0.9,
+  HEDGE_TTS_DELAY (espera mientras no haya HEDGE_MIN_SAMPLES muestras),
+  HEDGE_TTS_BACKUPS (proveedores de respaldo admitidos, separados por comas)
+Cada respaldo es opt-in: una petición cubierta puede pagarse dos veces, así
+que solo se lanza al respaldo si su proveedor está en ``HEDGE_<ETAPA>_BACKUPS``
+(por defecto, gTTS para ``tts``, que es gratuito, y ninguno para ``translate``).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+from common.db import connect, db_path
+
+# Muestras de latencia por (etapa, proveedor) usadas para el percentil
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MAX_THREADS = int(os.getenv("HEDGE_MAX_THREADS", "16"))
+
+
+class HedgePolicy(NamedTuple):
+    enabled: bool
+    quantile: float
+    default_delay: float  # segundos, hasta tener muestras suficientes
+    backups: FrozenSet[str] = frozenset()  # proveedores de respaldo admitidos
+
+
+_DEFAULTS = {
+    "tts": HedgePolicy(False, 0.9, 20.0, frozenset({"gtts"})),
+    "translate": HedgePolicy(False, 0.9, 30.0),
+}
+
+
+def load_policy(stage: str) -> HedgePolicy:
+    base = _DEFAULTS.get(stage, HedgePolicy(False, 0.9, 30.0))
+    prefix = f"HEDGE_{stage.upper()}"
+    backups = os.getenv(f"{prefix}_BACKUPS")
+    return HedgePolicy(
+        os.getenv(prefix, "1" if base.enabled else "0").lower() in ("1", "true", "yes"),
+        float(os.getenv(f"{prefix}_QUANTILE", base.quantile)),
+        float(os.getenv(f"{prefix}_DELAY", base.default_delay)),
+        base.backups if backups is None else frozenset(p.strip() for p in backups.split(",") if p.strip()),
+    )
+
+
+def quantile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+Call = Tuple[str, Callable[[], Any]]
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS latencies (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        stage TEXT NOT NULL, provider TEXT NOT NULL, seconds REAL NOT NULL);
+    CREATE INDEX IF NOT EXISTS latencies_provider ON latencies (stage, provider, id);
+    CREATE TABLE IF NOT EXISTS metrics (
+        stage TEXT PRIMARY KEY,
+        calls INTEGER NOT NULL DEFAULT 0,
+        hedged INTEGER NOT NULL DEFAULT 0,
+        backup_wins INTEGER NOT NULL DEFAULT 0,
+        extra_cost REAL NOT NULL DEFAULT 0);
+"""
+
+
+def _samples(conn: sqlite3.Connection, stage: str, provider: str):
+    rows = conn.execute(
+        "SELECT seconds FROM latencies WHERE stage = ? AND provider = ? ORDER BY id DESC LIMIT ?",
+        (stage, provider, HEDGE_WINDOW),
+    ).fetchall()
+    return [row["seconds"] for row in rows]
+
+
+def _stats(conn: Optional[sqlite3.Connection], stage: str, policy: HedgePolicy) -> Dict[str, Any]:
+    row, latency = None, {}
+    if conn is not None:
+        row = conn.execute("SELECT * FROM metrics WHERE stage = ?", (stage,)).fetchone()
+        for (provider,) in conn.execute("SELECT DISTINCT provider FROM latencies WHERE stage = ?", (stage,)).fetchall():
+            samples = _samples(conn, stage, provider)
+            latency[provider] = {"samples": len(samples), "p50": quantile(samples, 0.5),
+                                 "p90": quantile(samples, 0.9), "p99": quantile(samples, 0.99)}
+    calls = row["calls"] if row else 0
+    hedged = row["hedged"] if row else 0
+    return {
+        "stage": stage,
+        "enabled": policy.enabled,
+        "quantile": policy.quantile,
+        "backups": sorted(policy.backups),
+        "calls": calls,
+        "hedged": hedged,
+        "hedge_rate": hedged / calls if calls else 0.0,
+        "backup_wins": row["backup_wins"] if row else 0,
+        "extra_cost": row["extra_cost"] if row else 0.0,
+        "latency": latency,
+    }
+
+
+def hedge_stats(stage: str, path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Métricas de una etapa leídas de la base compartida, sin crear un Hedger
+    (ni su pool de hilos): para consultas de estado desde otros procesos.
+    """
+    path = path or db_path("hedging.db")
+    if not os.path.exists(path):
+        return _stats(None, stage, load_policy(stage))
+    conn = connect(path)
+    try:
+        return _stats(conn, stage, load_policy(stage))
+    except sqlite3.OperationalError:
+        # Base sin tablas todavía: ningún Hedger ha arrancado
+        return _stats(None, stage, load_policy(stage))
+    finally:
+        conn.close()
+
+
+class Hedger:
+    def __init__(self, stage: str, policy: Optional[HedgePolicy] = None, path: Optional[str] = None):
+        self.stage = stage
+        self.policy = policy or load_policy(stage)
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("hedging.db"))
+        self.conn.executescript(_SCHEMA)
+        self._pool = ThreadPoolExecutor(max_workers=HEDGE_MAX_THREADS, thread_name_prefix=f"hedge-{stage}")
+
+    # --- Latencias ---
+
+    def _record_latency(self, provider: str, seconds: float):
+        with self._lock:
+            cur = self.conn.execute(
+                "INSERT INTO latencies (stage, provider, seconds) VALUES (?, ?, ?)", (self.stage, provider, seconds)
+            )
+            # Ventana deslizante: se conservan las últimas HEDGE_WINDOW muestras
+            if cur.lastrowid % HEDGE_WINDOW == 0:
+                self.conn.execute(
+                    "DELETE FROM latencies WHERE stage = ? AND provider = ? AND id NOT IN "
+                    "(SELECT id FROM latencies WHERE stage = ? AND provider = ? ORDER BY id DESC LIMIT ?)",
+                    (self.stage, provider, self.stage, provider, HEDGE_WINDOW),
+                )
+
+    def _samples(self, provider: str):
+        with self._lock:
+            return _samples(self.conn, self.stage, provider)
+
+    def delay(self, provider: str) -> float:
+        """Espera antes de cubrir al proveedor: su percentil observado."""
+        samples = self._samples(provider)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.policy.default_delay
+        return quantile(samples, self.policy.quantile)
+
+    def _count(self, hedged: bool = False, backup_won: bool = False, extra_cost: float = 0):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO metrics (stage, calls, hedged, backup_wins, extra_cost) VALUES (?, 1, ?, ?, ?) "
+                "ON CONFLICT (stage) DO UPDATE SET calls = calls + 1, hedged = hedged + excluded.hedged, "
+                "backup_wins = backup_wins + excluded.backup_wins, extra_cost = extra_cost + excluded.extra_cost",
+                (self.stage, int(hedged), int(backup_won), extra_cost),
+            )
+
+    # --- Ejecución ---
+
+    def _submit(self, call: Call):
+        provider, fn = call
+
+        def timed():
+            start = time.monotonic()
+            result = fn()
+            self._record_latency(provider, time.monotonic() - start)
+            return result
+
+        return self._pool.submit(timed)
+
+    def run(self, primary: Call, backup: Optional[Call] = None, cost: float = 0) -> Tuple[Any, str]:
+        """
+        Ejecuta ``primary`` (``(proveedor, función)``) y, si la política está
+        activa, admite al proveedor de ``backup`` y el principal tarda más que
+        su percentil, también ``backup``. Devuelve
+        ``(resultado, proveedor)`` del primero que termine bien. ``cost`` son
+        las unidades (caracteres, tokens...) que añade una petición de
+        respaldo, para las métricas. Si el principal falla antes de lanzar
+        el respaldo, el error se propaga (el llamador decide su fallback).
+        """
+        if backup is None or not self.policy.enabled or backup[0] not in self.policy.backups:
+            start = time.monotonic()
+            result = primary[1]()
+            self._record_latency(primary[0], time.monotonic() - start)
+            self._count()
+            return result, primary[0]
+
+        first = self._submit(primary)
+        done, _ = wait([first], timeout=self.delay(primary[0]))
+        if done:
+            self._count()
+            return first.result(), primary[0]
+
+        second = self._submit(backup)
+        names = {first: primary[0], second: backup[0]}
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    self._count(hedged=True, backup_won=future is second, extra_cost=cost)
+                    return future.result(), names[future]
+                if future is first or error is None:
+                    error = future.exception()
+        self._count(hedged=True, extra_cost=cost)
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return _stats(self.conn, self.stage, self.policy)
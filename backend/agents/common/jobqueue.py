@@ -0,0 +1,427 @@
+"""
+Cola de trabajos persistente (SQLite) con checkpoint por etapa.
+
+Cada episodio es un job que avanza por los estados
+``pending -> transcribed -> translated -> synthesized -> done``; el resultado
+de cada etapa se guarda junto al job. Un worker reclama el job con un lease
+que caduca: si el proceso muere, otro worker lo retoma desde la última etapa
+completada en lugar de empezar de cero. Mientras una etapa está en marcha el
+lease se renueva (``keep_lease``); si aun así se pierde, el worker antiguo
+no puede guardar ni fallar el job (``LeaseLost``).
+
+Qué job se reclama lo decide un planificador en ``claim``: primero por clase
+de prioridad (las peticiones interactivas van por delante del backfill de
+los monitores) y, dentro de la clase, reparto justo ponderado entre
+tenants (podcast o cliente) con un tope de jobs en curso por tenant.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from common.db import connect, db_path
+
+# Etapas en orden y estado que alcanza el job al completar cada una
+STAGES = [
+    ("transcribe", "transcribed"),
+    ("translate", "translated"),
+    ("tts", "synthesized"),
+    ("subtitles", "done"),
+]
+STATES = ["pending"] + [state for _, state in STAGES]
+DONE = "done"
+FAILED = "failed"
+
+# Clases de prioridad: menor número = antes
+INTERACTIVE = 0
+BACKFILL = 1
+
+LEASE_S = float(os.getenv("JOB_LEASE_SECONDS", "1800"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+RETRY_BASE_S = 30.0
+# Jobs en curso por tenant (salvo que el tenant tenga su propio tope)
+TENANT_MAX_RUNNING = int(os.getenv("TENANT_MAX_RUNNING", "4"))
+# Tope de jobs de backfill en curso (0 = sin tope): deja workers libres
+# para las peticiones interactivas
+BACKFILL_MAX_RUNNING = int(os.getenv("JOB_BACKFILL_MAX_RUNNING", "0"))
+
+
+class LeaseLost(RuntimeError):
+    """El lease del job caducó y otro worker lo reclamó: lo hecho no se guarda."""
+
+
+def next_stage(state: str) -> Optional[str]:
+    """Etapa pendiente para un job en ``state`` (None si ya terminó)."""
+    if state in (DONE, FAILED):
+        return None
+    return STAGES[STATES.index(state)][0]
+
+
+# Columnas de ``jobs``: se comparten con la reconstrucción de la tabla al migrar
+_JOBS_COLUMNS = """
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    episode_key TEXT NOT NULL,
+    target_lang TEXT NOT NULL,
+    feed_url TEXT,
+    audio_url TEXT NOT NULL,
+    title TEXT,
+    podcast_id INTEGER,
+    tenant TEXT NOT NULL DEFAULT '',
+    priority_class INTEGER NOT NULL DEFAULT 1,
+    voice_id TEXT,
+    priority REAL NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'pending',
+    results TEXT NOT NULL DEFAULT '{}',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    lease_owner TEXT,
+    lease_expires REAL NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    UNIQUE (episode_key, target_lang)
+"""
+
+
+def default_tenant(podcast_id: Optional[int]) -> str:
+    return f"podcast:{podcast_id}"
+
+
+def resume_state(results: Dict[str, Any]) -> str:
+    """Estado correspondiente a la última etapa con resultado guardado."""
+    state = "pending"
+    for stage, reached in STAGES:
+        if stage not in results:
+            break
+        state = reached
+    return state
+
+
+class JobQueue:
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.RLock()
+        self.conn = connect(path or db_path("jobs.db"))
+        self.conn.executescript(f"CREATE TABLE IF NOT EXISTS jobs ({_JOBS_COLUMNS});" + """
+            CREATE TABLE IF NOT EXISTS tenants (
+                tenant TEXT PRIMARY KEY,
+                weight REAL NOT NULL DEFAULT 1,
+                max_running INTEGER,
+                vtime REAL NOT NULL DEFAULT 0
+            );
+        """)
+        # Bases de datos creadas antes de la planificación por tenant
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "tenant" not in columns:
+            self.conn.executescript("""
+                ALTER TABLE jobs ADD COLUMN tenant TEXT NOT NULL DEFAULT '';
+                ALTER TABLE jobs ADD COLUMN priority_class INTEGER NOT NULL DEFAULT 1;
+                UPDATE jobs SET tenant = 'podcast:' || podcast_id;
+            """)
+        # Bases de datos con ``podcast_id INTEGER NOT NULL DEFAULT 1``: SQLite no
+        # cambia restricciones con ALTER, así que la tabla se reconstruye
+        podcast_id = next(row for row in self.conn.execute("PRAGMA table_info(jobs)") if row["name"] == "podcast_id")
+        if podcast_id["notnull"]:
+            self._rebuild_jobs()
+        self.conn.executescript("""
+            DROP INDEX IF EXISTS jobs_ready;
+            CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, priority_class, tenant, priority DESC, id);
+            CREATE INDEX IF NOT EXISTS jobs_leased ON jobs (lease_expires);
+        """)
+
+    def _rebuild_jobs(self):
+        columns = ", ".join(row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)"))
+        self.conn.executescript(
+            "BEGIN IMMEDIATE;"
+            "DROP TABLE IF EXISTS jobs_rebuild;"
+            f"CREATE TABLE jobs_rebuild ({_JOBS_COLUMNS});"
+            f"INSERT INTO jobs_rebuild ({columns}) SELECT {columns} FROM jobs;"
+            "DROP TABLE jobs;"
+            "ALTER TABLE jobs_rebuild RENAME TO jobs;"
+            "COMMIT;"
+        )
+
+    # --- Alta y consulta ---
+
+    def enqueue(self, episode_key: str, audio_url: str, target_lang: str = "es",
+                feed_url: Optional[str] = None, title: Optional[str] = None,
+                podcast_id: Optional[int] = None, voice_id: Optional[str] = None, priority: float = 0,
+                tenant: Optional[str] = None, priority_class: int = BACKFILL) -> int:
+        """
+        Crea el job si no existe (idempotente) y devuelve su id. Si ya existía,
+        una petición de clase más prioritaria lo sube de clase.
+        """
+        now = time.time()
+        tenant = tenant or default_tenant(podcast_id)
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO jobs (episode_key, target_lang, feed_url, audio_url, title, podcast_id, tenant, "
+                "priority_class, voice_id, priority, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (episode_key, target_lang) DO UPDATE SET "
+                "priority_class = MIN(priority_class, excluded.priority_class)",
+                (episode_key, target_lang, feed_url, audio_url, title, podcast_id, tenant, priority_class,
+                 voice_id, priority, now, now),
+            )
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE episode_key = ? AND target_lang = ?", (episode_key, target_lang)
+            ).fetchone()
+        return row["id"]
+
+    def set_tenant(self, tenant: str, weight: float = 1.0, max_running: Optional[int] = None):
+        """Peso en el reparto justo y tope de jobs en curso de un tenant."""
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO tenants (tenant, weight, max_running) VALUES (?, ?, ?) ON CONFLICT (tenant) "
+                "DO UPDATE SET weight = excluded.weight, max_running = excluded.max_running",
+                (tenant, weight, max_running),
+            )
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _to_job(row)
+
+    def depth(self) -> Dict[str, int]:
+        """Número de jobs por estado."""
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    def running(self) -> Dict[str, int]:
+        """Jobs con lease vigente por tenant."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT tenant, COUNT(*) AS n FROM jobs WHERE lease_expires >= ? GROUP BY tenant", (time.time(),)
+            ).fetchall()
+        return {row["tenant"]: row["n"] for row in rows}
+
+    def states(self, job_ids: List[int]) -> Dict[int, str]:
+        """Estado de varios jobs en una consulta."""
+        if not job_ids:
+            return {}
+        marks = ", ".join("?" * len(job_ids))
+        with self._lock:
+            rows = self.conn.execute(f"SELECT id, state FROM jobs WHERE id IN ({marks})", job_ids).fetchall()
+        return {row["id"]: row["state"] for row in rows}
+
+    def backlog(self) -> int:
+        """Jobs sin terminar (ni ``done`` ni ``failed``)."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) AS n FROM jobs WHERE state NOT IN (?, ?)", (DONE, FAILED)
+            ).fetchone()
+        return row["n"]
+
+    # --- Reclamar y avanzar ---
+
+    def claim(self, owner: str, feed_url: Optional[str] = None, states: Optional[List[str]] = None,
+              lease_s: float = LEASE_S) -> Optional[Dict[str, Any]]:
+        """
+        Reclama el siguiente job pendiente (sin lease vigente) para ``owner``.
+        ``states`` limita los estados de origen (p. ej. un worker de una etapa).
+
+        Se elige la clase de prioridad más alta con jobs listos; dentro de
+        ella, el tenant con menor tiempo virtual (servicio recibido / peso)
+        que no haya alcanzado su tope de jobs en curso; y de ese tenant, el
+        job de mayor ``priority``.
+        """
+        now = time.time()
+        states = states or STATES[:-1]
+        where = f"state IN ({','.join('?' * len(states))}) AND lease_expires < ? AND not_before <= ?"
+        params: List[Any] = list(states) + [now, now]
+        if feed_url:
+            where += " AND feed_url = ?"
+            params.append(feed_url)
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._pick(where, params, now)
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET lease_owner = ?, lease_expires = ?, updated = ? WHERE id = ?",
+                    (owner, now + lease_s, now, row["id"]),
+                )
+                self._charge(row["tenant"])
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        job = _to_job(row)
+        job["lease_owner"] = owner
+        return job
+
+    def _pick(self, where: str, params: List[Any], now: float):
+        ready = self.conn.execute(
+            f"SELECT priority_class, tenant FROM jobs WHERE {where} GROUP BY priority_class, tenant", params
+        ).fetchall()
+        if not ready:
+            return None
+        running = {r["tenant"]: r["n"] for r in self.conn.execute(
+            "SELECT tenant, COUNT(*) AS n FROM jobs WHERE lease_expires >= ? GROUP BY tenant", (now,))}
+        tenants = {r["tenant"]: r for r in self.conn.execute("SELECT * FROM tenants")}
+        backfill_running = self.conn.execute(
+            "SELECT COUNT(*) AS n FROM jobs WHERE lease_expires >= ? AND priority_class >= ?", (now, BACKFILL)
+        ).fetchone()["n"]
+
+        for klass in sorted({r["priority_class"] for r in ready}):
+            if klass >= BACKFILL and BACKFILL_MAX_RUNNING and backfill_running >= BACKFILL_MAX_RUNNING:
+                continue
+            eligible = []
+            for r in ready:
+                if r["priority_class"] != klass:
+                    continue
+                info = tenants.get(r["tenant"])
+                cap = info["max_running"] if info and info["max_running"] is not None else TENANT_MAX_RUNNING
+                if running.get(r["tenant"], 0) < cap:
+                    eligible.append((info["vtime"] if info else 0.0, r["tenant"]))
+            if not eligible:
+                continue
+            _, tenant = min(eligible)
+            return self.conn.execute(
+                f"SELECT * FROM jobs WHERE {where} AND priority_class = ? AND tenant = ? "
+                "ORDER BY priority DESC, id LIMIT 1", params + [klass, tenant],
+            ).fetchone()
+        return None
+
+    def _charge(self, tenant: str):
+        """
+        Avanza el tiempo virtual del tenant en 1/peso. Un tenant nuevo, o que
+        vuelve tras estar inactivo, parte del mínimo actual, sin crédito
+        acumulado.
+        """
+        floor = self.conn.execute(
+            "SELECT COALESCE(MIN(vtime), 0) AS v FROM tenants WHERE tenant IN "
+            "(SELECT DISTINCT tenant FROM jobs WHERE state NOT IN (?, ?))", (DONE, FAILED),
+        ).fetchone()["v"]
+        # Primero la fila (con el peso por defecto si no se configuró) y luego
+        # el cargo, para que un tenant nuevo también avance 1/peso
+        self.conn.execute("INSERT OR IGNORE INTO tenants (tenant, vtime) VALUES (?, ?)", (tenant, floor))
+        self.conn.execute(
+            "UPDATE tenants SET vtime = MAX(vtime, ?) + 1.0 / weight WHERE tenant = ?", (floor, tenant),
+        )
+
+    def claim_job(self, job_id: int, owner: str, lease_s: float = LEASE_S) -> Optional[Dict[str, Any]]:
+        """
+        Reclama un job concreto (p. ej. una petición interactiva), ignorando el
+        backoff; un job ``failed`` se reanuda desde su última etapa completada.
+        Devuelve None si otro worker tiene el lease.
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM jobs WHERE id = ? AND lease_expires < ?", (job_id, now)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                job = _to_job(row)
+                if job["state"] == FAILED:
+                    job.update(state=resume_state(job["results"]), attempts=0)
+                self.conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = ?, lease_owner = ?, lease_expires = ?, updated = ? "
+                    "WHERE id = ?",
+                    (job["state"], job["attempts"], owner, now + lease_s, now, job_id),
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        job["lease_owner"] = owner
+        return job
+
+    def renew(self, job: Dict[str, Any], lease_s: float = LEASE_S) -> bool:
+        """Prolonga el lease del job; False si ya no es de ``job["lease_owner"]``."""
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND lease_owner = ?",
+                (time.time() + lease_s, job["id"], job["lease_owner"]),
+            )
+        return cursor.rowcount > 0
+
+    @contextmanager
+    def keep_lease(self, job: Dict[str, Any], lease_s: float = LEASE_S, every: Optional[float] = None):
+        """Renueva el lease desde un hilo (cada ``lease_s / 3``) mientras dura el bloque."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(every or lease_s / 3):
+                if not self.renew(job, lease_s):
+                    return
+
+        thread = threading.Thread(target=loop, name=f"lease-{job['id']}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def complete_stage(self, job: Dict[str, Any], stage: str, result: Any, lease_s: float = LEASE_S):
+        """
+        Guarda el resultado de la etapa (checkpoint) y avanza el estado.
+        ``LeaseLost`` si el job ya no es de este worker.
+        """
+        state = dict(STAGES)[stage]
+        results = {**job["results"], stage: result}
+        now = time.time()
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET state = ?, results = ?, last_error = NULL, lease_expires = ?, updated = ? "
+                "WHERE id = ? AND lease_owner = ?",
+                (state, json.dumps(results), now + lease_s, now, job["id"], job["lease_owner"]),
+            )
+        if cursor.rowcount == 0:
+            raise LeaseLost(f"Job {job['id']}: lease lost before saving {stage}")
+        job["results"] = results
+        job["state"] = state
+
+    def fail(self, job: Dict[str, Any], error: str, max_attempts: int = MAX_ATTEMPTS):
+        """
+        Registra el error; el job se reintenta con backoff exponencial o queda
+        ``failed``. ``LeaseLost`` si el job ya no es de este worker.
+        """
+        attempts = job["attempts"] + 1
+        state = FAILED if attempts >= max_attempts else job["state"]
+        not_before = time.time() + RETRY_BASE_S * (2 ** (attempts - 1))
+        with self._lock:
+            cursor = self.conn.execute(
+                "UPDATE jobs SET state = ?, attempts = ?, last_error = ?, lease_owner = NULL, "
+                "lease_expires = 0, not_before = ?, updated = ? WHERE id = ? AND lease_owner = ?",
+                (state, attempts, error[:2000], not_before, time.time(), job["id"], job["lease_owner"]),
+            )
+        if cursor.rowcount == 0:
+            raise LeaseLost(f"Job {job['id']}: lease lost before recording error: {error}")
+        job.update(state=state, attempts=attempts, last_error=error)
+
+    def retry_failed(self) -> int:
+        """Vuelve a poner en cola los jobs ``failed`` desde su última etapa completada."""
+        with self._lock:
+            rows = self.conn.execute("SELECT id, results FROM jobs WHERE state = ?", (FAILED,)).fetchall()
+            for row in rows:
+                self.conn.execute(
+                    "UPDATE jobs SET state = ?, attempts = 0, not_before = 0, updated = ? WHERE id = ?",
+                    (resume_state(json.loads(row["results"])), time.time(), row["id"]),
+                )
+        return len(rows)
+
+    def release(self, job: Dict[str, Any]):
+        """Suelta el lease (si sigue siendo de este worker)."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET lease_owner = NULL, lease_expires = 0, updated = ? WHERE id = ? AND lease_owner = ?",
+                (time.time(), job["id"], job["lease_owner"]),
+            )
+
+
+def _to_job(row) -> Optional[Dict[str, Any]]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["results"] = json.loads(job["results"])
+    return job
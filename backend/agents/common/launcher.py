@@ -0,0 +1,447 @@
+"""
+Lanzador de agentes estilo forkserver.
+
+Arrancar un agente con ``subprocess.Popen`` paga cada vez el intérprete y
+las importaciones pesadas (feedparser, numpy, httpx, los SDK de los
+proveedores...), cientos de milisegundos por mensaje. El servidor del
+lanzador importa esos módulos una vez y hace ``fork`` de un hijo por
+invocación, que ejecuta el ``agent.py`` como ``__main__`` con los mismos
+stdin/stdout/stderr que tendría con Popen: el cliente le pasa sus extremos
+de las tuberías por el socket Unix (SCM_RIGHTS). Cada agente sigue siendo un
+proceso aparte.
+
+Solo se precargan módulos de terceros y de la biblioteca estándar: los de
+``common`` leen la configuración del entorno al importarse, y el hijo recibe
+el entorno del cliente, así que se importan de nuevo en cada agente.
+
+  python -m common.launcher serve     # servidor (AGENT_LAUNCHER=auto lo arranca solo)
+  python -m common.launcher status
+
+``spawn_agent`` devuelve un objeto con la interfaz de Popen que usan los
+orquestadores (stdin, stdout, stderr, pid, poll, wait, communicate, kill) y
+recurre a Popen si el servidor no está disponible. ``AGENT_LAUNCHER=off``
+lo desactiva.
+"""
+
+import argparse
+import atexit
+import fcntl
+import importlib
+import json
+import os
+import runpy
+import select
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, List, Optional, Sequence
+
+from common.db import db_path
+
+# auto: usa el servidor y lo arranca si no hay ninguno; on: lo usa si existe; off: siempre Popen
+AGENT_LAUNCHER = os.getenv("AGENT_LAUNCHER", "auto")
+AGENT_LAUNCHER_SOCKET = os.getenv("AGENT_LAUNCHER_SOCKET", db_path("agent-launcher.sock"))
+# Segundos sin peticiones tras los que el servidor termina (0 = nunca)
+AGENT_LAUNCHER_IDLE = float(os.getenv("AGENT_LAUNCHER_IDLE", "900"))
+AGENT_PRELOAD = [name for name in os.getenv(
+    "AGENT_PRELOAD",
+    "json,sqlite3,hashlib,asyncio,concurrent.futures,logging,urllib.request,"
+    "dotenv,requests,httpx,feedparser,numpy,zstandard,gtts,elevenlabs,deepgram",
+).split(",") if name]
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_MAX_HEADER = 1 << 20
+
+
+# --- Servidor ---
+
+def preload(modules: Sequence[str] = AGENT_PRELOAD) -> List[str]:
+    """Importa los módulos compartidos; los que no están instalados se ignoran."""
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def _recv_request(conn: socket.socket):
+    """Cabecera JSON (terminada en salto de línea) y los descriptores stdin/stdout/stderr."""
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk or len(data) > _MAX_HEADER:
+            raise ConnectionError("incomplete launcher request")
+        data += chunk
+    return json.loads(data), fds
+
+
+def _child_streams():
+    """Reconstruye sys.stdin/stdout/stderr sobre los descriptores 0/1/2 recién duplicados."""
+    sys.stdin = sys.__stdin__ = open(0, "r", closefd=False)
+    sys.stdout = sys.__stdout__ = open(1, "w", closefd=False, buffering=1 if os.isatty(1) else -1)
+    sys.stderr = sys.__stderr__ = open(2, "w", closefd=False, buffering=1, errors="backslashreplace")
+
+
+def _run_agent(request: Dict[str, Any], fds: List[int], base_path: List[str]):
+    """Proceso del agente: nunca retorna."""
+    code = 1
+    try:
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+        for fd in fds:
+            if fd > 2:
+                os.close(fd)
+        _child_streams()
+        for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        if request.get("new_session"):
+            os.setsid()
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        path = request["path"]
+        sys.argv = [path] + list(request.get("args", []))
+        sys.path[:] = [os.path.dirname(path)] + base_path
+        # Que ``common`` se importe con el entorno del cliente, no con el del servidor
+        for name in [m for m in sys.modules if m == "common" or m.startswith("common.")]:
+            del sys.modules[name]
+        try:
+            runpy.run_path(path, run_name="__main__")
+            code = 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if not isinstance(e.code, int) and e.code is not None:
+                print(e.code, file=sys.stderr)
+        except KeyboardInterrupt:
+            code = 128 + signal.SIGINT
+        except BaseException:
+            traceback.print_exc()
+        # Lo mismo que haría el intérprete al salir: hilos no daemon y atexit
+        threading._shutdown()
+        atexit._run_exitfuncs()
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        for stream in (sys.stdout, sys.stderr):
+            try:
+                stream.flush()
+            except Exception:
+                pass
+        os._exit(code)
+
+
+def _supervise(conn: socket.socket, request: Dict[str, Any], fds: List[int], base_path: List[str]):
+    """
+    Proceso intermedio por invocación: lanza el agente, envía su pid al
+    cliente y, al terminar, su código de salida. Nunca retorna.
+    """
+    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+    pid = os.fork()
+    if pid == 0:
+        conn.close()
+        _run_agent(request, fds, base_path)
+    for fd in fds:
+        os.close(fd)
+    try:
+        conn.sendall((json.dumps({"pid": pid}) + "\n").encode())
+    except OSError:
+        pass
+    _, status = os.waitpid(pid, 0)
+    try:
+        conn.sendall((json.dumps({"returncode": os.waitstatus_to_exitcode(status)}) + "\n").encode())
+    except OSError:
+        pass  # cliente desligado (p. ej. un orquestador lanzado en segundo plano)
+    os._exit(0)
+
+
+def serve(path: str = AGENT_LAUNCHER_SOCKET, idle: float = AGENT_LAUNCHER_IDLE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock = open(path + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"Launcher already running on {path}", file=sys.stderr)
+        return
+    loaded = preload()
+    if os.path.exists(path):
+        os.remove(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(64)
+    if idle:
+        server.settimeout(idle)
+    # Los supervisores se recogen solos; el servidor no espera a nadie
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    base_path = [p for p in sys.path[1:] if p != AGENTS_DIR]
+    print(f"Agent launcher on {path} (pid {os.getpid()}, preloaded: {', '.join(loaded)})",
+          file=sys.stderr, flush=True)
+    try:
+        while True:
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            conn.settimeout(None)
+            fds: List[int] = []
+            try:
+                request, fds = _recv_request(conn)
+                if request.get("ping"):
+                    conn.sendall((json.dumps({"pid": os.getpid(), "preloaded": loaded}) + "\n").encode())
+                elif len(fds) == 3:
+                    if os.fork() == 0:
+                        # El cerrojo es solo del servidor: si lo heredaran los
+                        # agentes, el servidor parecería vivo mientras dure alguno
+                        server.close()
+                        lock.close()
+                        _supervise(conn, request, fds, base_path)
+            except Exception as e:
+                print(f"Launcher request failed: {e}", file=sys.stderr, flush=True)
+            finally:
+                for fd in fds:
+                    os.close(fd)
+                conn.close()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# --- Cliente ---
+
+class LaunchedProcess:
+    """Agente lanzado por el servidor, con la parte de la interfaz de Popen que usan los orquestadores."""
+
+    def __init__(self, conn: socket.socket, pid: int, args: List[str], stdin=None, stdout=None, stderr=None):
+        self._conn = conn
+        self._buffer = b""
+        self.pid = pid
+        self.args = args
+        self.stdin = stdin
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+
+    def _read_status(self, timeout: Optional[float]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not select.select([self._conn], [], [], remaining)[0]:
+                return False
+            chunk = self._conn.recv(4096)
+            if not chunk:
+                # El supervisor desapareció sin informar: se trata como muerte por señal
+                self.returncode = -signal.SIGKILL
+                self._conn.close()
+                return True
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        self.returncode = json.loads(line)["returncode"]
+        self._conn.close()
+        return True
+
+    def poll(self) -> Optional[int]:
+        if self.returncode is None:
+            self._read_status(0)
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if self.returncode is None and not self._read_status(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def communicate(self, input=None, timeout: Optional[float] = None):
+        """Como Popen.communicate: escribe ``input``, cierra stdin y lee stdout/stderr hasta EOF."""
+        out: Dict[str, Any] = {}
+
+        def read(name, stream):
+            out[name] = stream.read()
+            stream.close()
+
+        readers = [threading.Thread(target=read, args=(name, stream), daemon=True)
+                   for name, stream in (("stdout", self.stdout), ("stderr", self.stderr)) if stream]
+        for reader in readers:
+            reader.start()
+        if self.stdin:
+            try:
+                if input:
+                    self.stdin.write(input)
+                self.stdin.close()
+            except BrokenPipeError:
+                pass
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for reader in readers:
+            reader.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if reader.is_alive():
+                raise subprocess.TimeoutExpired(self.args, timeout)
+        self.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return out.get("stdout"), out.get("stderr")
+
+    def send_signal(self, sig: int):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+def _connect(path: str, timeout: float = 2.0) -> socket.socket:
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+    except OSError:
+        conn.close()
+        raise
+    return conn
+
+
+def _read_line(conn: socket.socket) -> Dict[str, Any]:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionError("launcher closed the connection")
+        data += chunk
+    return json.loads(data)
+
+
+def status(path: str = AGENT_LAUNCHER_SOCKET) -> Optional[Dict[str, Any]]:
+    """pid y módulos precargados del servidor, o None si no hay ninguno escuchando."""
+    try:
+        conn = _connect(path)
+    except OSError:
+        return None
+    with conn:
+        conn.sendall(b'{"ping": true}\n')
+        return _read_line(conn)
+
+
+def _server_running(path: str = AGENT_LAUNCHER_SOCKET) -> bool:
+    """True si algún servidor tiene el cerrojo (escuchando o todavía precargando)."""
+    try:
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+def start_server(path: str = AGENT_LAUNCHER_SOCKET):
+    """Arranca el servidor en segundo plano (sin esperar: la precarga tarda lo que tardaría un Popen)."""
+    subprocess.Popen(
+        [sys.executable, "-m", "common.launcher", "serve", "--socket", path],
+        cwd=AGENTS_DIR,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _launch(path: str, args: Sequence[str], stdin, stdout, stderr, text: bool, bufsize: int,
+            new_session: bool) -> LaunchedProcess:
+    conn = _connect(AGENT_LAUNCHER_SOCKET)
+    child_fds: List[int] = []
+    parent_ends: Dict[str, Any] = {}
+    to_close: List[int] = []
+    devnull = None
+    try:
+        for target, spec in enumerate((stdin, stdout, stderr)):
+            if spec == subprocess.PIPE:
+                r, w = os.pipe()
+                child, parent = (r, w) if target == 0 else (w, r)
+                to_close.append(child)
+                child_fds.append(child)
+                parent_ends[target] = parent
+            elif spec == subprocess.DEVNULL:
+                if devnull is None:
+                    devnull = os.open(os.devnull, os.O_RDWR)
+                    to_close.append(devnull)
+                child_fds.append(devnull)
+            elif spec == subprocess.STDOUT and target == 2:
+                child_fds.append(child_fds[1])
+            elif spec is None:
+                child_fds.append(target)
+            else:
+                child_fds.append(spec if isinstance(spec, int) else spec.fileno())
+        header = {"path": os.path.abspath(path), "args": list(args), "cwd": os.getcwd(),
+                  "env": dict(os.environ), "new_session": new_session}
+        socket.send_fds(conn, [(json.dumps(header) + "\n").encode()], child_fds)
+        pid = _read_line(conn)["pid"]
+    except BaseException:
+        conn.close()
+        for fd in to_close + list(parent_ends.values()):
+            os.close(fd)
+        raise
+    for fd in to_close:
+        os.close(fd)
+    conn.settimeout(None)
+
+    def wrap(target, mode):
+        if target not in parent_ends:
+            return None
+        if text:
+            return open(parent_ends[target], mode, buffering=1 if bufsize == 1 else -1)
+        return open(parent_ends[target], mode + "b", buffering=bufsize)
+
+    return LaunchedProcess(conn, pid, [sys.executable, path, *args],
+                           wrap(0, "w"), wrap(1, "r"), wrap(2, "r"))
+
+
+def spawn_agent(path: str, args: Sequence[str] = (), stdin=None, stdout=None, stderr=None,
+                text: bool = False, bufsize: int = -1, start_new_session: bool = False):
+    """
+    Lanza ``python <path> [args]`` a través del servidor del lanzador o, si no
+    está disponible, con Popen. Acepta los mismos valores de stdin/stdout/stderr
+    que Popen (PIPE, DEVNULL, None, descriptor o fichero).
+    """
+    if AGENT_LAUNCHER != "off":
+        try:
+            return _launch(path, args, stdin, stdout, stderr, text, bufsize, start_new_session)
+        except OSError:
+            if AGENT_LAUNCHER == "auto" and not _server_running():
+                try:
+                    start_server()
+                except OSError:
+                    pass
+    return subprocess.Popen(
+        [sys.executable, path, *args],
+        stdin=stdin, stdout=stdout, stderr=stderr,
+        text=text, bufsize=bufsize, start_new_session=start_new_session,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lanzador de agentes con módulos precargados")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve_cmd = sub.add_parser("serve", help="escucha en el socket y lanza un hijo por invocación")
+    serve_cmd.add_argument("--socket", default=AGENT_LAUNCHER_SOCKET)
+    serve_cmd.add_argument("--idle", type=float, default=AGENT_LAUNCHER_IDLE,
+                           help="segundos sin peticiones antes de terminar (0 = nunca)")
+    sub.add_parser("status", help="pid y módulos precargados del servidor")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args.socket, args.idle)
+    else:
+        print(json.dumps(status(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
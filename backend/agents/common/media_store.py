@@ -0,0 +1,158 @@
+"""
+Almacenamiento de audio direccionado por contenido en STORAGE_DIR.
+
+Cada fichero se identifica por el hash de (texto, voz, modelo, formato) y se
+guarda en ``STORAGE_DIR/audio/ab/cd/<hash>.<ext>``, de modo que dos síntesis
+idénticas comparten fichero y ningún directorio crece sin límite. El último
+acceso se registra en el atime (el mtime no cambia, así el ETag del servidor
+de media se mantiene estable) y ``gc`` lo usa para expulsar por LRU.
+
+Recolección manual o desde cron (desde ``backend/agents``):
+  python -m common.media_store --budget-mb 5000 --max-age-days 90
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+STORAGE_BASE_URL = os.getenv("STORAGE_BASE_URL", "http://localhost:5001/media")
+
+MEDIA_SUBDIR = "audio"
+# Presupuesto de disco para el audio (0 = sin límite) y retención máxima
+STORAGE_MAX_BYTES = int(os.getenv("STORAGE_MAX_BYTES", "0"))
+STORAGE_MAX_AGE_DAYS = float(os.getenv("STORAGE_MAX_AGE_DAYS", "0"))
+
+# Ficheros temporales huérfanos (escrituras interrumpidas) se borran pasado este tiempo
+_TMP_MAX_AGE_S = 3600
+
+
+def public_url(local_path: str) -> str:
+    """URL pública de un fichero dentro de STORAGE_DIR."""
+    rel = os.path.relpath(local_path, STORAGE_DIR).replace(os.sep, "/")
+    return f"{STORAGE_BASE_URL}/{rel}"
+
+
+def content_key(text: str, voice_id: str, model: str, fmt: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, fmt, voice_id or "", text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def media_path(key: str, ext: str) -> str:
+    return os.path.join(STORAGE_DIR, MEDIA_SUBDIR, key[:2], key[2:4], f"{key}.{ext}")
+
+
+def touch(path: str):
+    """Marca el fichero como usado ahora (solo atime)."""
+    st = os.stat(path)
+    os.utime(path, ns=(time.time_ns(), st.st_mtime_ns))
+
+
+def lookup(key: str, ext: str) -> Optional[str]:
+    """Ruta del fichero si ya existe (y lo marca como usado)."""
+    path = media_path(key, ext)
+    try:
+        touch(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+def store(key: str, ext: str, data: bytes) -> Tuple[str, int]:
+    """
+    Escribe el contenido de forma atómica; si ya existe, reutiliza el fichero.
+    Devuelve la ruta y los bytes escritos (0 si se reutilizó).
+    """
+    path = media_path(key, ext)
+    if os.path.exists(path):
+        touch(path)
+        return path, 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return path, len(data)
+
+
+def _scan(root: str) -> Tuple[List[Tuple[float, int, str]], List[str]]:
+    """Devuelve ``[(atime, tamaño, ruta)]`` de los ficheros y la lista de temporales."""
+    files, tmps = [], []
+    stack = [root]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                if entry.name.endswith(".tmp"):
+                    if time.time() - st.st_mtime > _TMP_MAX_AGE_S:
+                        tmps.append(entry.path)
+                    continue
+                files.append((st.st_atime, st.st_size, entry.path))
+    return files, tmps
+
+
+def _remove(path: str, root: str):
+    os.remove(path)
+    # Limpiar directorios de shard vacíos
+    directory = os.path.dirname(path)
+    while directory != root:
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+
+
+def gc(budget_bytes: int = STORAGE_MAX_BYTES, max_age_days: float = STORAGE_MAX_AGE_DAYS) -> Dict[str, int]:
+    """
+    Aplica la retención al audio almacenado.
+
+    Borra lo no usado en ``max_age_days`` y, si el total supera
+    ``budget_bytes``, expulsa los ficheros usados hace más tiempo (LRU).
+    """
+    root = os.path.join(STORAGE_DIR, MEDIA_SUBDIR)
+    files, tmps = _scan(root)
+    for tmp in tmps:
+        _remove(tmp, root)
+
+    files.sort()
+    total = sum(size for _, size, _ in files)
+    cutoff = time.time() - max_age_days * 86400 if max_age_days else None
+    removed = freed = 0
+    for atime, size, path in files:
+        over_budget = budget_bytes and total > budget_bytes
+        expired = cutoff is not None and atime < cutoff
+        if not over_budget and not expired:
+            break
+        try:
+            _remove(path, root)
+        except FileNotFoundError:
+            pass
+        total -= size
+        freed += size
+        removed += 1
+    return {"files": len(files) - removed, "bytes": total, "removed": removed, "freed_bytes": freed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Garbage-collect generated audio in STORAGE_DIR")
+    parser.add_argument("--budget-mb", type=float, default=STORAGE_MAX_BYTES / 1e6)
+    parser.add_argument("--max-age-days", type=float, default=STORAGE_MAX_AGE_DAYS)
+    args = parser.parse_args()
+    print(gc(int(args.budget_mb * 1e6), args.max_age_days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Traducción en lote de títulos y descripciones de episodios.
+
+Para mostrar el catálogo de un feed en otro idioma no hace falta esperar al
+audio: si ``METADATA_LANGS`` tiene algún idioma (por defecto ninguno: cada
+pasada consume presupuesto del LLM, el mismo que la traducción de
+episodios), en cuanto el feed monitor revisa un feed lanza en segundo plano
+(``start_metadata_translation``, con las entradas ya descargadas) una pasada
+que traduce los títulos y descripciones que aún no estén traducidos.
+``/catalog/feeds/translate`` la lanza a petición para un feed e idioma.
+
+- Empaquetado: el translation-agent recibe todas las cadenas en un mensaje
+  (``strings``) y las agrupa en pocas peticiones al LLM, cada una un objeto
+  JSON ``{"1": "...", "2": "..."}`` que se pide devolver con las mismas
+  claves. JSON escapa comillas y saltos de línea, así que ningún texto puede
+  romper la separación entre cadenas; las que falten en la respuesta se
+  reintentan en bloques más pequeños.
+- Caché por (hash de la cadena, idioma) en ``DATA_DIR/metadata-translations.db``:
+  un título repetido entre feeds o entre pasadas se traduce una sola vez.
+- El resultado se indexa en el catálogo como texto ``meta`` del idioma, así
+  que la búsqueda en ese idioma también encuentra el episodio y los listados
+  con ``lang`` devuelven el título y la descripción traducidos.
+
+Uso manual:
+  python -m common.metadata_translation run --feed https://example.com/rss --lang en
+  python -m common.metadata_translation status
+"""
+
+import argparse
+import fcntl
+import hashlib
+import html
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from common.catalog import default_catalog
+from common.db import connect, db_path
+from common.feed_cache import fetch_entries
+from common.launcher import spawn_agent
+from common.pipeline import agent_path
+
+# Idiomas a los que se traduce el catálogo al indexar un feed (vacío = nunca)
+METADATA_LANGS = [lang.strip() for lang in os.getenv("METADATA_LANGS", "").split(",") if lang.strip()]
+# Límites de cada petición empaquetada al LLM
+METADATA_BATCH_CHARS = int(os.getenv("METADATA_BATCH_CHARS", "6000"))
+METADATA_BATCH_ITEMS = int(os.getenv("METADATA_BATCH_ITEMS", "100"))
+# Las descripciones largas se recortan antes de traducir
+METADATA_SUMMARY_CHARS = int(os.getenv("METADATA_SUMMARY_CHARS", "600"))
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_TAG = re.compile(r"<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def clean_text(text: Optional[str], max_chars: int = 0) -> str:
+    """Texto plano de una línea (sin HTML); con ``max_chars``, recortado en un espacio."""
+    text = _WHITESPACE.sub(" ", html.unescape(_TAG.sub(" ", text or ""))).strip()
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars].rsplit(" ", 1)[0] + "…"
+    return text
+
+
+def string_hash(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def entry_strings(entry: Dict[str, Any]) -> Tuple[str, str]:
+    """Título y descripción de una entrada tal como se traducen."""
+    return clean_text(entry.get("title")), clean_text(entry.get("summary"), METADATA_SUMMARY_CHARS)
+
+
+# --- Empaquetado ---
+
+def batches(strings: List[str], max_chars: int = METADATA_BATCH_CHARS,
+            max_items: int = METADATA_BATCH_ITEMS) -> Iterable[List[str]]:
+    batch, size = [], 0
+    for text in strings:
+        if batch and (size + len(text) > max_chars or len(batch) >= max_items):
+            yield batch
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text) + 8
+    if batch:
+        yield batch
+
+
+def pack(strings: List[str]) -> str:
+    """Objeto JSON con una clave numérica (desde 1) por cadena."""
+    return json.dumps({str(i): text for i, text in enumerate(strings, 1)}, ensure_ascii=False, indent=0)
+
+
+def unpack(reply: str, count: int) -> Dict[int, str]:
+    """
+    Traducciones de la respuesta por posición (desde 0). Tolera texto o
+    bloques de código alrededor del objeto; las claves que falten o no sean
+    cadenas simplemente no aparecen.
+    """
+    start, end = reply.find("{"), reply.rfind("}")
+    if start < 0 or end < start:
+        return {}
+    try:
+        data = json.loads(reply[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    out = {}
+    for i in range(count):
+        value = data.get(str(i + 1))
+        if isinstance(value, str) and value.strip():
+            out[i] = value.strip()
+    return out
+
+
+# --- Caché ---
+
+class MetadataTranslations:
+    """Traducciones de cadenas por (hash, idioma)."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("metadata-translations.db"))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                hash TEXT NOT NULL,
+                lang TEXT NOT NULL,
+                text TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (hash, lang)
+            ) WITHOUT ROWID
+        """)
+
+    def get(self, strings: Iterable[str], lang: str) -> Dict[str, str]:
+        """Traducción en caché de cada cadena que la tenga."""
+        by_hash = {string_hash(text): text for text in strings if text}
+        found: Dict[str, str] = {}
+        hashes = list(by_hash)
+        with self._lock:
+            # Por tandas, bajo el límite de parámetros de SQLite
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT hash, text FROM translations WHERE lang = ? AND hash IN ({', '.join('?' * len(part))})",
+                    [lang] + part,
+                ).fetchall()
+                found.update({by_hash[row["hash"]]: row["text"] for row in rows})
+        return found
+
+    def missing(self, strings: Iterable[str], lang: str) -> List[str]:
+        strings = list(dict.fromkeys(text for text in strings if text))
+        cached = self.get(strings, lang)
+        return [text for text in strings if text not in cached]
+
+    def put(self, translations: Dict[str, str], lang: str):
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO translations (hash, lang, text, created) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (hash, lang) DO UPDATE SET text = excluded.text",
+                [(string_hash(source), lang, text, now) for source, text in translations.items()],
+            )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT lang, COUNT(*) AS n FROM translations GROUP BY lang").fetchall()
+        return {row["lang"]: row["n"] for row in rows}
+
+
+_default: Optional[MetadataTranslations] = None
+
+
+def default_translations() -> MetadataTranslations:
+    global _default
+    if _default is None:
+        _default = MetadataTranslations()
+    return _default
+
+
+# --- Pasada previa ---
+
+def with_audio(entries_by_feed: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+    return {feed_url: [entry for entry in entries if entry.get("audio_url")]
+            for feed_url, entries in entries_by_feed.items()}
+
+
+def feed_entries(feed_urls: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Entradas con audio de cada feed (de la caché de feeds)."""
+    return with_audio({feed_url: fetch_entries(feed_url) for feed_url in feed_urls})
+
+
+def pending(entries_by_feed: Dict[str, List[Dict[str, Any]]], lang: str) -> List[str]:
+    strings = [text for entries in entries_by_feed.values() for entry in entries for text in entry_strings(entry)]
+    return default_translations().missing(strings, lang)
+
+
+def call_translation_agent(strings: List[str], lang: str) -> List[str]:
+    """Un solo proceso del translation-agent para todas las cadenas (las guarda en la caché)."""
+    proc = spawn_agent(agent_path("translation-agent"), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    msg = {"sender": "metadata-translation", "receiver": "translation-agent",
+           "strings": strings, "target_lang": lang}
+    stdout, _ = proc.communicate(input=json.dumps(msg) + "\n")
+    if proc.returncode != 0 or not stdout.strip():
+        raise RuntimeError(f"translation-agent exited with code {proc.returncode}")
+    response = json.loads(stdout)
+    if not isinstance(response.get("content"), list):
+        raise RuntimeError(f"translation-agent: {response.get('content')}")
+    return response["content"]
+
+
+def translate_feeds(feed_urls: Iterable[str], langs: Iterable[str] = METADATA_LANGS) -> Dict[str, Any]:
+    """
+    Traduce los títulos y descripciones pendientes de los feeds a cada idioma
+    y los indexa en el catálogo. Una pasada a la vez por DATA_DIR: otra que
+    llegue espera y encuentra ya en caché lo que esta tradujo.
+    """
+    with open(db_path("metadata-translation.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        entries_by_feed = feed_entries(feed_urls)
+        cache = default_translations()
+        result = {}
+        for lang in langs:
+            missing = pending(entries_by_feed, lang)
+            if missing:
+                call_translation_agent(missing, lang)
+            indexed = 0
+            for entries in entries_by_feed.values():
+                strings = [entry_strings(entry) for entry in entries]
+                translated = cache.get((text for pair in strings for text in pair), lang)
+                indexed += default_catalog().index_metadata([
+                    (entry, translated.get(title, ""), translated.get(summary, ""))
+                    for entry, (title, summary) in zip(entries, strings)
+                ], lang)
+            result[lang] = {"translated": len(missing), "indexed": indexed}
+        return result
+
+
+def start_metadata_translation(feed_urls: Iterable[str], langs: Iterable[str] = METADATA_LANGS,
+                               entries_by_feed: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> Dict[str, Any]:
+    """
+    Lanza la pasada en segundo plano si hay cadenas sin traducir (no espera a
+    que termine). ``entries_by_feed`` evita volver a leer los feeds.
+    """
+    langs = list(langs)
+    if not langs:
+        return {"status": "disabled"}
+    feed_urls = list(feed_urls)
+    if not feed_urls:
+        return {"status": "cached"}
+    entries_by_feed = with_audio(entries_by_feed) if entries_by_feed is not None else feed_entries(feed_urls)
+    missing = {lang: len(pending(entries_by_feed, lang)) for lang in langs}
+    if not any(missing.values()):
+        return {"status": "cached"}
+    args = [sys.executable, "-m", "common.metadata_translation", "run"]
+    for feed_url in feed_urls:
+        args += ["--feed", feed_url]
+    for lang in langs:
+        args += ["--lang", lang]
+    subprocess.Popen(args, cwd=AGENTS_DIR, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     start_new_session=True)
+    return {"status": "started", "pending": missing}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Traducción en lote de títulos y descripciones del catálogo")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="traduce los feeds indicados")
+    run.add_argument("--feed", action="append", required=True, metavar="URL")
+    run.add_argument("--lang", action="append", metavar="IDIOMA", help="por defecto METADATA_LANGS")
+    sub.add_parser("status", help="traducciones en caché por idioma")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        print(json.dumps(translate_feeds(args.feed, args.lang or METADATA_LANGS), indent=2))
+    else:
+        print(json.dumps(default_translations().counts(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Etapas del pipeline de un episodio sobre la cola persistente.
+
+``process_job`` ejecuta las etapas que le faltan a un job, guardando el
+resultado de cada una en la cola antes de pasar a la siguiente. Tras una
+caída, el siguiente intento empieza en la primera etapa sin resultado.
+"""
+
+import json
+import os
+import select
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from common import catalog, events
+from common.artifacts import ORIGINAL, load_text, text_ref
+from common.jobqueue import DONE, FAILED, JobQueue, LeaseLost, next_stage
+from common.launcher import spawn_agent
+from common.prefetch import default_prefetcher
+from common.transcript import Transcript
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Máximo que se espera la respuesta de un agente (0 = sin límite). Un agente
+# colgado se mata: la etapa falla y se reintenta, en lugar de retener el job
+# mientras el lease se sigue renovando.
+AGENT_REQUEST_TIMEOUT = float(os.getenv("AGENT_REQUEST_TIMEOUT", "3600"))
+
+
+def agent_path(name: str) -> str:
+    return os.path.join(AGENTS_DIR, name, "agent.py")
+
+
+class AgentProcess:
+    """
+    Agente lanzado una vez y reutilizado: un mensaje por línea en stdin y
+    una respuesta por línea en stdout, como en el bucle de cada agente.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        # stderr heredado: los logs del agente salen por los del worker
+        self.proc = spawn_agent(
+            agent_path(name),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+        )
+        # stdout se lee del descriptor con select (para el timeout), no con readline
+        self._buffer = b""
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, msg: Dict[str, Any], timeout: float = AGENT_REQUEST_TIMEOUT) -> Dict[str, Any]:
+        """Respuesta al mensaje; si no llega en ``timeout`` segundos, mata el agente (se relanza en el siguiente)."""
+        self.proc.stdin.write(json.dumps(msg) + "\n")
+        self.proc.stdin.flush()
+        deadline = time.monotonic() + timeout if timeout else None
+        fd = self.proc.stdout.fileno()
+        while True:
+            while b"\n" not in self._buffer:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and (remaining <= 0 or not select.select([fd], [], [], remaining)[0]):
+                    self.proc.kill()
+                    self.proc.wait()
+                    raise TimeoutError(f"Agent {self.name} did not answer within {timeout:.0f}s")
+                chunk = os.read(fd, 65536)
+                if not chunk:
+                    raise RuntimeError(f"Agent {self.name} exited with code {self.proc.wait()}")
+                self._buffer += chunk
+            line, self._buffer = self._buffer.split(b"\n", 1)
+            if line.startswith(b"{"):
+                return json.loads(line)
+
+    def close(self):
+        if self.alive():
+            self.proc.stdin.close()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+_local = threading.local()
+
+
+def use_persistent_agents(enabled: bool = True):
+    """
+    Activa (o cierra) en el hilo actual un proceso persistente por agente,
+    para no pagar el arranque del intérprete en cada mensaje.
+    """
+    for proc in (getattr(_local, "agents", None) or {}).values():
+        proc.close()
+    _local.agents = {} if enabled else None
+
+
+def _persistent_agent(name: str) -> Optional[AgentProcess]:
+    agents = getattr(_local, "agents", None)
+    if agents is None:
+        return None
+    proc = agents.get(name)
+    if proc is None or not proc.alive():
+        proc = agents[name] = AgentProcess(name)
+    return proc
+
+
+def run_agent(name: str, msg: Dict[str, Any]) -> Dict[str, Any]:
+    """Ejecuta un agente con un mensaje Coral y devuelve su respuesta."""
+    persistent = _persistent_agent(name)
+    if persistent is not None:
+        response = persistent.request(msg)
+    else:
+        proc = spawn_agent(
+            agent_path(name),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        try:
+            stdout, stderr = proc.communicate(input=json.dumps(msg) + "\n", timeout=AGENT_REQUEST_TIMEOUT or None)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise TimeoutError(f"Agent {name} did not answer within {AGENT_REQUEST_TIMEOUT:.0f}s")
+        if proc.returncode != 0:
+            raise RuntimeError(f"Agent {name} failed: {stderr}")
+        lines = [line for line in stdout.strip().splitlines() if line.startswith("{")]
+        if not lines:
+            raise RuntimeError(f"Invalid JSON from {name}: {stdout}")
+        response = json.loads(lines[-1])
+    content = response.get("content")
+    if isinstance(content, str) and content.startswith("Error:"):
+        raise RuntimeError(f"{name}: {content}")
+    return response
+
+
+def _msg(receiver: str, content: Any, **extra) -> Dict[str, Any]:
+    msg = {"sender": "orchestrator", "receiver": receiver, "content": content}
+    msg.update({k: v for k, v in extra.items() if v is not None})
+    return msg
+
+
+# --- Etapas: cada una recibe el job y devuelve un resultado serializable ---
+
+def stage_transcribe(job: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    response = run_agent("transcription-agent", _msg("transcription-agent", job["audio_url"], job_id=job["id"]))
+    model = response.get("transcript")
+    transcript = Transcript.from_dict(model) if model else Transcript.from_text(response.get("content", ""))
+    # El texto va al artefacto comprimido; la cola guarda solo la referencia
+    ref = text_ref(job["episode_key"], transcript, ORIGINAL)
+    # El audio descargado por adelantado ya no hace falta
+    default_prefetcher().discard(job["audio_url"])
+    return ref
+
+
+def stage_text(job: Dict[str, Any], stage: str) -> Transcript:
+    """Texto producido por una etapa anterior; si falta o no se puede leer, la etapa falla."""
+    try:
+        transcript = load_text(job["episode_key"], job["results"].get(stage))
+    except Exception as e:
+        raise RuntimeError(f"{stage} artifact of job {job['id']} is unreadable: {e}")
+    if transcript is None:
+        raise RuntimeError(f"{stage} artifact of job {job['id']} is missing")
+    return transcript
+
+
+def stage_translate(job: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    source = stage_text(job, "transcribe")
+    response = run_agent("translation-agent", _msg(
+        "translation-agent", source.text,
+        target_lang=job["target_lang"], transcript=source.to_dict(), job_id=job["id"],
+    ))
+    model = response.get("transcript")
+    translation = (Transcript.from_dict(model) if model
+                   else Transcript.from_text(response.get("content", ""), job["target_lang"]))
+    return text_ref(job["episode_key"], translation, job["target_lang"])
+
+
+def stage_tts(job: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    translation = stage_text(job, "translate")
+    max_chars = options.get("tts_max_chars")
+    if max_chars:
+        # Truncar la traducción para ahorrar créditos TTS
+        translation = translation.head(max_chars)
+    response = run_agent("tts-agent", _msg(
+        "tts-agent", translation.text, voice_id=job["voice_id"], transcript=translation.to_dict(),
+    ))
+    content = response.get("content")
+    return content if isinstance(content, dict) else {}
+
+
+def stage_subtitles(job: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    response = run_agent("subtitle-agent", _msg("subtitle-agent", job["episode_key"]))
+    content = response.get("content")
+    return content if isinstance(content, dict) else {}
+
+
+STAGE_RUNNERS: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Any]] = {
+    "transcribe": stage_transcribe,
+    "translate": stage_translate,
+    "tts": stage_tts,
+    "subtitles": stage_subtitles,
+}
+
+
+def run_stage(queue: JobQueue, job: Dict[str, Any], options: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Ejecuta la siguiente etapa del job y guarda su checkpoint (renovando el
+    lease mientras tanto). Devuelve False si falló (el error queda registrado
+    en la cola) o si el job pasó a otro worker.
+    """
+    stage = next_stage(job["state"])
+    if stage is None:
+        return True
+    events.publish(job["id"], events.STAGE_STARTED[stage], {"percent": 0})
+    try:
+        try:
+            with queue.keep_lease(job):
+                result = STAGE_RUNNERS[stage](job, options or {})
+        except Exception as e:
+            queue.fail(job, f"{stage}: {e}")
+            events.publish(job["id"], "failed" if job["state"] == FAILED else "retrying",
+                           {"stage": stage, "error": str(e), "attempts": job["attempts"]})
+            return False
+        queue.complete_stage(job, stage, result)
+    except LeaseLost as e:
+        # Otro worker tiene el job: su ejecución es la que cuenta
+        print(f"WARNING: {e}", file=sys.stderr)
+        return False
+    events.publish(job["id"], job["state"], events.stage_payload(stage, result))
+    catalog.index_stage(job, stage, result)
+    return True
+
+
+def process_job(queue: JobQueue, job: Dict[str, Any], options: Optional[Dict[str, Any]] = None,
+                on_stage: Optional[Callable[[Dict[str, Any], str], None]] = None) -> Dict[str, Any]:
+    """
+    Completa todas las etapas pendientes de un job reclamado.
+    ``on_stage(job, stage)`` se llama tras guardar el checkpoint de cada etapa.
+    """
+    while job["state"] != DONE:
+        stage = next_stage(job["state"])
+        if not run_stage(queue, job, options):
+            break
+        if on_stage:
+            on_stage(job, stage)
+    else:
+        queue.release(job)
+    return job
+
+
+def job_result(job: Dict[str, Any], include_text: bool = False) -> Dict[str, Any]:
+    """
+    Resumen de un job en el formato de respuesta del orquestador. Transcripción
+    y traducción van como referencia (idioma, tamaño y URL) salvo que se pida
+    ``include_text``.
+    """
+    results = job["results"]
+    tts = results.get("tts") or {}
+    return {
+        "title": job["title"],
+        "audio_url": job["audio_url"],  # URL original del podcast
+        "status": job["state"],
+        "transcript": _text_field(job, "transcribe", "transcript", include_text),
+        "translation": _text_field(job, "translate", "translation", include_text),
+        "tts_audio_url": tts.get("audio_url"),
+        "subtitles": results.get("subtitles") or {},
+        "error": job.get("last_error") if job["state"] != DONE else None,
+    }
+
+
+def _text_field(job: Dict[str, Any], stage: str, name: str, include_text: bool):
+    result = job["results"].get(stage)
+    if not result:
+        return None
+    if include_text:
+        transcript = load_text(job["episode_key"], result)
+        return transcript.text if transcript else None
+    if "artifact" not in result:
+        # Job anterior a las referencias: el texto ya está en el resultado
+        return {"chars": len(result.get("text") or ""), "url": f"/jobs/{job['id']}/{name}"}
+    return {"lang": result["lang"], "chars": result["chars"], "url": f"/jobs/{job['id']}/{name}"}
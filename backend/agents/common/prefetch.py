@@ -0,0 +1,407 @@
+"""
+Descarga anticipada del audio de los episodios recién detectados.
+
+El feed monitor encola aquí el enclosure de cada episodio admitido y un
+worker en segundo plano lo descarga a ``STORAGE_DIR/prefetch/`` mientras el
+job espera turno. Cuando el episodio llega a transcripción, el audio ya es
+local (o se está terminando de bajar y se espera a que acabe) y la descarga
+sale del camino crítico. Si aún estaba en cola, la transcripción la reclama
+y la descarga ella misma, sin bajarlo dos veces.
+
+- Concurrencia: ``PREFETCH_CONCURRENCY`` descargas simultáneas.
+- Ancho de banda: ``PREFETCH_MAX_KBPS`` KiB/s entre todas (0 = sin límite).
+- Reanudación: la descarga se escribe en ``<fichero>.part`` y un reintento
+  (del mismo worker o de otro tras una caída) continúa con ``Range`` e
+  ``If-Range``, así que si el audio cambió en el servidor se empieza de cero.
+
+El estado vive en ``DATA_DIR/prefetch.db``; solo hay un worker por
+DATA_DIR (cerrojo en ``prefetch.lock``), que termina tras
+``PREFETCH_IDLE_SECONDS`` sin trabajo. La transcripción borra el fichero al
+terminar (si aún se está descargando, al acabar la descarga); los que nadie
+reclama se borran con:
+  python -m common.prefetch gc --max-age-days 7
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Any, Dict, Iterable, Optional
+
+from common.db import connect, db_path
+from common.media_store import STORAGE_DIR
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") != "0"
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "2"))
+PREFETCH_MAX_KBPS = float(os.getenv("PREFETCH_MAX_KBPS", "0"))
+PREFETCH_MAX_ATTEMPTS = int(os.getenv("PREFETCH_MAX_ATTEMPTS", "5"))
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", "30"))
+# Máximo que la transcripción espera a una descarga en curso antes de ir a la URL
+PREFETCH_WAIT_SECONDS = float(os.getenv("PREFETCH_WAIT_SECONDS", "600"))
+PREFETCH_TIMEOUT = float(os.getenv("PREFETCH_TIMEOUT", "30"))
+
+PREFETCH_SUBDIR = "prefetch"
+USER_AGENT = "GlobalPodcaster/1.0"
+QUEUED, DOWNLOADING, DONE, FAILED = "queued", "downloading", "done", "failed"
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Un worker que no da señales en este tiempo se considera caído
+LEASE_S = 60.0
+_CHUNK = 256 * 1024
+_HEARTBEAT_S = 1.0
+_POLL_S = 0.5
+_RETRY_BASE_S = 5.0
+
+
+def prefetch_path(audio_url: str) -> str:
+    """Ruta absoluta: el worker corre en AGENTS_DIR y quien la lee, en otro directorio."""
+    key = hashlib.sha1(audio_url.encode()).hexdigest()[:16]
+    ext = os.path.splitext(urllib.parse.urlparse(audio_url).path)[1].lstrip(".").lower()
+    if not re.fullmatch(r"[a-z0-9]{1,5}", ext):
+        ext = "mp3"
+    return os.path.abspath(os.path.join(STORAGE_DIR, PREFETCH_SUBDIR, key[:2], f"{key}.{ext}"))
+
+
+class Throttle:
+    """Token bucket en bytes/s compartido por los hilos de descarga (ráfaga de un segundo)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._tokens = rate
+        self._updated = time.monotonic()
+
+    def consume(self, n: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate) - n
+            self._updated = now
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+class Prefetcher:
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("prefetch.db"))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS downloads (
+                audio_url TEXT PRIMARY KEY, path TEXT NOT NULL, state TEXT NOT NULL,
+                bytes INTEGER NOT NULL DEFAULT 0, total INTEGER, validator TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL, error TEXT,
+                discard INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL, updated REAL NOT NULL)
+        """)
+        # Bases de datos anteriores a los descartes diferidos
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(downloads)")}
+        if "discard" not in columns:
+            self.conn.execute("ALTER TABLE downloads ADD COLUMN discard INTEGER NOT NULL DEFAULT 0")
+
+    # --- Cola ---
+
+    def request(self, audio_urls: Iterable[str]) -> int:
+        """Encola las descargas (las fallidas se reintentan); devuelve cuántas quedaron pendientes."""
+        now = time.time()
+        queued = 0
+        with self._lock:
+            for url in dict.fromkeys(u for u in audio_urls if u):
+                cur = self.conn.execute(
+                    "INSERT INTO downloads (audio_url, path, state, created, updated) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(audio_url) DO UPDATE SET path = excluded.path, state = excluded.state, attempts = 0, "
+                    "lease_until = NULL, updated = excluded.updated WHERE state = 'failed'",
+                    (url, prefetch_path(url), QUEUED, now, now),
+                )
+                queued += cur.rowcount
+        return queued
+
+    def claim(self, audio_url: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Siguiente descarga pendiente (o abandonada por un worker caído). Con
+        ``audio_url``, esa descarga aunque esté esperando su reintento: quien
+        la pide la necesita ya.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if audio_url is None:
+                    row = conn.execute(
+                        "SELECT * FROM downloads WHERE discard = 0 AND ((state = ? AND "
+                        "(lease_until IS NULL OR lease_until < ?)) OR (state = ? AND lease_until < ?)) "
+                        "ORDER BY created LIMIT 1",
+                        (QUEUED, now, DOWNLOADING, now),
+                    ).fetchone()
+                else:
+                    row = conn.execute(
+                        "SELECT * FROM downloads WHERE audio_url = ? AND discard = 0 AND "
+                        "(state = ? OR (state = ? AND lease_until < ?))",
+                        (audio_url, QUEUED, DOWNLOADING, now),
+                    ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE downloads SET state = ?, attempts = attempts + 1, lease_until = ?, updated = ? "
+                        "WHERE audio_url = ?",
+                        (DOWNLOADING, now + LEASE_S, now, row["audio_url"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        # Quien reclama puede no correr en AGENTS_DIR (filas antiguas con ruta relativa)
+        return dict(row, attempts=row["attempts"] + 1, path=os.path.join(AGENTS_DIR, row["path"]))
+
+    def _update(self, audio_url: str, **fields):
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self.conn.execute(f"UPDATE downloads SET {assignments} WHERE audio_url = ?",
+                              (*fields.values(), audio_url))
+
+    def get(self, audio_url: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM downloads WHERE audio_url = ?", (audio_url,)).fetchone()
+        if row is None:
+            return None
+        # Filas antiguas con ruta relativa al directorio del worker
+        return {**dict(row), "path": os.path.join(AGENTS_DIR, row["path"])}
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT state, COUNT(*) AS n FROM downloads GROUP BY state").fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    # --- Descarga ---
+
+    def download(self, job: Dict[str, Any], throttle: Throttle):
+        """Descarga (o continúa) un audio reclamado y deja constancia del resultado."""
+        url, path = job["audio_url"], job["path"]
+        try:
+            self._fetch(url, path, job.get("validator"), throttle)
+        except Exception as e:
+            failed = job["attempts"] >= PREFETCH_MAX_ATTEMPTS
+            # En cola de nuevo, con el lease como "no antes de" para espaciar los reintentos
+            retry_at = time.time() + _RETRY_BASE_S * 2 ** (job["attempts"] - 1)
+            self._update(url, state=FAILED if failed else QUEUED, lease_until=None if failed else retry_at,
+                         error=str(e))
+        else:
+            self._update(url, state=DONE, bytes=os.path.getsize(path), lease_until=None, error=None)
+        # Descartada mientras se descargaba: se borra ahora que ya no está en curso
+        row = self.get(url)
+        if row is not None and row["discard"]:
+            self.discard(url)
+
+    def _fetch(self, url: str, path: str, validator: Optional[str], throttle: Throttle):
+        part = path + ".part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {"User-Agent": USER_AGENT}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            if validator:
+                headers["If-Range"] = validator
+        try:
+            response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=PREFETCH_TIMEOUT)
+        except urllib.error.HTTPError as e:
+            if e.code == 416:
+                # El parcial no encaja con el fichero remoto: el reintento empieza de cero
+                os.remove(part)
+            raise
+        with response as r:
+            if offset and r.status != 206:
+                # El servidor no admite rangos o el fichero cambió: desde el principio
+                offset = 0
+            length = r.headers.get("Content-Length")
+            total = offset + int(length) if length else None
+            validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+            self._update(url, total=total, validator=validator, bytes=offset)
+            done, beat = offset, time.monotonic()
+            with open(part, "r+b" if offset else "wb") as f:
+                f.seek(offset)
+                f.truncate()
+                while True:
+                    chunk = r.read(_CHUNK)
+                    if not chunk:
+                        break
+                    throttle.consume(len(chunk))
+                    f.write(chunk)
+                    done += len(chunk)
+                    if time.monotonic() - beat >= _HEARTBEAT_S:
+                        beat = time.monotonic()
+                        self._update(url, bytes=done, lease_until=time.time() + LEASE_S)
+        if total is not None and done < total:
+            raise IOError(f"incomplete download ({done}/{total} bytes)")
+        os.replace(part, path)
+
+    # --- Consumidores ---
+
+    def resolve(self, audio_url: str, wait: float = PREFETCH_WAIT_SECONDS) -> Optional[str]:
+        """
+        Ruta local del audio si ya está descargado. Si se está descargando,
+        espera a que termine mientras el worker siga vivo (hasta ``wait``
+        segundos); si sigue en cola (o su worker cayó), la reclama y la
+        descarga aquí, una sola vez. Si no está o no se pudo bajar, None.
+        """
+        deadline = time.monotonic() + wait
+        claimed = False
+        while True:
+            row = self.get(audio_url)
+            if row is None or row["state"] == FAILED:
+                return None
+            if row["state"] == DONE:
+                return row["path"] if os.path.exists(row["path"]) else None
+            alive = row["state"] == DOWNLOADING and (row["lease_until"] or 0) > time.time()
+            if not alive:
+                if claimed:
+                    return None
+                claimed = True
+                job = self.claim(audio_url)
+                if job is not None:
+                    self.download(job, Throttle(0))
+                continue
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(_POLL_S)
+
+    def discard(self, audio_url: str):
+        """
+        El audio ya no hace falta (transcripción terminada). Si se está
+        descargando, se marca y se borra cuando la descarga acabe.
+        """
+        with self._lock:
+            cur = self.conn.execute(
+                "UPDATE downloads SET discard = 1 WHERE audio_url = ? AND state = ? AND lease_until >= ?",
+                (audio_url, DOWNLOADING, time.time()),
+            )
+        if cur.rowcount:
+            return
+        row = self.get(audio_url)
+        if row is None:
+            return
+        for path in (row["path"], row["path"] + ".part"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            self.conn.execute("DELETE FROM downloads WHERE audio_url = ?", (audio_url,))
+
+    def gc(self, max_age_days: float) -> int:
+        """Borra las descargas que nadie usó en ``max_age_days`` (y las de workers caídos)."""
+        now = time.time()
+        cutoff = now - max_age_days * 86400
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT audio_url FROM downloads WHERE updated < ? AND (state != ? OR lease_until < ?)",
+                (cutoff, DOWNLOADING, now),
+            ).fetchall()
+        for row in rows:
+            self.discard(row["audio_url"])
+        return len(rows)
+
+
+_default: Optional[Prefetcher] = None
+
+
+def default_prefetcher() -> Prefetcher:
+    global _default
+    if _default is None:
+        _default = Prefetcher()
+    return _default
+
+
+# --- Worker ---
+
+def _lock_path() -> str:
+    return db_path("prefetch.lock")
+
+
+def worker_running() -> bool:
+    try:
+        with open(_lock_path(), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    return False
+
+
+def run_worker(concurrency: int = PREFETCH_CONCURRENCY, max_kbps: float = PREFETCH_MAX_KBPS,
+               idle: float = PREFETCH_IDLE_SECONDS):
+    """Descarga la cola con ``concurrency`` hilos; termina tras ``idle`` segundos sin trabajo."""
+    lock = open(_lock_path(), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return
+    throttle = Throttle(max_kbps * 1024)
+
+    def loop():
+        prefetcher = Prefetcher()
+        last_work = time.monotonic()
+        while time.monotonic() - last_work < idle:
+            job = prefetcher.claim()
+            if job is None:
+                time.sleep(_POLL_S)
+                continue
+            prefetcher.download(job, throttle)
+            last_work = time.monotonic()
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def start_prefetch(audio_urls: Iterable[str]) -> Dict[str, Any]:
+    """Encola las descargas y lanza el worker en segundo plano si no hay uno."""
+    if not PREFETCH_ENABLED:
+        return {"status": "disabled"}
+    queued = default_prefetcher().request(audio_urls)
+    if queued and not worker_running():
+        subprocess.Popen(
+            [sys.executable, "-m", "common.prefetch", "worker"],
+            cwd=AGENTS_DIR,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    return {"status": "queued", "count": queued}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Descarga anticipada del audio de los episodios")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="descarga la cola pendiente")
+    worker.add_argument("--concurrency", type=int, default=PREFETCH_CONCURRENCY)
+    worker.add_argument("--max-kbps", type=float, default=PREFETCH_MAX_KBPS)
+    worker.add_argument("--idle", type=float, default=PREFETCH_IDLE_SECONDS)
+    gc = sub.add_parser("gc", help="borra las descargas sin usar")
+    gc.add_argument("--max-age-days", type=float, default=7)
+    sub.add_parser("status", help="descargas por estado")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.concurrency, args.max_kbps, args.idle)
+    elif args.command == "gc":
+        print(json.dumps({"removed": default_prefetcher().gc(args.max_age_days)}))
+    else:
+        print(json.dumps(default_prefetcher().counts(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Perfilado bajo demanda de un agente en marcha.
+
+Cada agente acepta, por el mismo canal Coral, mensajes de control (campo
+``command``; en el feed monitor también como ``content``):
+
+- ``PROFILE:start``: perfila los siguientes ``messages`` mensajes (por
+  defecto ``PROFILE_MESSAGES``; también ``PROFILE:start:<n>``). ``mode`` es
+  ``cprofile`` (determinista, solo el hilo que atiende el mensaje) o
+  ``sampling`` (muestreo de las pilas de todos los hilos cada
+  ``PROFILE_SAMPLE_MS``: ve también los hilos de los hedgers y del event
+  loop). Con ``memory`` (por defecto sí) activa tracemalloc durante la sesión.
+- ``PROFILE:stop``: termina la sesión (si sigue activa) y devuelve el informe.
+- ``STATS``: RSS, mensajes atendidos, estado del perfilado, las mayores
+  asignaciones si tracemalloc está activo y el último informe.
+
+El informe lista las funciones más calientes (``top``) y las líneas con más
+memoria asignada. Sin sesión activa el coste por mensaje es comprobar si la
+línea es un mensaje de control (corto) y un ``yield``: ni cProfile, ni el
+muestreador ni tracemalloc están activos.
+
+Uso en el bucle de un agente:
+    profiler = AgentProfiler("tts-agent")
+    for line in profiler.lines(sys.stdin):
+        ...
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import re
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+PROFILE_MESSAGES = int(os.getenv("PROFILE_MESSAGES", "10"))
+PROFILE_TOP = int(os.getenv("PROFILE_TOP", "25"))
+PROFILE_SAMPLE_MS = float(os.getenv("PROFILE_SAMPLE_MS", "5"))
+# Marcos de pila que guarda tracemalloc por asignación
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "1"))
+
+CPROFILE, SAMPLING = "cprofile", "sampling"
+_NULL = nullcontext()
+_CONTROL_MAX_CHARS = 4096
+_CONTROL_WORDS = re.compile(r"PROFILE:|STATS", re.IGNORECASE)
+
+
+def rss_bytes() -> Dict[str, int]:
+    """RSS actual (de /proc, si existe) y máximo del proceso."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss viene en KiB en Linux y en bytes en macOS
+    peak = peak if sys.platform == "darwin" else peak * 1024
+    current = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) * 1024
+                    break
+    except OSError:
+        pass
+    return {"rss_bytes": current if current is not None else peak, "peak_rss_bytes": peak}
+
+
+def _flag(value: Any) -> bool:
+    """Booleano de un argumento JSON: ``true``/``false``, 0/1 o esas palabras como texto."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ("1", "true", "yes", "on", "0", "false", "no", "off"):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    raise ValueError(f"Invalid flag: {value!r}")
+
+
+def _label(filename: str, lineno: int, name: str) -> str:
+    return f"{filename}:{lineno}({name})"
+
+
+class _Sampler:
+    """Muestrea las pilas de todos los hilos (menos el suyo) mientras está reanudado."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.own: Counter = Counter()
+        self.total: Counter = Counter()
+        self._running = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        me = threading.get_ident()
+        while not self._stop.is_set():
+            self._running.wait()
+            if self._stop.wait(self.interval):
+                break
+            if not self._running.is_set():
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if not seen:
+                        self.own[key] += 1
+                    if key not in seen:
+                        self.total[key] += 1
+                        seen.add(key)
+                    frame = frame.f_back
+            self.samples += 1
+
+    def enable(self):
+        self._running.set()
+
+    def disable(self):
+        self._running.clear()
+
+    def close(self):
+        self._stop.set()
+        self._running.set()
+        self._thread.join()
+
+    def report(self, top: int) -> Dict[str, Any]:
+        n = self.samples or 1
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "functions": [
+                {"function": _label(*key), "self_samples": count, "total_samples": self.total[key],
+                 "self_pct": round(100 * count / n, 1), "total_pct": round(100 * self.total[key] / n, 1)}
+                for key, count in self.own.most_common(top)
+            ],
+        }
+
+
+class _Session:
+    def __init__(self, mode: str, messages: int, memory: bool, top: int):
+        self.mode = mode
+        self.remaining = messages
+        self.messages = 0
+        self.top = top
+        self.started = time.time()
+        self.busy_s = 0.0
+        self._resumed_at = 0.0
+        self.profile = cProfile.Profile() if mode == CPROFILE else None
+        self.sampler = _Sampler(PROFILE_SAMPLE_MS / 1000) if mode == SAMPLING else None
+        self.memory = memory and not tracemalloc.is_tracing()
+        if self.memory:
+            tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+        self.rss_start = rss_bytes()["rss_bytes"]
+
+    def resume(self):
+        self._resumed_at = time.perf_counter()
+        if self.profile is not None:
+            self.profile.enable()
+        else:
+            self.sampler.enable()
+
+    def pause(self):
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            self.sampler.disable()
+        self.busy_s += time.perf_counter() - self._resumed_at
+        self.messages += 1
+        self.remaining -= 1
+
+    def finish(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {
+            "mode": self.mode,
+            "messages": self.messages,
+            "started": self.started,
+            "duration_s": round(time.time() - self.started, 3),
+            "busy_s": round(self.busy_s, 3),
+            "rss_start_bytes": self.rss_start,
+            **rss_bytes(),
+        }
+        if self.profile is not None:
+            # Sin mensajes perfilados el perfil está vacío y pstats no lo acepta
+            report["functions"] = _cprofile_top(self.profile, self.top) if self.messages else []
+        else:
+            self.sampler.close()
+            report.update(self.sampler.report(self.top))
+        if self.memory:
+            report["memory"] = memory_top(self.top)
+            tracemalloc.stop()
+        return report
+
+
+def _cprofile_top(profile: cProfile.Profile, top: int) -> List[Dict[str, Any]]:
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return [
+        {"function": _label(*key), "calls": nc, "primitive_calls": cc,
+         "tottime_s": round(tt, 6), "cumtime_s": round(ct, 6)}
+        for key, (cc, nc, tt, ct, _) in rows
+    ]
+
+
+def memory_top(top: int = PROFILE_TOP) -> Optional[Dict[str, Any]]:
+    """Líneas con más memoria asignada viva según tracemalloc (None si no está activo)."""
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    return {
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "bytes": stat.size, "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:top]],
+    }
+
+
+class AgentProfiler:
+    def __init__(self, agent: str):
+        self.agent = agent
+        self.started = time.time()
+        self.messages = 0
+        self._session: Optional[_Session] = None
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    # --- Comandos de control ---
+
+    @staticmethod
+    def command(msg: Dict[str, Any], from_content: bool = False) -> Optional[str]:
+        """Comando de control del mensaje (``PROFILE:...`` o ``STATS``), en mayúsculas, o None."""
+        command = msg.get("command")
+        if command is None and from_content:
+            command = msg.get("content")
+        if not isinstance(command, str):
+            return None
+        command = command.strip().upper()
+        if command == "STATS" or command.startswith("PROFILE:"):
+            return command
+        return None
+
+    def control(self, msg: Dict[str, Any], command: str) -> Dict[str, Any]:
+        """Ejecuta un comando de control y devuelve el ``content`` de la respuesta."""
+        if command == "STATS":
+            return self.stats()
+        parts = command.split(":")
+        action = parts[1] if len(parts) > 1 else ""
+        if action == "START":
+            try:
+                messages = int(parts[2]) if len(parts) > 2 and parts[2] else int(msg.get("messages", PROFILE_MESSAGES))
+                top = int(msg.get("top", PROFILE_TOP))
+                memory = _flag(msg.get("memory", True))
+            except (TypeError, ValueError):
+                return {"error": f"Invalid profiling arguments: {command}",
+                        "usage": "PROFILE:start[:n] with integer messages and top, boolean memory"}
+            return self.start(messages, str(msg.get("mode", CPROFILE)).lower(), memory, top)
+        if action == "STOP":
+            return self.stop()
+        return {"error": f"Unknown profiling command: {command}",
+                "supported_commands": ["PROFILE:start[:n]", "PROFILE:stop", "STATS"]}
+
+    def start(self, messages: int = PROFILE_MESSAGES, mode: str = CPROFILE, memory: bool = True,
+              top: int = PROFILE_TOP) -> Dict[str, Any]:
+        if mode not in (CPROFILE, SAMPLING):
+            return {"error": f"Unknown profiling mode: {mode}", "modes": [CPROFILE, SAMPLING]}
+        if self._session is not None:
+            return {"error": "Profiling already active", "profiling": self._state()}
+        self._session = _Session(mode, max(1, messages), memory, top)
+        return {"status": "profiling", "profiling": self._state()}
+
+    def stop(self) -> Dict[str, Any]:
+        if self._session is not None:
+            self._finish()
+        if self.last_report is None:
+            return {"error": "No profile recorded"}
+        return {"status": "stopped", "report": self.last_report}
+
+    def _finish(self):
+        session, self._session = self._session, None
+        self.last_report = session.finish()
+
+    def _state(self) -> Optional[Dict[str, Any]]:
+        session = self._session
+        if session is None:
+            return None
+        return {"mode": session.mode, "messages_profiled": session.messages,
+                "messages_remaining": session.remaining, "memory": session.memory}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agent": self.agent,
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started, 1),
+            "messages": self.messages,
+            "threads": threading.active_count(),
+            **rss_bytes(),
+            "profiling": self._state(),
+            "memory": memory_top(),
+            "last_report": self.last_report,
+        }
+
+    # --- Bucle de mensajes ---
+
+    @contextmanager
+    def _profiled(self):
+        session = self._session
+        session.resume()
+        try:
+            yield
+        finally:
+            session.pause()
+            self.messages += 1
+            if session.remaining <= 0 and self._session is session:
+                self._finish()
+
+    def message(self):
+        """Contexto que envuelve la atención de un mensaje normal (no de control)."""
+        if self._session is None:
+            self.messages += 1
+            return _NULL
+        return self._profiled()
+
+    def lines(self, stream: Iterable[str]) -> Iterator[str]:
+        """
+        Recorre las líneas de ``stream`` respondiendo a los mensajes de control
+        y perfilando (si hay sesión) la atención de cada uno de los demás.
+        """
+        for line in stream:
+            # Solo se decodifica aquí lo que puede ser un mensaje de control
+            # (siempre corto; el comando no distingue mayúsculas)
+            if len(line) < _CONTROL_MAX_CHARS and _CONTROL_WORDS.search(line):
+                response = self._control_line(line)
+                if response is not None:
+                    print(json.dumps(response), flush=True)
+                    continue
+            with self.message():
+                yield line
+
+    def _control_line(self, line: str) -> Optional[Dict[str, Any]]:
+        try:
+            msg = json.loads(line)
+        except ValueError:
+            return None
+        command = self.command(msg) if isinstance(msg, dict) else None
+        if command is None:
+            return None
+        return {
+            "sender": msg.get("receiver", self.agent),
+            "receiver": msg.get("sender", "unknown"),
+            "content": self.control(msg, command),
+        }
@@ -0,0 +1,93 @@
+"""
+Proyección de campos y paginación por cursor para respuestas de agentes y API.
+
+Los mensajes Coral y los endpoints aceptan ``fields``: una lista o una
+cadena separada por comas con los campos que quiere el llamante (``a.b``
+entra en un diccionario anidado; ``*`` devuelve el elemento completo). Sin
+``fields``, cada respuesta usa su proyección por defecto, normalmente solo
+los identificadores y el estado.
+
+Los cursores son opacos para el llamante: la clave de orden del último
+elemento devuelto, en JSON y base64 URL-safe. Al contrario que ``offset``,
+no se saltan ni repiten elementos si se indexan episodios entre dos páginas
+y la consulta no recorre las filas ya devueltas.
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+ALL = "*"
+
+# Proyecciones por defecto: identificadores y estado
+JOB_FIELDS = ("job_id", "status")
+EPISODE_FIELDS = ("guid", "job_id", "status")
+CATALOG_EPISODE_FIELDS = ("episode_key", "guid", "published")
+
+Fields = Optional[Union[str, Sequence[str]]]
+
+
+def parse_fields(value: Fields, default: Optional[Sequence[str]] = None) -> Optional[List[str]]:
+    """
+    Lista de campos pedida (``None`` = elemento completo). Sin valor se usa
+    ``default``.
+    """
+    if value is None or value == "" or value == []:
+        value = default
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = [str(field).strip() for field in value if str(field).strip()]
+    if not fields or ALL in fields:
+        return None
+    return fields
+
+
+def _get(item: Dict[str, Any], path: str):
+    value: Any = item
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None, False
+        value = value[part]
+    return value, True
+
+
+def project(item: Any, fields: Optional[Sequence[str]]) -> Any:
+    """Solo los campos pedidos del elemento (los que no tiene se omiten)."""
+    if fields is None or not isinstance(item, dict):
+        return item
+    out: Dict[str, Any] = {}
+    for path in fields:
+        value, found = _get(item, path)
+        if not found:
+            continue
+        *parents, leaf = path.split(".")
+        node = out
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = value
+    return out
+
+
+def project_all(items: Iterable[Any], fields: Optional[Sequence[str]]) -> List[Any]:
+    return [project(item, fields) for item in items]
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[List[Any]]:
+    """Clave de orden del cursor; ``ValueError`` si no es un cursor válido."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    if not isinstance(key, list):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return key
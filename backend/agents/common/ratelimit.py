@@ -0,0 +1,253 @@
+"""
+Limitador de peticiones y presupuesto por proveedor, compartido entre procesos.
+
+Cada proveedor (deepgram, mistral, elevenlabs) tiene:
+- un token bucket de peticiones/segundo,
+- un máximo de peticiones simultáneas (leases con caducidad),
+- un presupuesto de créditos por periodo (segundos de audio, tokens o
+  caracteres según el proveedor).
+
+El estado vive en ``DATA_DIR/ratelimit.db`` para que todos los agentes (que
+son procesos independientes) lo compartan. Antes de llamar a un proveedor,
+``near_limit`` permite enviar el trabajo a un fallback sin esperar al error.
+
+Configuración por variables de entorno, p. ej. para ElevenLabs:
+  ELEVENLABS_RPS, ELEVENLABS_MAX_CONCURRENCY, ELEVENLABS_BUDGET,
+  ELEVENLABS_BUDGET_PERIOD (segundos), ELEVENLABS_SOFT_LIMIT (fracción)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from common.db import connect, db_path
+
+LEASE_TTL_S = 600
+# Pausa tras un error de cuota del proveedor cuando no hay presupuesto configurado
+QUOTA_COOLDOWN_S = float(os.getenv("QUOTA_COOLDOWN_S", "3600"))
+_POLL_S = 0.05
+
+
+class ProviderLimits(NamedTuple):
+    rps: float
+    max_concurrency: int
+    budget: float  # créditos por periodo (0 = sin límite)
+    budget_period: float  # segundos
+    soft_limit: float  # fracción del presupuesto a partir de la cual degradar
+
+
+_DEFAULTS = {
+    # unidades de presupuesto: deepgram=segundos de audio, mistral=tokens, elevenlabs=caracteres
+    "deepgram": ProviderLimits(10.0, 20, 0, 30 * 86400, 0.9),
+    "mistral": ProviderLimits(1.0, 2, 0, 30 * 86400, 0.9),
+    "elevenlabs": ProviderLimits(2.0, 2, 0, 30 * 86400, 0.9),
+    "gtts": ProviderLimits(2.0, 4, 0, 30 * 86400, 0.9),
+}
+
+
+def load_limits(provider: str) -> ProviderLimits:
+    base = _DEFAULTS.get(provider, ProviderLimits(1.0, 1, 0, 30 * 86400, 0.9))
+    prefix = provider.upper().replace("-", "_")
+    return ProviderLimits(
+        float(os.getenv(f"{prefix}_RPS", base.rps)),
+        int(os.getenv(f"{prefix}_MAX_CONCURRENCY", base.max_concurrency)),
+        float(os.getenv(f"{prefix}_BUDGET", base.budget)),
+        float(os.getenv(f"{prefix}_BUDGET_PERIOD", base.budget_period)),
+        float(os.getenv(f"{prefix}_SOFT_LIMIT", base.soft_limit)),
+    )
+
+
+class RateLimitTimeout(Exception):
+    """No se obtuvo turno del proveedor dentro del tiempo máximo."""
+
+
+class BudgetExhausted(Exception):
+    """El presupuesto del periodo no alcanza para la petición."""
+
+
+class Lease:
+    """Turno concedido por el limitador; se libera al salir del ``with``."""
+
+    def __init__(self, limiter: "RateLimiter", lease_id: int):
+        self.limiter = limiter
+        self.lease_id = lease_id
+
+    def release(self):
+        if self.lease_id is not None:
+            self.limiter._release(self.lease_id)
+            self.lease_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class RateLimiter:
+    def __init__(self, provider: str, limits: Optional[ProviderLimits] = None, path: Optional[str] = None):
+        self.provider = provider
+        self.limits = limits or load_limits(provider)
+        self._lock = threading.RLock()
+        self.conn = connect(path or db_path("ratelimit.db"))
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS buckets (
+                provider TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS leases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, provider TEXT NOT NULL,
+                pid INTEGER NOT NULL, expires REAL NOT NULL);
+            CREATE TABLE IF NOT EXISTS usage (
+                provider TEXT NOT NULL, period_start REAL NOT NULL, used REAL NOT NULL,
+                PRIMARY KEY (provider, period_start));
+            CREATE TABLE IF NOT EXISTS blocks (
+                provider TEXT PRIMARY KEY, until REAL NOT NULL);
+        """)
+
+    # --- Presupuesto ---
+
+    def _period_start(self, now: float) -> float:
+        period = self.limits.budget_period
+        return math.floor(now / period) * period
+
+    def used(self) -> float:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT used FROM usage WHERE provider = ? AND period_start = ?",
+                (self.provider, self._period_start(time.time())),
+            ).fetchone()
+        return row["used"] if row else 0.0
+
+    def blocked(self) -> bool:
+        with self._lock:
+            row = self.conn.execute("SELECT until FROM blocks WHERE provider = ?", (self.provider,)).fetchone()
+        return bool(row) and row["until"] > time.time()
+
+    def remaining_budget(self) -> float:
+        if not self.limits.budget:
+            return math.inf
+        return max(0.0, self.limits.budget - self.used())
+
+    def near_limit(self, cost: float = 0) -> bool:
+        """True si la petición dejaría el consumo por encima del límite blando."""
+        if self.blocked():
+            return True
+        if not self.limits.budget:
+            return False
+        return self.used() + cost > self.limits.budget * self.limits.soft_limit
+
+    def record(self, cost: float):
+        """Suma el consumo real (créditos) del periodo actual."""
+        if not cost:
+            return
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO usage VALUES (?, ?, ?) ON CONFLICT(provider, period_start) "
+                "DO UPDATE SET used = used + excluded.used",
+                (self.provider, self._period_start(time.time()), cost),
+            )
+
+    def mark_exhausted(self, cooldown: float = QUOTA_COOLDOWN_S):
+        """El proveedor respondió sin créditos: el resto de agentes degradan ya."""
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO blocks VALUES (?, ?)", (self.provider, time.time() + cooldown))
+
+    # --- Ritmo y concurrencia ---
+
+    def _try_acquire(self, cost: float):
+        """Devuelve (lease_id, espera_sugerida) dentro de una transacción."""
+        with self._lock:
+            return self._try_acquire_locked(cost)
+
+    def _try_acquire_locked(self, cost: float):
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.limits.budget and self.used() + cost > self.limits.budget:
+                raise BudgetExhausted(f"{self.provider} budget exhausted for this period")
+            conn.execute("DELETE FROM leases WHERE provider = ? AND expires < ?", (self.provider, now))
+            active = conn.execute("SELECT COUNT(*) FROM leases WHERE provider = ?", (self.provider,)).fetchone()[0]
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE provider = ?", (self.provider,)).fetchone()
+            capacity = max(1.0, self.limits.rps)
+            tokens = capacity if row is None else min(capacity, row["tokens"] + (now - row["updated"]) * self.limits.rps)
+
+            if active >= self.limits.max_concurrency:
+                conn.execute("COMMIT")
+                return None, _POLL_S * 4
+            if tokens < 1.0:
+                conn.execute("COMMIT")
+                return None, (1.0 - tokens) / self.limits.rps
+
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (self.provider, tokens - 1.0, now))
+            cur = conn.execute("INSERT INTO leases (provider, pid, expires) VALUES (?, ?, ?)",
+                               (self.provider, os.getpid(), now + LEASE_TTL_S))
+            conn.execute("COMMIT")
+            return cur.lastrowid, 0.0
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _release(self, lease_id: int):
+        with self._lock:
+            self.conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+    def try_acquire(self, cost: float = 0) -> Optional[Lease]:
+        lease_id, _ = self._try_acquire(cost)
+        return Lease(self, lease_id) if lease_id is not None else None
+
+    def acquire(self, cost: float = 0, timeout: Optional[float] = None) -> Lease:
+        """Espera turno (cola) hasta ``timeout`` segundos; ``None`` = sin límite."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            lease_id, wait = self._try_acquire(cost)
+            if lease_id is not None:
+                return Lease(self, lease_id)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"{self.provider}: no slot within {timeout}s")
+            time.sleep(max(wait, _POLL_S))
+
+    async def acquire_async(self, cost: float = 0, timeout: Optional[float] = None) -> Lease:
+        """
+        Como ``acquire`` sin bloquear el event loop: cada intento (una
+        transacción SQLite que puede esperar al lock de otros procesos) va en
+        un hilo y la espera entre intentos es ``asyncio.sleep``.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            lease_id, wait = await self._try_acquire_async(cost)
+            if lease_id is not None:
+                return Lease(self, lease_id)
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimitTimeout(f"{self.provider}: no slot within {timeout}s")
+            await asyncio.sleep(max(wait, _POLL_S))
+
+    async def _try_acquire_async(self, cost: float):
+        attempt = asyncio.ensure_future(asyncio.to_thread(self._try_acquire, cost))
+        try:
+            return await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            # El intento sigue en su hilo: si llega a conceder turno, se libera
+            attempt.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, attempt: "asyncio.Future"):
+        if not attempt.cancelled() and attempt.exception() is None and attempt.result()[0] is not None:
+            self._release(attempt.result()[0])
+
+    def status(self) -> Dict[str, float]:
+        with self._lock:
+            active = self.conn.execute(
+                "SELECT COUNT(*) FROM leases WHERE provider = ? AND expires >= ?", (self.provider, time.time())
+            ).fetchone()[0]
+        return {
+            "provider": self.provider,
+            "in_flight": active,
+            "max_concurrency": self.limits.max_concurrency,
+            "rps": self.limits.rps,
+            "used": self.used(),
+            "budget": self.limits.budget,
+            "blocked": self.blocked(),
+        }
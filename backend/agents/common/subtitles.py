@@ -0,0 +1,91 @@
+"""
+Exportación de subtítulos SRT y WebVTT a partir de un Transcript.
+
+Las palabras se agrupan en cues de como mucho dos líneas y unos segundos de
+duración, cortando preferentemente en finales de frase y nunca a través de
+un cambio de párrafo.
+"""
+
+import os
+from typing import List, Tuple
+
+from common.transcript import Transcript
+
+LINE_CHARS = 42
+MAX_LINES = 2
+MAX_CUE_MS = 6000
+MIN_CUE_CHARS = 20
+
+Cue = Tuple[int, int, str]  # (inicio_ms, fin_ms, texto)
+
+
+def build_cues(transcript: Transcript) -> List[Cue]:
+    cues: List[Cue] = []
+    max_chars = LINE_CHARS * MAX_LINES
+    paragraph_starts = set(transcript.paragraphs)
+    words, starts, ends = transcript.words, transcript.starts, transcript.ends
+    cur: List[str] = []
+    cur_len = 0
+    cur_start = 0
+    for i, word in enumerate(words):
+        if cur and (
+            i in paragraph_starts
+            or cur_len + len(word) > max_chars
+            or ends[i] - cur_start > MAX_CUE_MS
+            or (cur_len >= MIN_CUE_CHARS and cur[-1][-1:] in ".?!")
+        ):
+            cues.append((cur_start, ends[i - 1], _wrap(cur)))
+            cur, cur_len = [], 0
+        if not cur:
+            cur_start = starts[i]
+        cur.append(word)
+        cur_len += len(word) + 1
+    if cur:
+        cues.append((cur_start, ends[len(words) - 1], _wrap(cur)))
+    return cues
+
+
+def _wrap(words: List[str]) -> str:
+    """Parte el texto en dos líneas equilibradas si no cabe en una."""
+    text = " ".join(words)
+    if len(text) <= LINE_CHARS:
+        return text
+    best, best_diff = len(words) // 2, len(text)
+    for i in range(1, len(words)):
+        diff = abs(len(" ".join(words[:i])) - len(" ".join(words[i:])))
+        if diff < best_diff:
+            best, best_diff = i, diff
+    return " ".join(words[:best]) + "\n" + " ".join(words[best:])
+
+
+def _timestamp(ms: int, sep: str) -> str:
+    h, rem = divmod(ms, 3600000)
+    m, rem = divmod(rem, 60000)
+    s, ms = divmod(rem, 1000)
+    return f"{h:02d}:{m:02d}:{s:02d}{sep}{ms:03d}"
+
+
+def to_srt(cues: List[Cue]) -> str:
+    blocks = [
+        f"{i}\n{_timestamp(a, ',')} --> {_timestamp(b, ',')}\n{text}\n"
+        for i, (a, b, text) in enumerate(cues, 1)
+    ]
+    return "\n".join(blocks)
+
+
+def to_vtt(cues: List[Cue]) -> str:
+    blocks = [f"{_timestamp(a, '.')} --> {_timestamp(b, '.')}\n{text}\n" for a, b, text in cues]
+    return "WEBVTT\n\n" + "\n".join(blocks)
+
+
+def write_subtitles(transcript: Transcript, out_dir: str, name: str) -> List[str]:
+    """Escribe ``<name>.srt`` y ``<name>.vtt`` en ``out_dir`` y devuelve sus rutas."""
+    os.makedirs(out_dir, exist_ok=True)
+    cues = build_cues(transcript)
+    paths = []
+    for ext, render in (("srt", to_srt), ("vtt", to_vtt)):
+        path = os.path.join(out_dir, f"{name}.{ext}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render(cues))
+        paths.append(path)
+    return paths
@@ -0,0 +1,198 @@
+"""
+Modelo compacto de transcripción con timestamps por palabra.
+
+Las palabras se guardan en una lista y los tiempos/hablantes en ``array``
+paralelos (milisegundos como enteros), en lugar de un dict por palabra. Los
+párrafos se representan con el índice de su primera palabra. Transcripción,
+traducción y TTS intercambian este modelo vía ``to_dict``/``from_dict``.
+"""
+
+import re
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Pausa a partir de la cual se abre un párrafo nuevo
+PARAGRAPH_GAP_MS = 1500
+# Tamaño máximo de un párrafo antes de forzar el corte en un final de frase
+PARAGRAPH_MAX_WORDS = 120
+
+_SENTENCE_END = re.compile(r"[.!?…]['\")\]]*$")
+
+
+class Transcript:
+    __slots__ = ("lang", "words", "starts", "ends", "speakers", "paragraphs")
+
+    def __init__(self, lang: str = "en", words: Optional[List[str]] = None,
+                 starts: Iterable[int] = (), ends: Iterable[int] = (),
+                 speakers: Iterable[int] = (), paragraphs: Iterable[int] = ()):
+        self.lang = lang
+        self.words = words if words is not None else []
+        self.starts = array("I", starts)
+        self.ends = array("I", ends)
+        self.speakers = array("H", speakers) if speakers else array("H", bytes(2 * len(self.words)))
+        self.paragraphs = array("I", paragraphs) if paragraphs else array("I", [0] if self.words else [])
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(self.paragraph_texts())
+
+    @property
+    def duration(self) -> float:
+        return self.ends[-1] / 1000.0 if self.ends else 0.0
+
+    # --- Construcción ---
+
+    @classmethod
+    def from_deepgram_words(cls, words: List[Dict[str, Any]], lang: str = "en") -> "Transcript":
+        """Construye el modelo a partir de las palabras de Deepgram (ya desplazadas)."""
+        t = cls(lang)
+        last_end = None
+        last_speaker = None
+        count = 0
+        for w in words:
+            token = w.get("punctuated_word") or w.get("word", "")
+            if not token:
+                continue
+            start = int(round(w["start"] * 1000))
+            end = int(round(w["end"] * 1000))
+            speaker = int(w.get("speaker") or 0)
+            if last_end is not None and (
+                speaker != last_speaker
+                or start - last_end >= PARAGRAPH_GAP_MS
+                or (count >= PARAGRAPH_MAX_WORDS and _SENTENCE_END.search(t.words[-1]))
+            ):
+                t.paragraphs.append(len(t.words))
+                count = 0
+            t.words.append(token)
+            t.starts.append(start)
+            t.ends.append(end)
+            t.speakers.append(speaker)
+            last_end, last_speaker = end, speaker
+            count += 1
+        if t.words:
+            t.paragraphs.insert(0, 0)
+        return t
+
+    @classmethod
+    def from_text(cls, text: str, lang: str = "en") -> "Transcript":
+        """Modelo sin tiempos a partir de texto plano (párrafos por líneas en blanco)."""
+        return cls(lang).with_paragraphs([p for p in re.split(r"\n\s*\n", text) if p.strip()], lang)
+
+    def with_paragraphs(self, texts: List[str], lang: str) -> "Transcript":
+        """
+        Crea un modelo nuevo con un texto por párrafo (p. ej. la traducción).
+
+        Cada párrafo hereda el intervalo de tiempo y el hablante del original;
+        los tiempos de las palabras se reparten proporcionalmente a su longitud.
+        """
+        t = Transcript(lang)
+        spans = self.paragraph_spans()
+        for i, text in enumerate(texts):
+            tokens = text.split()
+            if not tokens:
+                continue
+            if i < len(spans):
+                a, b = spans[i]
+                p_start, p_end, speaker = self.starts[a], self.ends[b - 1], self.speakers[a]
+            else:
+                p_start = p_end = self.ends[-1] if self.ends else 0
+                speaker = 0
+            total = sum(len(tok) + 1 for tok in tokens)
+            span = p_end - p_start
+            t.paragraphs.append(len(t.words))
+            pos = 0
+            for tok in tokens:
+                t.words.append(tok)
+                t.starts.append(p_start + span * pos // total)
+                pos += len(tok) + 1
+                t.ends.append(p_start + span * pos // total)
+                t.speakers.append(speaker)
+        return t
+
+    # --- Acceso ---
+
+    def paragraph_spans(self) -> List[Tuple[int, int]]:
+        """Rangos [inicio, fin) de índices de palabra por párrafo."""
+        bounds = list(self.paragraphs) + [len(self.words)]
+        return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+    def paragraph_texts(self) -> List[str]:
+        return [" ".join(self.words[a:b]) for a, b in self.paragraph_spans()]
+
+    def chunks(self, max_chars: int) -> List[Tuple[str, float, float]]:
+        """
+        Agrupa párrafos consecutivos en bloques de hasta ``max_chars``.
+
+        Devuelve ``(texto, inicio_s, fin_s)``. Un párrafo más largo que el
+        límite se parte en finales de frase.
+        """
+        out: List[Tuple[str, float, float]] = []
+        cur: List[str] = []
+        cur_len = 0
+        cur_start = cur_end = 0
+        for a, b in self._sentence_bounded_spans(max_chars):
+            piece = " ".join(self.words[a:b])
+            if cur and cur_len + len(piece) + 1 > max_chars:
+                out.append((" ".join(cur), cur_start / 1000.0, cur_end / 1000.0))
+                cur, cur_len = [], 0
+            if not cur:
+                cur_start = self.starts[a]
+            cur.append(piece)
+            cur_len += len(piece) + 1
+            cur_end = self.ends[b - 1]
+        if cur:
+            out.append((" ".join(cur), cur_start / 1000.0, cur_end / 1000.0))
+        return out
+
+    def _sentence_bounded_spans(self, max_chars: int) -> List[Tuple[int, int]]:
+        spans = []
+        for a, b in self.paragraph_spans():
+            length = 0
+            start = a
+            for i in range(a, b):
+                length += len(self.words[i]) + 1
+                if length >= max_chars and _SENTENCE_END.search(self.words[i]) and i + 1 < b:
+                    spans.append((start, i + 1))
+                    start, length = i + 1, 0
+            spans.append((start, b))
+        return spans
+
+    def head(self, max_chars: int) -> "Transcript":
+        """Prefijo del modelo con como mucho ``max_chars`` caracteres de texto."""
+        length = 0
+        n = 0
+        for n, word in enumerate(self.words):
+            length += len(word) + 1
+            if length > max_chars:
+                break
+        else:
+            n = len(self.words)
+        paragraphs = [p for p in self.paragraphs if p < n]
+        return Transcript(self.lang, self.words[:n], self.starts[:n], self.ends[:n],
+                          self.speakers[:n], paragraphs)
+
+    # --- Serialización ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lang": self.lang,
+            "words": self.words,
+            "starts": self.starts.tolist(),
+            "ends": self.ends.tolist(),
+            "speakers": self.speakers.tolist(),
+            "paragraphs": self.paragraphs.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Transcript":
+        return cls(
+            data.get("lang", "en"),
+            list(data.get("words", [])),
+            data.get("starts", []),
+            data.get("ends", []),
+            data.get("speakers", []),
+            data.get("paragraphs", []),
+        )
@@ -0,0 +1,133 @@
+"""
+Workers de etapa sobre la cola persistente.
+
+Cada worker consume jobs de una sola etapa (los que están en el estado
+anterior a ella), se registra en la tabla ``workers`` de la misma base de
+datos que la cola y mantiene un heartbeat (también durante un job largo,
+desde un hilo aparte; el lease del job lo renueva ``pipeline.run_stage``).
+Varios procesos, o varias máquinas que compartan DATA_DIR, pueden consumir
+la misma cola.
+"""
+
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from common import pipeline
+from common.db import connect, db_path
+from common.jobqueue import STAGES, STATES, JobQueue
+
+# Tipo de paralelismo por etapa: "process" para las que usan CPU en el
+# propio worker (preparación de audio), "thread" para las que esperan E/S.
+STAGE_KIND = {
+    "transcribe": "process",
+    "translate": "thread",
+    "tts": "thread",
+    "subtitles": "thread",
+}
+IDLE_POLL_S = float(os.getenv("WORKER_IDLE_POLL_SECONDS", "2"))
+HEARTBEAT_S = 10.0
+
+
+def source_state(stage: str) -> str:
+    """Estado en el que un job espera a ``stage``."""
+    return STATES[[name for name, _ in STAGES].index(stage)]
+
+
+def default_counts() -> Dict[str, int]:
+    """Workers por etapa: núcleos para las de CPU, concurrencia fija para las de E/S."""
+    defaults = {"transcribe": os.cpu_count() or 1, "translate": 4, "tts": 2, "subtitles": 1}
+    return {stage: int(os.getenv(f"WORKERS_{stage.upper()}", n)) for stage, n in defaults.items()}
+
+
+class WorkerRegistry:
+    def __init__(self, path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("jobs.db"))
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                id TEXT PRIMARY KEY, host TEXT NOT NULL, pid INTEGER NOT NULL,
+                stage TEXT NOT NULL, kind TEXT NOT NULL, started REAL NOT NULL,
+                heartbeat REAL NOT NULL, jobs_done INTEGER NOT NULL DEFAULT 0,
+                jobs_failed INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL)
+        """)
+
+    def register(self, worker_id: str, stage: str, kind: str):
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO workers (id, host, pid, stage, kind, started, heartbeat, status) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 'idle')",
+                (worker_id, socket.gethostname(), os.getpid(), stage, kind, now, now),
+            )
+
+    def heartbeat(self, worker_id: str, status: str, done: int = 0, failed: int = 0):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE workers SET heartbeat = ?, status = ?, jobs_done = jobs_done + ?, "
+                "jobs_failed = jobs_failed + ? WHERE id = ?",
+                (time.time(), status, done, failed, worker_id),
+            )
+
+    @contextmanager
+    def beating(self, worker_id: str, status: str, every: float = HEARTBEAT_S):
+        """Heartbeat cada ``every`` segundos desde un hilo mientras dura el bloque."""
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(every):
+                self.heartbeat(worker_id, status)
+
+        thread = threading.Thread(target=loop, name=f"heartbeat-{worker_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def unregister(self, worker_id: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,))
+
+    def live(self, max_age: float = HEARTBEAT_S * 3) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM workers WHERE heartbeat >= ? ORDER BY stage, id", (time.time() - max_age,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def run_stage_worker(stage: str, worker_id: str, stop: threading.Event,
+                     options: Optional[Dict[str, Any]] = None):
+    """Bucle de un worker: reclama jobs de su etapa hasta que ``stop`` se activa."""
+    queue = JobQueue()
+    registry = WorkerRegistry()
+    registry.register(worker_id, stage, STAGE_KIND.get(stage, "thread"))
+    # Mantener vivo un proceso por agente en lugar de lanzar uno por mensaje
+    pipeline.use_persistent_agents()
+    states = [source_state(stage)]
+    last_beat = 0.0
+    try:
+        while not stop.is_set():
+            job = queue.claim(worker_id, states=states)
+            if job is None:
+                if time.time() - last_beat > HEARTBEAT_S:
+                    registry.heartbeat(worker_id, "idle")
+                    last_beat = time.time()
+                stop.wait(IDLE_POLL_S)
+                continue
+            status = f"job {job['id']}"
+            registry.heartbeat(worker_id, status)
+            with registry.beating(worker_id, status):
+                ok = pipeline.run_stage(queue, job, options)
+            if ok:
+                queue.release(job)
+            registry.heartbeat(worker_id, "idle", done=int(ok), failed=int(not ok))
+            last_beat = time.time()
+    finally:
+        pipeline.use_persistent_agents(False)
+        registry.unregister(worker_id)
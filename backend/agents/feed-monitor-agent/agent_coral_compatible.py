@@ -6,9 +6,17 @@ Este agente es stateless y sigue el protocolo stdin/stdout de Coral.
 Responde a comandos específicos para verificar feeds y detectar nuevos episodios.
 
 Comandos soportados:
-- CHECK_FEEDS: Verifica todos los feeds en feeds.txt
+- CHECK_FEEDS: Verifica todos los feeds del registro (feeds.txt se importa una vez)
 - CHECK_FEED: Verifica un feed específico (requiere URL en content)
 - GET_FEED_LIST: Devuelve la lista de feeds configurados
+- LIST_EPISODES: Episodios del catálogo (de ``feed_url`` o de todos), paginados por ``cursor``
+- QUEUE_STATUS: Profundidad de la cola de procesamiento
+- PROFILE:start[:n] / PROFILE:stop / STATS: Perfilado y memoria del agente (common.profiling)
+
+CHECK_FEEDS, CHECK_FEED y LIST_EPISODES aceptan ``fields`` (campos de cada
+episodio; ``*`` para todos) y ``limit``. Por defecto cada episodio va solo con
+sus identificadores y su estado. LIST_EPISODES con ``lang`` añade el título y
+la descripción traducidos (common.metadata_translation).
 
 Autor: GlobalPodcaster Team
 """
@@ -18,14 +26,33 @@ import os
 import json
 import subprocess
 import hashlib
-import time
-from typing import List, Dict, Any
-import feedparser
+from typing import List, Dict, Any, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.admission import QUEUE_HIGH_WATER, admit
+from common.catalog import default_catalog
+from common.feed_cache import fetch_feed
+from common.feed_registry import FeedRegistry
+from common.guid_index import GuidIndex
+from common.jobqueue import JobQueue
+from common.launcher import spawn_agent
+from common.metadata_translation import start_metadata_translation
+from common.prefetch import default_prefetcher, start_prefetch
+from common.profiling import AgentProfiler
+from common.projection import CATALOG_EPISODE_FIELDS, EPISODE_FIELDS, parse_fields, project_all
+from common.workers import WorkerRegistry
 
 # Configuración
 FEEDS_FILE = "feeds.txt"
 STATE_DIR = "feed_monitor_state"
 ORCHESTRATOR_SCRIPT = "../orchestrator/agent.py"
+# Episodios por página de LIST_EPISODES
+EPISODE_PAGE_SIZE = int(os.getenv("EPISODE_PAGE_SIZE", "100"))
+EPISODE_PAGE_MAX = 1000
+
+_registry = None
+_seen_index = None
+profiler = AgentProfiler("feed-monitor-agent")
 
 def log_error(message: str):
     """Envía mensajes de error a stderr para debugging."""
@@ -48,112 +75,80 @@ def get_state_dir() -> str:
     os.makedirs(state_path, exist_ok=True)
     return state_path
 
+def get_registry() -> FeedRegistry:
+    """Registro de feeds del proceso; en el primer uso importa feeds.txt si está vacío."""
+    global _registry
+    if _registry is None:
+        _registry = FeedRegistry()
+        migrated = _registry.migrate_feeds_txt(get_feeds_file_path())
+        if migrated:
+            log_info(f"Imported {migrated} feeds from {get_feeds_file_path()} into the feed registry")
+    return _registry
+
 def get_feeds() -> List[str]:
-    """Lee los feeds desde el archivo feeds.txt."""
-    feeds_path = get_feeds_file_path()
-    if not os.path.exists(feeds_path):
-        raise FileNotFoundError(f"Feeds file not found: {feeds_path}")
-    
-    feeds = []
-    with open(feeds_path, 'r') as f:
-        for line in f:
-            line = line.strip()
-            if line and not line.startswith('#'):
-                feeds.append(line)
-    
-    log_info(f"Loaded {len(feeds)} feeds from {feeds_path}")
+    """Feeds activos del registro (solo se releen si el registro cambió)."""
+    feeds = get_registry().active_urls()
+    log_info(f"Loaded {len(feeds)} feeds from the feed registry")
     return feeds
 
 def get_feed_id(feed_url: str) -> str:
     """Genera un ID único para un feed basado en su URL."""
     return hashlib.md5(feed_url.encode()).hexdigest()[:12]
 
-def get_last_check_file(feed_id: str) -> str:
-    """Obtiene la ruta del archivo que almacena el último check de un feed."""
-    state_dir = get_state_dir()
-    return os.path.join(state_dir, f"last_check_{feed_id}.json")
-
-def load_last_check(feed_id: str) -> Dict[str, Any]:
-    """Carga información del último check de un feed."""
-    last_check_file = get_last_check_file(feed_id)
-    if os.path.exists(last_check_file):
-        try:
-            with open(last_check_file, 'r') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            log_error(f"Error loading last check for feed {feed_id}: {e}")
-    
-    return {"episodes": [], "last_check": 0}
-
-def save_last_check(feed_id: str, episodes: List[str], timestamp: float):
-    """Guarda información del último check de un feed."""
-    last_check_file = get_last_check_file(feed_id)
-    data = {
-        "episodes": episodes,
-        "last_check": timestamp
-    }
-    try:
-        with open(last_check_file, 'w') as f:
-            json.dump(data, f, indent=2)
-    except IOError as e:
-        log_error(f"Error saving last check for feed {feed_id}: {e}")
+def get_seen_index() -> GuidIndex:
+    """Índice de GUIDs vistos por feed (hashes en disco con mmap; importa los last_check_*.json)."""
+    global _seen_index
+    if _seen_index is None:
+        _seen_index = GuidIndex(get_state_dir())
+    return _seen_index
 
-def fetch_feed_episodes(feed_url: str) -> List[Dict[str, Any]]:
-    """Obtiene los episodios de un feed RSS."""
+def fetch_feed_episodes(feed_url: str, fetched: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+    """
+    Obtiene los episodios de un feed RSS (a través de la caché compartida de
+    feeds). Con ``fetched``, guarda ahí las entradas completas del feed para
+    no volver a descargarlo en la misma revisión.
+    """
     try:
         log_info(f"Fetching feed: {feed_url}")
-        feed = feedparser.parse(feed_url)
-        
-        if feed.bozo and feed.bozo_exception:
-            log_error(f"Feed parsing warning for {feed_url}: {feed.bozo_exception}")
+        feed = fetch_feed(feed_url)
+        if fetched is not None:
+            fetched[feed_url] = feed['entries']
         
-        episodes = []
-        for entry in feed.entries:
-            # Buscar URL de audio
-            audio_url = None
-            if hasattr(entry, 'enclosures') and entry.enclosures:
-                for enclosure in entry.enclosures:
-                    if enclosure.get('type', '').startswith('audio/'):
-                        audio_url = enclosure.get('href')
-                        break
-            
-            episode = {
-                'title': getattr(entry, 'title', ''),
-                'link': getattr(entry, 'link', ''),
-                'published': getattr(entry, 'published', ''),
-                'summary': getattr(entry, 'summary', ''),
-                'audio_url': audio_url,
-                'guid': getattr(entry, 'id', entry.get('link', ''))
-            }
-            episodes.append(episode)
+        episodes = [dict(entry) for entry in feed['entries']]
         
         log_info(f"Found {len(episodes)} episodes in feed {feed_url}")
+        index_feed(feed_url, episodes, feed['title'])
+        # El resumen (HTML) solo lo necesita el catálogo
+        for episode in episodes:
+            episode.pop('summary', None)
         return episodes
         
     except Exception as e:
         log_error(f"Error fetching feed {feed_url}: {e}")
         return []
 
-def check_feed_for_new_episodes(feed_url: str) -> List[Dict[str, Any]]:
-    """Verifica un feed específico en busca de nuevos episodios."""
+def index_feed(feed_url: str, episodes: List[Dict[str, Any]], title: str = None):
+    """Actualiza el catálogo local con todas las entradas descargadas."""
+    try:
+        default_catalog().index_feed(feed_url, episodes, title)
+    except Exception as e:
+        log_error(f"Error indexing feed {feed_url}: {e}")
+
+def check_feed_for_new_episodes(feed_url: str, fetched: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[Dict[str, Any]]:
+    """
+    Verifica un feed específico en busca de nuevos episodios.
+    No los marca como vistos: eso depende de si la cola los admite.
+    """
     feed_id = get_feed_id(feed_url)
-    last_check = load_last_check(feed_id)
     
-    current_episodes = fetch_feed_episodes(feed_url)
+    current_episodes = fetch_feed_episodes(feed_url, fetched)
     if not current_episodes:
         return []
     
-    # Obtener GUIDs de episodios actuales y anteriores
-    current_guids = {ep['guid'] for ep in current_episodes if ep['guid']}
-    previous_guids = set(last_check.get('episodes', []))
-    
-    # Encontrar nuevos episodios
-    new_guids = current_guids - previous_guids
-    new_episodes = [ep for ep in current_episodes if ep['guid'] in new_guids]
-    
-    # Guardar el estado actual
-    current_time = time.time()
-    save_last_check(feed_id, list(current_guids), current_time)
+    # Encontrar nuevos episodios: una consulta vectorizada al índice por feed
+    current_episodes = [ep for ep in current_episodes if ep['guid']]
+    seen = get_seen_index().contains(feed_id, [ep['guid'] for ep in current_episodes])
+    new_episodes = [ep for ep, was_seen in zip(current_episodes, seen) if not was_seen]
     
     if new_episodes:
         log_info(f"Found {len(new_episodes)} new episodes in feed {feed_url}")
@@ -166,93 +161,152 @@ def check_feed_for_new_episodes(feed_url: str) -> List[Dict[str, Any]]:
     
     return new_episodes
 
-def notify_orchestrator(new_episodes: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Notifica al orquestador sobre nuevos episodios encontrados."""
-    if not new_episodes:
+def mark_seen(feed_url: str, guids: List[str]):
+    """Añade GUIDs al índice del feed (se crea si es la primera revisión)."""
+    get_seen_index().add(get_feed_id(feed_url), guids)
+
+def is_first_check(feed_url: str) -> bool:
+    return not get_seen_index().known(get_feed_id(feed_url))
+
+def admit_new_episodes(feeds: List[str], new_episodes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Encola los episodios que caben bajo la marca de nivel alto de la cola
+    (más recientes primero) y marca como vistos solo los admitidos y los
+    descartados (sin audio o, en la primera revisión de un feed, más allá del
+    límite de backfill); los aplazados se reintentan en la siguiente revisión.
+
+    Un feed solo deja de ser nuevo cuando se marca algún GUID suyo: si la
+    descarga falló, vino vacía o se aplazó todo, la siguiente revisión vuelve
+    a aplicar el límite de backfill.
+    """
+    first_time = [feed_url for feed_url in feeds if is_first_check(feed_url)]
+    admission = admit(JobQueue(), new_episodes, first_time_feeds=first_time)
+    
+    seen: Dict[str, List[str]] = {}
+    for episode in admission['admitted'] + admission['skipped']:
+        seen.setdefault(episode['feed_url'], []).append(episode['guid'])
+    for feed_url, guids in seen.items():
+        mark_seen(feed_url, guids)
+    
+    if admission['deferred']:
+        log_info(f"Queue at high-water mark: {len(admission['deferred'])} episodes deferred")
+    return admission
+
+def prefetch_audio(admitted: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Empieza a descargar en segundo plano el audio de los episodios admitidos,
+    para que ya esté en local cuando les toque la transcripción.
+    """
+    try:
+        return start_prefetch(episode.get('audio_url') for episode in admitted)
+    except Exception as e:
+        log_error(f"Error starting audio prefetch: {e}")
+        return {"status": "error", "error": str(e)}
+
+def translate_metadata(fetched: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Lanza en segundo plano la traducción de títulos y descripciones de los
+    feeds revisados (con las entradas que ya descargó la revisión), sin
+    esperar al audio de ningún episodio. Solo con METADATA_LANGS.
+    """
+    try:
+        return start_metadata_translation(list(fetched), entries_by_feed=fetched)
+    except Exception as e:
+        log_error(f"Error starting metadata translation: {e}")
+        return {"status": "error", "error": str(e)}
+
+def notify_orchestrator(admitted: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Avisa de que hay trabajo en la cola. Si hay un pool de workers vivo no
+    hace falta nada; si no, lanza el orquestador en segundo plano para que
+    la vacíe sin bloquear al monitor.
+    """
+    if not admitted:
         return {"status": "no_new_episodes", "count": 0}
     
     try:
-        orchestrator_path = os.path.join(os.path.dirname(__file__), ORCHESTRATOR_SCRIPT)
-        
-        # Agrupar episodios por feed para enviar en lote al orchestrator
-        results = []
-        
-        # El orchestrator actual espera un feed_url y maneja todo internamente
-        # Necesitamos adaptar para trabajar con la lógica existente
-        feeds_processed = set()
-        
-        for episode in new_episodes:
-            feed_url = episode.get('feed_url')
-            if not feed_url or feed_url in feeds_processed:
-                continue
-                
-            feeds_processed.add(feed_url)
-            
-            # El orchestrator espera el feed_url como content
-            coral_msg = {
-                "sender": "feed-monitor-agent",
-                "receiver": "orchestrator", 
-                "content": feed_url
-            }
-            
-            log_info(f"Sending feed URL to orchestrator: {feed_url}")
-            
-            proc = subprocess.Popen(
-                [sys.executable, orchestrator_path],
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            
-            stdout, stderr = proc.communicate(input=json.dumps(coral_msg) + "\n")
-            
-            if proc.returncode == 0:
-                # Filtrar solo las líneas que son JSON válidas (sin DEBUG)
-                lines = stdout.strip().split('\n')
-                json_lines = [line for line in lines if not line.startswith('DEBUG')]
-                
-                if json_lines:
-                    try:
-                        # Tomar la última línea JSON válida
-                        result_line = json_lines[-1]
-                        result = json.loads(result_line)
-                        results.append(result)
-                        log_info(f"Orchestrator processed feed: {feed_url}")
-                    except json.JSONDecodeError as e:
-                        log_error(f"Invalid JSON response from orchestrator: {result_line}")
-                        log_error(f"Full stdout: {stdout}")
-            else:
-                log_error(f"Orchestrator error for feed {feed_url}: {stderr}")
+        if WorkerRegistry().live():
+            return {"status": "queued", "count": len(admitted)}
         
-        return {
-            "status": "episodes_processed",
-            "count": len(new_episodes),
-            "feeds_processed": len(feeds_processed),
-            "results": results
+        orchestrator_path = os.path.join(os.path.dirname(__file__), ORCHESTRATOR_SCRIPT)
+        coral_msg = {
+            "sender": "feed-monitor-agent",
+            "receiver": "orchestrator",
+            "content": "PROCESS_QUEUE"
         }
+        log_info(f"Starting orchestrator to drain {len(admitted)} queued episodes")
+        proc = spawn_agent(
+            orchestrator_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            text=True,
+            start_new_session=True
+        )
+        proc.stdin.write(json.dumps(coral_msg) + "\n")
+        proc.stdin.close()
+        
+        return {"status": "orchestrator_started", "count": len(admitted), "pid": proc.pid}
         
     except Exception as e:
         log_error(f"Error notifying orchestrator: {e}")
         return {"status": "error", "error": str(e)}
 
-def handle_check_feeds() -> Dict[str, Any]:
+def page_limit(msg: Dict[str, Any]) -> int:
+    """``limit`` del mensaje, acotado a [1, EPISODE_PAGE_MAX]; ValueError si no es un entero."""
+    try:
+        limit = int(msg.get("limit") or EPISODE_PAGE_SIZE)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid limit: {msg.get('limit')!r}")
+    return max(1, min(limit, EPISODE_PAGE_MAX))
+
+def request_fields(msg: Dict[str, Any], default) -> Optional[List[str]]:
+    """``fields`` del mensaje (cadena o lista); ValueError si no es ninguna de las dos."""
+    value = msg.get("fields")
+    if value is not None and not isinstance(value, (str, list)):
+        raise ValueError(f"Invalid fields: {value!r}")
+    return parse_fields(value, default)
+
+def admitted_episodes(episodes: List[Dict[str, Any]], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """
+    Episodios admitidos con los campos pedidos (por defecto, ids y estado).
+    Van todos: la admisión ya los acota a la marca de nivel alto de la cola
+    y no hay forma de pedir después los que se dejaran fuera.
+    """
+    return {
+        "episodes": project_all(episodes, fields),
+        "episodes_total": len(episodes)
+    }
+
+def handle_check_feeds(msg: Dict[str, Any]) -> Dict[str, Any]:
     """Maneja el comando CHECK_FEEDS - verifica todos los feeds configurados."""
+    # Validar antes de admitir nada ni lanzar el orquestador
+    try:
+        fields = request_fields(msg, EPISODE_FIELDS)
+    except ValueError as e:
+        return {"error": str(e)}
     try:
         feeds = get_feeds()
         all_new_episodes = []
+        fetched: Dict[str, List[Dict[str, Any]]] = {}
         
         for feed_url in feeds:
-            new_episodes = check_feed_for_new_episodes(feed_url)
+            new_episodes = check_feed_for_new_episodes(feed_url, fetched)
             all_new_episodes.extend(new_episodes)
         
-        # Notificar al orquestador si hay nuevos episodios
-        orchestrator_result = notify_orchestrator(all_new_episodes)
+        # Admitir en la cola lo que quepa y avisar al orquestador
+        admission = admit_new_episodes(feeds, all_new_episodes)
+        prefetch_result = prefetch_audio(admission['admitted'])
+        metadata_result = translate_metadata(fetched)
+        orchestrator_result = notify_orchestrator(admission['admitted'])
         
         return {
             "feeds_checked": len(feeds),
             "new_episodes_found": len(all_new_episodes),
-            "episodes": all_new_episodes,
+            **admitted_episodes(admission['admitted'], fields),
+            "deferred": len(admission['deferred']),
+            "queue": admission['queue'],
+            "prefetch": prefetch_result,
+            "metadata_translation": metadata_result,
             "orchestrator_result": orchestrator_result
         }
         
@@ -260,16 +314,28 @@ def handle_check_feeds() -> Dict[str, Any]:
         log_error(f"Error in handle_check_feeds: {e}")
         return {"error": str(e)}
 
-def handle_check_feed(feed_url: str) -> Dict[str, Any]:
+def handle_check_feed(feed_url: str, msg: Dict[str, Any]) -> Dict[str, Any]:
     """Maneja el comando CHECK_FEED - verifica un feed específico."""
     try:
-        new_episodes = check_feed_for_new_episodes(feed_url)
-        orchestrator_result = notify_orchestrator(new_episodes)
+        fields = request_fields(msg, EPISODE_FIELDS)
+    except ValueError as e:
+        return {"error": str(e), "feed_url": feed_url}
+    try:
+        fetched: Dict[str, List[Dict[str, Any]]] = {}
+        new_episodes = check_feed_for_new_episodes(feed_url, fetched)
+        admission = admit_new_episodes([feed_url], new_episodes)
+        prefetch_result = prefetch_audio(admission['admitted'])
+        metadata_result = translate_metadata(fetched)
+        orchestrator_result = notify_orchestrator(admission['admitted'])
         
         return {
             "feed_url": feed_url,
             "new_episodes_found": len(new_episodes),
-            "episodes": new_episodes,
+            **admitted_episodes(admission['admitted'], fields),
+            "deferred": len(admission['deferred']),
+            "queue": admission['queue'],
+            "prefetch": prefetch_result,
+            "metadata_translation": metadata_result,
             "orchestrator_result": orchestrator_result
         }
         
@@ -277,6 +343,35 @@ def handle_check_feed(feed_url: str) -> Dict[str, Any]:
         log_error(f"Error checking feed {feed_url}: {e}")
         return {"error": str(e), "feed_url": feed_url}
 
+def handle_list_episodes(msg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Maneja el comando LIST_EPISODES - episodios del catálogo, los más recientes
+    primero. La respuesta trae ``next_cursor`` si hay más páginas.
+    """
+    default = CATALOG_EPISODE_FIELDS
+    if msg.get("lang"):
+        default += ("translated_title",)
+    try:
+        fields = request_fields(msg, default)
+        page = default_catalog().page_episodes(msg.get("feed_url"), page_limit(msg), msg.get("cursor"))
+    except ValueError as e:
+        return {"error": str(e)}
+    if msg.get("lang"):
+        default_catalog().localize(page["items"], msg["lang"])
+    return {**page, "items": project_all(page["items"], fields)}
+
+def handle_queue_status() -> Dict[str, Any]:
+    """Maneja el comando QUEUE_STATUS - profundidad de la cola y workers vivos."""
+    queue = JobQueue()
+    return {
+        "queue": queue.depth(),
+        "backlog": queue.backlog(),
+        "running": queue.running(),
+        "high_water": QUEUE_HIGH_WATER,
+        "workers": len(WorkerRegistry().live()),
+        "prefetch": default_prefetcher().counts()
+    }
+
 def handle_get_feed_list() -> Dict[str, Any]:
     """Maneja el comando GET_FEED_LIST - devuelve la lista de feeds configurados."""
     try:
@@ -296,23 +391,31 @@ def process_message(msg: Dict[str, Any]) -> Dict[str, Any]:
     
     log_info(f"Processing command '{command}' from {sender}")
     
-    if command == "CHECK_FEEDS":
-        result = handle_check_feeds()
+    control = AgentProfiler.command(msg, from_content=True)
+    if control is not None:
+        result = profiler.control(msg, control)
+    elif command == "CHECK_FEEDS":
+        result = handle_check_feeds(msg)
     elif command.startswith("CHECK_FEED:"):
         # Formato: "CHECK_FEED:https://example.com/rss"
         feed_url = command.split(":", 1)[1] if ":" in command else ""
         if feed_url:
-            result = handle_check_feed(feed_url)
+            result = handle_check_feed(feed_url, msg)
         else:
             result = {"error": "No feed URL provided"}
     elif command == "GET_FEED_LIST":
         result = handle_get_feed_list()
+    elif command == "LIST_EPISODES":
+        result = handle_list_episodes(msg)
+    elif command == "QUEUE_STATUS":
+        result = handle_queue_status()
     elif command == "PING":
         result = {"status": "alive", "agent": "feed-monitor-agent"}
     else:
         result = {
             "error": f"Unknown command: {command}",
-            "supported_commands": ["CHECK_FEEDS", "CHECK_FEED:url", "GET_FEED_LIST", "PING"]
+            "supported_commands": ["CHECK_FEEDS", "CHECK_FEED:url", "GET_FEED_LIST", "LIST_EPISODES",
+                                   "QUEUE_STATUS", "PING", "PROFILE:start[:n]", "PROFILE:stop", "STATS"]
         }
     
     # Preparar respuesta en formato Coral
@@ -336,7 +439,12 @@ def main():
                 
             try:
                 msg = json.loads(line)
-                response = process_message(msg)
+                if AgentProfiler.command(msg, from_content=True) is not None:
+                    response = process_message(msg)
+                else:
+                    # Solo los mensajes normales cuentan (y se perfilan) como trabajo
+                    with profiler.message():
+                        response = process_message(msg)
                 print(json.dumps(response), flush=True)
                 
             except json.JSONDecodeError as e:
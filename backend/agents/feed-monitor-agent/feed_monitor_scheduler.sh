@@ -12,6 +12,7 @@ Variables de entorno:
   MONITOR_INTERVAL: Intervalo en segundos (default: 30)
   LOG_FILE: Archivo de log (default: feed_monitor_scheduler.log)
   PID_FILE: Archivo del PID del proceso (default: feed_monitor_scheduler.pid)
+  LOG_FULL_RESPONSE: 1 para guardar en el log la respuesta completa del agente (default: 0)
 """
 
 # Configuración
@@ -20,6 +21,7 @@ AGENT_SCRIPT="$SCRIPT_DIR/agent_coral_compatible.py"
 MONITOR_INTERVAL=${MONITOR_INTERVAL:-30}
 LOG_FILE=${LOG_FILE:-"$SCRIPT_DIR/feed_monitor_scheduler.log"}
 PID_FILE=${PID_FILE:-"$SCRIPT_DIR/feed_monitor_scheduler.pid"}
+LOG_FULL_RESPONSE=${LOG_FULL_RESPONSE:-0}
 
 # Colores para output
 RED='\033[0;31m'
@@ -79,17 +81,20 @@ EOF
     local exit_code=$?
     
     if [[ $exit_code -eq 0 ]]; then
-        # Parsear respuesta para obtener información útil
-        local new_episodes=$(echo "$result" | python3 -c "
+        # Parsear respuesta: número de episodios nuevos y un resumen de una línea
+        local summary=$(echo "$result" | python3 -c "
 import sys, json
 try:
-    data = json.load(sys.stdin)
-    content = data.get('content', {})
-    count = content.get('new_episodes_found', 0)
-    print(count)
-except:
+    content = json.load(sys.stdin).get('content', {})
+    print(content.get('new_episodes_found', 0))
+    print(json.dumps({key: content.get(key) for key in
+                      ('feeds_checked', 'new_episodes_found', 'episodes_total', 'deferred', 'error')
+                      if content.get(key) is not None}))
+except Exception:
     print('0')
+    print('unparseable response')
 " 2>/dev/null)
+        local new_episodes=$(echo "$summary" | head -1)
         
         if [[ "$new_episodes" -gt 0 ]]; then
             log_success "Found $new_episodes new episodes"
@@ -97,8 +102,11 @@ except:
             log_info "No new episodes found"
         fi
         
-        # Log del resultado completo para debug
-        echo "Agent response: $result" >> "$LOG_FILE"
+        # Solo el resumen: la respuesta completa puede ser grande (LOG_FULL_RESPONSE=1 para depurar)
+        echo "Agent response: $(echo "$summary" | tail -1)" >> "$LOG_FILE"
+        if [[ "$LOG_FULL_RESPONSE" == "1" ]]; then
+            echo "Agent full response: $result" >> "$LOG_FILE"
+        fi
     else
         log_error "Feed monitor agent failed with exit code: $exit_code"
     fi
@@ -233,6 +241,7 @@ Configuration (environment variables):
     MONITOR_INTERVAL    Check interval in seconds (default: 30)
     LOG_FILE           Log file path (default: ./feed_monitor_scheduler.log)
     PID_FILE           PID file path (default: ./feed_monitor_scheduler.pid)
+    LOG_FULL_RESPONSE  Log the full agent response (default: 0)
 
 Examples:
     $0 start                    # Start monitoring every 30 seconds
@@ -3,10 +3,25 @@ import json
 import subprocess
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import events
+from common.artifacts import episode_key
+from common.catalog import default_catalog
+from common.jobqueue import DONE, INTERACTIVE, JobQueue, default_tenant
+from common.launcher import spawn_agent
+from common.pipeline import job_result, process_job
+from common.profiling import AgentProfiler
+from common.projection import parse_fields, project
+
+# Cola persistente con checkpoint por etapa: reintentar la misma petición
+# reutiliza las etapas ya completadas.
+queue = JobQueue()
+WORKER_ID = f"api-orchestrator-{os.getpid()}"
+
 # --- Helper to run sub-agents ---
 def run_agent(agent_path, msg):
-    proc = subprocess.Popen(
-        [sys.executable, agent_path],
+    proc = spawn_agent(
+        agent_path,
         stdin=subprocess.PIPE,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -25,44 +40,35 @@ def run_agent(agent_path, msg):
 # --- Agent call wrappers ---
 def call_rss_fetch(feed_url):
     path = os.path.join(os.path.dirname(__file__), "..", "rss-fetch-agent", "agent.py")
-    msg = {"sender": "orchestrator", "receiver": "rss-fetch-agent", "content": feed_url}
+    # Solo se procesa el primer episodio: no hace falta el resto del feed
+    msg = {"sender": "orchestrator", "receiver": "rss-fetch-agent", "content": feed_url,
+           "fields": ["title", "audio_url"], "limit": 1}
     return run_agent(path, msg).get("content", [])
 
-def call_transcription(audio_url):
-    path = os.path.join(os.path.dirname(__file__), "..", "transcription-agent", "agent.py")
-    msg = {"sender": "orchestrator", "receiver": "transcription-agent", "content": audio_url}
-    return run_agent(path, msg).get("content", "")
-
-def call_translation(text, target_lang="es"):
-    path = os.path.join(os.path.dirname(__file__), "..", "translation-agent", "agent.py")
-    msg = {
-        "sender": "orchestrator",
-        "receiver": "translation-agent",
-        "content": text,
-        "target_lang": target_lang
-    }
-    return run_agent(path, msg).get("content", "")
-
-def call_tts(text, voice_id=None):
-    path = os.path.join(os.path.dirname(__file__), "..", "tts-agent", "agent.py")
-    msg = {
+def emit_progress(receiver, job, stage):
+    progress = {
         "sender": "orchestrator",
-        "receiver": "tts-agent",
-        "content": text
+        "receiver": receiver,
+        "content": {"job_id": job["id"], "stage": stage, "state": job["state"]},
+        "progress": True
     }
-    if voice_id:
-        msg["voice_id"] = voice_id
-    return run_agent(path, msg).get("content", "")
+    print(json.dumps(progress), flush=True)
 
 # --- Main orchestrator flow ---
 if __name__ == "__main__":
-    for line in sys.stdin:
+    profiler = AgentProfiler("orchestrator")
+    for line in profiler.lines(sys.stdin):
         msg = {}
         try:
             msg = json.loads(line)
             feed_url = msg.get("content")
             target_lang = msg.get("target_lang", "es")
-            podcast_id = msg.get("podcast_id", 1)
+            # Sin podcast_id explícito, el podcast es el feed (id del catálogo).
+            # El tenant sale siempre del feed, no del mensaje: el cliente no
+            # puede hacerse pasar por otro tenant para saltarse su tope
+            feed_id = default_catalog().feed_id(feed_url)
+            podcast_id = msg.get("podcast_id") or feed_id
+            tenant = default_tenant(feed_id)
 
             # 1. Fetch RSS
             entries = call_rss_fetch(feed_url)
@@ -77,25 +83,56 @@ if __name__ == "__main__":
 
             # Take first episode only for demo
             audio_url = entries[0]["audio_url"]
+            job_id = queue.enqueue(episode_key(audio_url), audio_url, target_lang,
+                                   feed_url=feed_url, title=entries[0].get("title"),
+                                   podcast_id=podcast_id, tenant=tenant,
+                                   priority_class=INTERACTIVE)
+            events.publish(job_id, "detected", {"title": entries[0].get("title"), "audio_url": audio_url,
+                                                "feed_url": feed_url})
 
-            # 2. Transcribe audio
-            transcript = call_transcription(audio_url)
-
-            # 3. Translate
-            translation = call_translation(transcript, target_lang)
-
-            # 4. Generate TTS
-            audio_file = call_tts(translation)
-
-            # Final response
+            # 2-5. Transcribe, translate, TTS, subtitles (solo las etapas pendientes)
+            job = queue.get(job_id)
+            if msg.get("detach"):
+                # Responder ya con el job; el progreso se sigue por eventos (SSE)
+                response = {
+                    "sender": "orchestrator",
+                    "receiver": msg["sender"],
+                    "content": {"job_id": job_id, "episode_key": job["episode_key"], "state": job["state"]},
+                    "podcast_id": podcast_id
+                }
+                print(json.dumps(response), flush=True)
+                if job["state"] != DONE:
+                    job = queue.claim_job(job_id, WORKER_ID)
+                    if job is not None:
+                        process_job(queue, job)
+                continue
+            on_stage = None
+            if msg.get("stream"):
+                # Una línea de progreso por etapa antes de la respuesta final
+                def on_stage(job, stage, receiver=msg["sender"]):
+                    emit_progress(receiver, job, stage)
+                emit_progress(msg["sender"], job, None)
+            if job["state"] != DONE:
+                job = queue.claim_job(job_id, WORKER_ID)
+                if job is None:
+                    raise RuntimeError(f"Episode is already being processed (job {job_id})")
+                process_job(queue, job, on_stage=on_stage)
+                if job["state"] != DONE:
+                    raise RuntimeError(job["last_error"])
+            # Final response: texto completo solo si se pide (include_text);
+            # por defecto, referencias a /jobs/{id}/transcript y /translation
+            summary = job_result(job, include_text=bool(msg.get("include_text")))
             response = {
                 "sender": "orchestrator",
                 "receiver": msg["sender"],
-                "content": {
-                    "transcript": transcript,
-                    "translation": translation,
-                    "audio_file": audio_file
-                },
+                "content": project({
+                    "job_id": job_id,
+                    "status": job["state"],
+                    "transcript": summary["transcript"],
+                    "translation": summary["translation"],
+                    "audio_file": job["results"]["tts"],
+                    "subtitles": summary["subtitles"]
+                }, parse_fields(msg.get("fields"))),
                 "podcast_id": podcast_id
             }
             print(json.dumps(response), flush=True)
@@ -0,0 +1,288 @@
+"""
+Procesado en lote del catálogo anterior de uno o varios feeds.
+
+Los monitores solo encolan episodios nuevos (y como mucho
+``FEED_BACKFILL_EPISODES`` la primera vez); este comando recorre todo el
+historial de los feeds indicados (o de un OPML) dentro de un rango de
+fechas y lo pasa por el pipeline con un pool de workers por etapa propio.
+
+Los episodios se encolan poco a poco (como mucho ``--window`` sin terminar a
+la vez), así la cola no se llena de golpe y los monitores siguen admitiendo
+episodios nuevos mientras dura el lote. Van con clase ``BACKFILL`` y un
+tenant propio cuyo tope de jobs en curso es la ventana: las peticiones
+interactivas siguen pasando por delante.
+
+El progreso se guarda en un fichero de checkpoint (JSON): si el comando se
+interrumpe, volver a lanzarlo con el mismo ``--checkpoint`` continúa donde
+lo dejó sin volver a leer los feeds, y los jobs a medias retoman su última
+etapa completada. Cada ``--report-every`` segundos muestra el avance, el
+ritmo y la estimación de tiempo restante.
+
+Uso:
+    python backfill.py --feed https://example.com/rss --since 2020-01-01
+    python backfill.py --opml suscripciones.opml --until 2023-12-31 --stage transcribe=8
+    python backfill.py --checkpoint backfill-mi-show.json      # reanudar
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import events
+from common.artifacts import episode_key
+from common.catalog import default_catalog, index_feed, published_ts
+from common.feed_cache import fetch_entries
+from common.feed_registry import parse_opml
+from common.jobqueue import BACKFILL, DONE, FAILED, JobQueue
+from worker_pool import log_with_spacing, parse_counts, start_pool
+
+DEFAULT_CHECKPOINT = "backfill-checkpoint.json"
+CHECKPOINT_VERSION = 1
+
+
+def parse_date(value: Optional[str]) -> Optional[float]:
+    """``YYYY-MM-DD`` (UTC) como epoch."""
+    if not value:
+        return None
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp()
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
+
+
+def collect_feeds(feeds: List[str], opml: Optional[str]) -> List[str]:
+    urls = list(feeds or [])
+    if opml:
+        with open(opml, "rb") as f:
+            urls.extend(feed["url"] for feed in parse_opml(f.read()))
+    return list(dict.fromkeys(urls))
+
+
+def collect_episodes(feeds: List[str], since: Optional[float], until: Optional[float]) -> List[Dict[str, Any]]:
+    """Episodios con audio de los feeds dentro del rango (del más antiguo al más reciente)."""
+    episodes = []
+    for feed_url in feeds:
+        try:
+            entries = fetch_entries(feed_url)
+        except Exception as e:
+            log_with_spacing(f"WARNING: no se pudo leer {feed_url}: {e}")
+            continue
+        index_feed(feed_url, entries)
+        selected = 0
+        for entry in entries:
+            ts = published_ts(entry)
+            if not entry.get("audio_url"):
+                continue
+            # Sin fecha legible solo entra si no se pidió rango
+            if (since is not None or until is not None) and not ts:
+                continue
+            if (since is not None and ts < since) or (until is not None and ts >= until + 86400):
+                continue
+            episodes.append({"audio_url": entry["audio_url"], "title": entry.get("title"),
+                             "feed_url": feed_url, "published": ts, "job_id": None, "state": None})
+            selected += 1
+        log_with_spacing(f"{feed_url}: {selected} de {len(entries)} episodios en el rango")
+    # Un mismo audio en dos feeds se procesa una vez
+    unique = {ep["audio_url"]: ep for ep in episodes}
+    return sorted(unique.values(), key=lambda ep: ep["published"])
+
+
+class Checkpoint:
+    """Fichero JSON con la lista de episodios del lote y el estado de cada uno."""
+
+    def __init__(self, path: str, data: Dict[str, Any]):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Checkpoint"]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise SystemExit(f"Checkpoint {path} con versión desconocida: {data.get('version')}")
+        return cls(path, data)
+
+    @property
+    def episodes(self) -> List[Dict[str, Any]]:
+        return self.data["episodes"]
+
+    def save(self):
+        self.data["updated"] = time.time()
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+class Backfill:
+    def __init__(self, checkpoint: Checkpoint, queue: JobQueue, window: int):
+        self.checkpoint = checkpoint
+        self.queue = queue
+        self.window = window
+        self.tenant = checkpoint.data["tenant"]
+        self.target_lang = checkpoint.data["target_lang"]
+        self.started = time.time()
+        self.finished_at_start = len(self.finished())
+        # El tenant del lote no se limita a TENANT_MAX_RUNNING: su tope es la ventana
+        queue.set_tenant(self.tenant, max_running=window)
+
+    def finished(self) -> List[Dict[str, Any]]:
+        return [ep for ep in self.checkpoint.episodes if ep["state"] in (DONE, FAILED)]
+
+    def in_flight(self) -> List[Dict[str, Any]]:
+        return [ep for ep in self.checkpoint.episodes if ep["job_id"] is not None and ep["state"] is None]
+
+    def refresh(self):
+        """Actualiza el estado de los jobs en curso (una consulta)."""
+        flying = self.in_flight()
+        states = self.queue.states([ep["job_id"] for ep in flying])
+        for ep in flying:
+            state = states.get(ep["job_id"])
+            if state in (DONE, FAILED):
+                ep["state"] = state
+
+    def top_up(self):
+        """Encola episodios hasta tener ``window`` sin terminar (los más antiguos primero)."""
+        free = self.window - len(self.in_flight())
+        catalog = default_catalog()
+        for ep in self.checkpoint.episodes:
+            if free <= 0:
+                break
+            if ep["job_id"] is not None:
+                continue
+            ep["job_id"] = self.queue.enqueue(
+                episode_key(ep["audio_url"]), ep["audio_url"], self.target_lang,
+                feed_url=ep["feed_url"], title=ep["title"], podcast_id=catalog.feed_id(ep["feed_url"]),
+                priority=ep["published"], tenant=self.tenant, priority_class=BACKFILL,
+            )
+            events.publish(ep["job_id"], "detected", {
+                "title": ep["title"], "audio_url": ep["audio_url"], "feed_url": ep["feed_url"],
+            })
+            free -= 1
+
+    def done(self) -> bool:
+        return len(self.finished()) == len(self.checkpoint.episodes)
+
+    def progress(self) -> Dict[str, Any]:
+        total = len(self.checkpoint.episodes)
+        finished = self.finished()
+        failed = sum(1 for ep in finished if ep["state"] == FAILED)
+        elapsed = time.time() - self.started
+        this_run = len(finished) - self.finished_at_start
+        rate = this_run / elapsed if elapsed > 0 else 0.0
+        remaining = total - len(finished)
+        return {
+            "total": total,
+            "done": len(finished) - failed,
+            "failed": failed,
+            "in_flight": len(self.in_flight()),
+            "pending": remaining - len(self.in_flight()),
+            "episodes_per_hour": round(rate * 3600, 1),
+            "elapsed_s": round(elapsed),
+            "eta_s": round(remaining / rate) if rate else (0 if not remaining else None),
+        }
+
+    def report(self) -> Dict[str, Any]:
+        p = self.progress()
+        eta = format_duration(p["eta_s"]) if p["eta_s"] is not None else "?"
+        log_with_spacing(
+            f"[backfill] {p['done'] + p['failed']}/{p['total']} ({p['failed']} fallidos, "
+            f"{p['in_flight']} en curso) | {p['episodes_per_hour']} ep/h | "
+            f"{format_duration(p['elapsed_s'])} transcurrido | ETA {eta}"
+        )
+        return p
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa el catálogo anterior de feeds por el pipeline")
+    parser.add_argument("--feed", action="append", metavar="URL", help="feed a procesar (repetible)")
+    parser.add_argument("--opml", help="OPML con los feeds a procesar")
+    parser.add_argument("--since", help="desde esta fecha de publicación (YYYY-MM-DD, incluida)")
+    parser.add_argument("--until", help="hasta esta fecha de publicación (YYYY-MM-DD, incluida)")
+    parser.add_argument("--target-lang", default="es")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT,
+                        help="fichero de progreso; si existe, se reanuda el lote que describe")
+    parser.add_argument("--stage", action="append", metavar="ETAPA=N",
+                        help="workers para una etapa (por defecto WORKERS_<ETAPA>)")
+    parser.add_argument("--window", type=int, default=0,
+                        help="máximo de episodios del lote sin terminar en la cola (por defecto 2x workers)")
+    parser.add_argument("--no-workers", action="store_true",
+                        help="solo encolar y seguir el progreso (los procesa un worker_pool ya en marcha)")
+    parser.add_argument("--report-every", type=float, default=10.0, help="segundos entre informes de progreso")
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint.load(args.checkpoint)
+    if checkpoint is None:
+        feeds = collect_feeds(args.feed, args.opml)
+        if not feeds:
+            parser.error("indica --feed y/o --opml (o un --checkpoint existente para reanudar)")
+        since, until = parse_date(args.since), parse_date(args.until)
+        checkpoint = Checkpoint(args.checkpoint, {
+            "version": CHECKPOINT_VERSION,
+            "created": time.time(),
+            "feeds": feeds,
+            "since": args.since,
+            "until": args.until,
+            "target_lang": args.target_lang,
+            "tenant": f"backfill:{os.path.splitext(os.path.basename(args.checkpoint))[0]}",
+            "episodes": collect_episodes(feeds, since, until),
+        })
+        checkpoint.save()
+    elif args.feed or args.opml:
+        log_with_spacing(f"Reanudando {args.checkpoint}: se ignoran --feed/--opml/--since/--until")
+
+    counts = parse_counts(args.stage)
+    window = args.window or max(1, 2 * sum(counts.values()))
+    backfill = Backfill(checkpoint, JobQueue(), window)
+
+    stop = multiprocessing.Event()
+    interrupted = []
+    # El manejador solo anota la señal; stop.set() se hace fuera de él
+    signal.signal(signal.SIGTERM, lambda signum, frame: interrupted.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: interrupted.append(signum))
+
+    processes, group = ([], None) if args.no_workers else start_pool(counts, stop)
+    try:
+        while not interrupted:
+            backfill.refresh()
+            backfill.top_up()
+            checkpoint.data["progress"] = backfill.report()
+            checkpoint.save()
+            if backfill.done():
+                break
+            next_report = time.monotonic() + args.report_every
+            while not interrupted and time.monotonic() < next_report:
+                time.sleep(0.2)
+    finally:
+        stop.set()
+        if group is not None:
+            group.join()
+        for proc in processes:
+            proc.join()
+        backfill.refresh()
+        checkpoint.data["progress"] = backfill.progress()
+        checkpoint.save()
+
+    progress = checkpoint.data["progress"]
+    print(json.dumps({"checkpoint": args.checkpoint, **progress}, indent=2))
+    if interrupted:
+        log_with_spacing(f"Interrumpido: vuelve a lanzar con --checkpoint {args.checkpoint} para continuar")
+        sys.exit(130)
+    sys.exit(1 if progress["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
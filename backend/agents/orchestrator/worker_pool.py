@@ -0,0 +1,127 @@
+"""
+Pool de workers por etapa sobre la cola persistente (jobs.db).
+
+Cada etapa corre como un grupo de consumidores que reclaman jobs del estado
+anterior a ella. Las etapas de CPU (transcribe: decodificación y VAD) se
+reparten en procesos, una por núcleo; las de E/S (translate, tts,
+subtitles) se ejecutan como hilos dentro de un único proceso. Lanzar el
+pool en otra máquina con el mismo DATA_DIR añade capacidad a la misma cola.
+
+Uso:
+    python worker_pool.py --stage transcribe=4 --stage tts=2
+    python worker_pool.py --status
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.hedging import hedge_stats
+from common.jobqueue import STAGES, JobQueue
+from common.workers import STAGE_KIND, WorkerRegistry, default_counts, run_stage_worker
+
+# Mismas opciones que el orquestador: truncar la traducción para ahorrar créditos TTS
+PIPELINE_OPTIONS = {"tts_max_chars": 500}
+
+
+def log_with_spacing(message):
+    print(message, file=sys.stderr)
+
+
+def worker_id(stage: str, index: int) -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{stage}-{index}"
+
+
+def _install_stop(stop) -> None:
+    def handler(signum, frame):
+        stop.set()
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
+
+
+def run_thread_group(counts, stop) -> None:
+    """Hilos de las etapas de E/S, todos en este proceso."""
+    threads = [
+        threading.Thread(
+            target=run_stage_worker,
+            args=(stage, worker_id(stage, i), stop, PIPELINE_OPTIONS),
+            name=f"{stage}-{i}",
+            daemon=True,
+        )
+        for stage, n in counts.items() for i in range(n)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def _process_main(stage: str, index: int, stop) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # el padre decide cuándo parar
+    run_stage_worker(stage, worker_id(stage, index), stop, PIPELINE_OPTIONS)
+
+
+def start_pool(counts, stop):
+    """
+    Arranca los procesos de las etapas de CPU y, en un hilo, el grupo de las
+    de E/S. Devuelve ``(procesos, hilo)``; todos paran cuando ``stop`` se activa.
+    """
+    processes = [
+        multiprocessing.Process(target=_process_main, args=(stage, i, stop), name=f"{stage}-{i}")
+        for stage, n in counts.items() if STAGE_KIND.get(stage) == "process"
+        for i in range(n)
+    ]
+    for proc in processes:
+        proc.start()
+    log_with_spacing(f"Worker pool: {counts} ({len(processes)} procesos)")
+    threaded = {stage: n for stage, n in counts.items() if STAGE_KIND.get(stage) != "process" and n > 0}
+    group = threading.Thread(target=run_thread_group, args=(threaded, stop), name="io-stages", daemon=True)
+    group.start()
+    return processes, group
+
+
+def run_pool(counts) -> None:
+    stop = multiprocessing.Event()
+    _install_stop(stop)
+    processes, group = start_pool(counts, stop)
+    # Esperar con join y no con stop.wait(): el manejador de señal hace
+    # stop.set(), que se bloquea si el propio hilo principal está en wait()
+    group.join()
+    for proc in processes:
+        proc.join()
+
+
+def parse_counts(specs) -> dict:
+    counts = default_counts()
+    stages = [name for name, _ in STAGES]
+    for spec in specs or []:
+        stage, _, n = spec.partition("=")
+        if stage not in stages or not n.isdigit():
+            raise SystemExit(f"--stage espera <etapa>=<n> con etapa en {stages}: {spec}")
+        counts[stage] = int(n)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pool de workers por etapa del pipeline")
+    parser.add_argument("--stage", action="append", metavar="ETAPA=N",
+                        help="workers para una etapa (por defecto WORKERS_<ETAPA>)")
+    parser.add_argument("--status", action="store_true", help="muestra workers vivos, profundidad de la cola y jobs en curso por tenant")
+    args = parser.parse_args()
+    if args.status:
+        queue = JobQueue()
+        print(json.dumps({"workers": WorkerRegistry().live(), "queue": queue.depth(),
+                          "running": queue.running(),
+                          "hedging": [hedge_stats(stage) for stage in ("translate", "tts")]}, indent=2))
+        return
+    run_pool(parse_counts(args.stage))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,31 @@
 import sys
 import json
+import os
 
-import feedparser
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.feed_cache import fetch_entries
+from common.profiling import AgentProfiler
+from common.projection import parse_fields, project_all
 
-def fetch_rss_feed(url):
-    feed = feedparser.parse(url)
-    entries = []
-    for entry in feed.entries:
-            audio_url = None
-            # Revisar si hay enclosure (audio)
-            if hasattr(entry, 'enclosures') and entry.enclosures:
-                audio_url = entry.enclosures[0].get('href')
-            elif hasattr(entry, 'enclosure') and entry.enclosure:
-                audio_url = entry.enclosure.get('href')
-            entries.append({
-                'title': getattr(entry, 'title', None),
-                'link': getattr(entry, 'link', None),
-                'published': getattr(entry, 'published', None),
-                'summary': getattr(entry, 'summary', None),
-                'audio_url': audio_url
-            })
-    return entries
+# Campos que devuelve este agente por entrada; el resumen (HTML) solo si se
+# pide en ``fields``
+FIELDS = ("title", "link", "published", "audio_url")
+
+def fetch_rss_feed(url, fields=None, limit=None):
+    """Entradas del feed (las ``limit`` primeras), leídas a través de la caché compartida de feeds."""
+    entries = fetch_entries(url)[:limit]
+    return project_all(entries, parse_fields(fields, FIELDS))
 
 def log_with_spacing(message):
     print("\n" + message, file=sys.stderr)
 
 if __name__ == "__main__":
-    for line in sys.stdin:
+    profiler = AgentProfiler("rss-fetch-agent")
+    for line in profiler.lines(sys.stdin):
         try:
             msg = json.loads(line)
             feed_url = msg.get("content")
-            entries = fetch_rss_feed(feed_url)
+            entries = fetch_rss_feed(feed_url, msg.get("fields"), msg.get("limit"))
             response = {
                 "sender": msg["receiver"],
                 "receiver": msg["sender"],
@@ -1,102 +1,87 @@
 import sys
 import json
-import time
 import os
 
-def load_seen_episodes():
-    return set()  # Placeholder, la nueva función usará el feed_url
-
-def save_seen_episodes(seen):
-    pass  # Placeholder, la nueva función usará el feed_url
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.admission import admit
+from common.catalog import index_feed
+from common.feed_cache import fetch_entries
+from common.guid_index import GuidIndex
+from common.jobqueue import JobQueue
+from common.profiling import AgentProfiler
+from common.projection import JOB_FIELDS, parse_fields, project_all
 
 # Función principal del agente
 
 
-# Llama al rss-fetch-agent y filtra solo los episodios nuevos
-import subprocess
-import os
+# Lee el feed (caché compartida con rss-fetch-agent) y filtra solo los episodios nuevos
+RSS_FETCH_FIELDS = ("title", "link", "published", "summary", "audio_url")
 
 def fetch_rss_entries(feed_url):
-    proc = subprocess.Popen(
-        [sys.executable, os.path.join(os.path.dirname(__file__), "../rss-fetch-agent/agent.py")],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        text=True
-    )
-    coral_msg = {
-        "sender": "rss-monitor-agent",
-        "receiver": "rss-fetch-agent",
-        "content": feed_url
-    }
-    stdout, _ = proc.communicate(input=json.dumps(coral_msg) + "\n")
-    response = json.loads(stdout)
-    return response.get("content", [])
+    """Mismas entradas que devuelve rss-fetch-agent, sin lanzar otro proceso."""
+    return [{field: entry[field] for field in RSS_FETCH_FIELDS} for entry in fetch_entries(feed_url)]
 
-def filter_new_episodes(entries, seen):
-    new_episodes = []
-    for entry in entries:
-        guid = entry.get("id") or entry.get("guid") or entry.get("link") or entry.get("audio_url")
-        if guid and guid not in seen:
-            new_episodes.append(entry)
-            seen.add(guid)
-    return new_episodes
+def filter_new_episodes(entries, feed_url):
+    """Entradas cuyo GUID no está en el índice del feed (una consulta vectorizada)."""
+    entries = list({episode_guid(entry): entry for entry in entries if episode_guid(entry)}.values())
+    seen = get_seen_index().contains(get_feed_id(feed_url), [episode_guid(entry) for entry in entries])
+    return [entry for entry, was_seen in zip(entries, seen) if not was_seen]
 
 
 # --- UNIFICADO: Usar el sistema feed_monitor_state ---
 import hashlib
 
 STATE_DIR = "feed_monitor_state"
+_seen_index = None
 
 def get_feed_id(feed_url):
     """Genera un ID único para el feed basado en la URL"""
     return hashlib.md5(feed_url.encode()).hexdigest()[:12]
 
-def get_state_file(feed_url):
-    """Ruta del archivo de estado usando el sistema unificado"""
-    feed_id = get_feed_id(feed_url)
-    return os.path.join(STATE_DIR, f"last_check_{feed_id}.json")
-
-def load_seen_episodes_for_feed(feed_url):
-    """Carga episodios vistos usando el formato feed_monitor_state"""
-    state_file = get_state_file(feed_url)
-    if os.path.exists(state_file):
-        with open(state_file, "r") as f:
-            data = json.load(f)
-            # Convertir GUIDs a set para compatibilidad
-            return set(data.get("episodes", []))
-    return set()
-
-def save_seen_episodes_for_feed(feed_url, seen):
-    """Guarda episodios vistos usando el formato feed_monitor_state"""
-    os.makedirs(STATE_DIR, exist_ok=True)
-    state_file = get_state_file(feed_url)
-    
-    # Usar el formato estructurado del feed_monitor_state
-    state_data = {
-        "episodes": list(seen),
-        "last_check": time.time()
-    }
-    
-    with open(state_file, "w") as f:
-        json.dump(state_data, f, indent=2)
+def get_seen_index():
+    """Índice compacto de GUIDs vistos (importa los last_check_*.json del formato anterior)."""
+    global _seen_index
+    if _seen_index is None:
+        _seen_index = GuidIndex(STATE_DIR)
+    return _seen_index
+
+def episode_guid(entry):
+    return entry.get("id") or entry.get("guid") or entry.get("link") or entry.get("audio_url")
+
+def admit_episodes(feed_url, episodes, first_time, target_lang="es"):
+    """
+    Encola los episodios nuevos que quepan en la cola (los más recientes
+    primero). Se hace antes de marcarlos como vistos para que una caída
+    posterior no los pierda; los que no caben no se marcan y se reintentan.
+    """
+    for ep in episodes:
+        ep.setdefault("feed_url", feed_url)
+    return admit(JobQueue(), episodes, target_lang, first_time_feeds=[feed_url] if first_time else ())
 
 def log_with_spacing(message):
     print("\n" + message, file=sys.stderr)
 
 if __name__ == "__main__":
-    for line in sys.stdin:
+    profiler = AgentProfiler("rss-monitor-agent")
+    for line in profiler.lines(sys.stdin):
         msg = {}  # Inicializa msg para evitar NameError en except
         try:
             msg = json.loads(line)
             feed_url = msg.get("content")
-            seen_episodes = load_seen_episodes_for_feed(feed_url)
+            first_time = not get_seen_index().known(get_feed_id(feed_url))
             entries = fetch_rss_entries(feed_url)
-            new_episodes = filter_new_episodes(entries, seen_episodes)
-            save_seen_episodes_for_feed(feed_url, seen_episodes)
+            index_feed(feed_url, entries)
+            new_episodes = filter_new_episodes(entries, feed_url)
+            admission = admit_episodes(feed_url, new_episodes, first_time, msg.get("target_lang", "es"))
+            get_seen_index().add(get_feed_id(feed_url),
+                                 [episode_guid(ep) for ep in admission["admitted"] + admission["skipped"]])
             response = {
                 "sender": msg["receiver"],
                 "receiver": msg["sender"],
-                "content": new_episodes
+                # Por defecto solo el job y su estado de cada episodio admitido
+                "content": project_all(admission["admitted"], parse_fields(msg.get("fields"), JOB_FIELDS)),
+                "deferred": len(admission["deferred"]),
+                "queue": admission["queue"]
             }
             print(json.dumps(response), flush=True)
         except Exception as e:
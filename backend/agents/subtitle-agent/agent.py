@@ -0,0 +1,64 @@
+# agents/subtitle-agent/agent.py
+"""
+Genera subtítulos SRT/WebVTT del original y de cada traducción de un episodio.
+
+Es una etapa de post-proceso barata: lee los Transcript guardados en la caché
+de artefactos (``common.artifacts``) y no llama a ningún proveedor. Los
+ficheros se escriben en ``STORAGE_DIR/subtitles/<episode_key>/``.
+
+Mensaje de entrada: ``content`` = episode_key, ``langs`` opcional.
+"""
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.artifacts import check_key, check_lang, list_languages, load_transcript
+from common.media_store import STORAGE_DIR, public_url
+from common.profiling import AgentProfiler
+from common.subtitles import write_subtitles
+
+
+def generate_subtitles(key, langs=None):
+    """Devuelve ``{lang: {"srt": url, "vtt": url}}`` para los idiomas con tiempos."""
+    # La clave y los idiomas llegan en el mensaje y forman rutas: se validan antes de usarlos
+    out_dir = os.path.join(STORAGE_DIR, "subtitles", check_key(key))
+    langs = [check_lang(lang) for lang in langs] if langs else list_languages(key)
+    result = {}
+    for lang in langs:
+        transcript = load_transcript(key, lang)
+        if transcript is None or not transcript.duration:
+            continue
+        srt_path, vtt_path = write_subtitles(transcript, out_dir, lang)
+        result[lang] = {"srt": public_url(srt_path), "vtt": public_url(vtt_path)}
+    return result
+
+
+def log_with_spacing(message):
+    print("\n" + message, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    profiler = AgentProfiler("subtitle-agent")
+    for line in profiler.lines(sys.stdin):
+        msg = {}
+        try:
+            msg = json.loads(line)
+            key = msg.get("content")
+            if not key:
+                raise ValueError("No episode key provided in content.")
+            response = {
+                "sender": msg.get("receiver", "subtitle-agent"),
+                "receiver": msg.get("sender", "orchestrator"),
+                "content": generate_subtitles(key, msg.get("langs"))
+            }
+            print(json.dumps(response), flush=True)
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            error_response = {
+                "sender": "subtitle-agent",
+                "receiver": msg.get("sender", "unknown"),
+                "content": f"Error: {str(e)}"
+            }
+            print(json.dumps(error_response), flush=True)
@@ -6,6 +6,14 @@ import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import events
+from common.audio_segmentation import decode_pcm, plan_segments, to_wav_bytes
+from common.prefetch import default_prefetcher
+from common.profiling import AgentProfiler
+from common.ratelimit import RateLimiter
+from common.transcript import Transcript
+
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv("/workspaces/GlobalPodcaster/devcontainer/.env")
 
@@ -16,24 +24,126 @@ if not DEEPGRAM_API_KEY:
     raise ValueError("DEEPGRAM_API_KEY no está configurada. Asegúrate de que esté definida en el archivo .env o en las variables de entorno.")
 
 dg_client = Deepgram(DEEPGRAM_API_KEY)
+# Ritmo/presupuesto compartido con el resto de agentes (presupuesto en segundos de audio)
+deepgram_limiter = RateLimiter("deepgram")
+
+TRANSCRIBE_LANG = "en"
+DEEPGRAM_OPTIONS = {"punctuate": True, "language": TRANSCRIBE_LANG}
+# Máximo de segmentos enviados a Deepgram en paralelo
+MAX_CONCURRENCY = int(os.getenv("TRANSCRIBE_MAX_CONCURRENCY", "16"))
+# Omitir segmentos de música/silencio (no gastan créditos)
+SKIP_NON_SPEECH = os.getenv("TRANSCRIBE_SKIP_NON_SPEECH", "1") != "0"
+
+
+def log_with_spacing(message):
+    print("\n" + message, file=sys.stderr)
+
+
+def _alternative(response):
+    return response["results"]["channels"][0]["alternatives"][0]
+
+
+async def transcribe_url(audio_url):
+    """Transcripción en una sola petición (sin segmentar)."""
+    with await deepgram_limiter.acquire_async():
+        response = await dg_client.transcription.prerecorded({"url": audio_url}, DEEPGRAM_OPTIONS)
+    deepgram_limiter.record(response.get("metadata", {}).get("duration", 0))
+    alt = _alternative(response)
+    return _build_transcript(alt["transcript"], alt.get("words", [])), []
+
+
+async def transcribe_segment(pcm, segment, semaphore):
+    """Transcribe un segmento y desplaza sus timestamps al tiempo del episodio."""
+    async with semaphore:
+        # El WAV se construye ya con turno: solo hay MAX_CONCURRENCY en memoria a la vez
+        source = {"buffer": to_wav_bytes(pcm, segment.start, segment.end), "mimetype": "audio/wav"}
+        with await deepgram_limiter.acquire_async(cost=segment.duration):
+            response = await dg_client.transcription.prerecorded(source, DEEPGRAM_OPTIONS)
+    deepgram_limiter.record(segment.duration)
+    alt = _alternative(response)
+    words = []
+    for w in alt.get("words", []):
+        w = dict(w)
+        w["start"] = w["start"] + segment.start
+        w["end"] = w["end"] + segment.start
+        words.append(w)
+    return alt["transcript"], words
 
-async def transcribe(audio_url):
-    response = await dg_client.transcription.prerecorded(
-        {"url": audio_url},
-        {"punctuate": True, "language": "en"}
+
+def _build_transcript(text, words):
+    if words:
+        return Transcript.from_deepgram_words(words, TRANSCRIBE_LANG)
+    return Transcript.from_text(text, TRANSCRIBE_LANG)
+
+
+async def transcribe(audio_url, on_progress=None):
+    """
+    Divide el audio en los silencios y transcribe los segmentos en paralelo.
+
+    Devuelve ``(Transcript, segmentos)`` con los timestamps en tiempo del episodio.
+    ``on_progress(fraccion)`` se llama al terminar cada segmento.
+
+    Los segmentos de música o silencio se omiten. Si el feed monitor ya
+    descargó el audio (prefetch) se decodifica el fichero local en vez de la
+    URL. Si el audio no se puede decodificar localmente (p. ej. ffmpeg no
+    disponible) se envía la URL completa a Deepgram como antes.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        local = await loop.run_in_executor(None, default_prefetcher().resolve, audio_url)
+        if local:
+            log_with_spacing(f"DEBUG: using prefetched audio {local}")
+        pcm = await loop.run_in_executor(None, decode_pcm, local or audio_url)
+        segments = plan_segments(pcm)
+    except Exception as e:
+        log_with_spacing(f"WARNING: local segmentation unavailable ({e}), sending full URL")
+        return await transcribe_url(audio_url)
+
+    selected = [s for s in segments if s.kind == "speech" or not SKIP_NON_SPEECH]
+    log_with_spacing(
+        f"DEBUG: {len(segments)} segments, {len(selected)} with speech, "
+        f"longest {max((s.duration for s in selected), default=0):.0f}s"
     )
-    return response["results"]["channels"][0]["alternatives"][0]["transcript"]
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    total = sum(s.duration for s in selected) or 1.0
+    done = 0.0
+
+    async def run(segment):
+        nonlocal done
+        result = await transcribe_segment(pcm, segment, semaphore)
+        done += segment.duration
+        if on_progress:
+            on_progress(done / total)
+        return result
+
+    results = await asyncio.gather(*(run(s) for s in selected))
+
+    words = []
+    for _, seg_words in results:
+        words.extend(seg_words)
+    text = " ".join(text for text, _ in results if text)
+    return _build_transcript(text, words), [
+        {"start": s.start, "end": s.end, "kind": s.kind} for s in segments
+    ]
 
 if __name__ == "__main__":
-    for line in sys.stdin:
+    profiler = AgentProfiler("transcription-agent")
+    for line in profiler.lines(sys.stdin):
         try:
             msg = json.loads(line)
             audio_url = msg.get("content")
-            transcript = asyncio.run(transcribe(audio_url))
+            job_id = msg.get("job_id")
+            on_progress = None
+            if job_id is not None:
+                def on_progress(fraction, job_id=job_id):
+                    events.publish(job_id, "transcribing", {"percent": round(100 * fraction)})
+            transcript, segments = asyncio.run(transcribe(audio_url, on_progress))
             response = {
                 "sender": msg["receiver"],
                 "receiver": msg["sender"],
-                "content": transcript
+                "content": transcript.text,
+                "transcript": transcript.to_dict(),
+                "segments": segments
             }
             print(json.dumps(response), flush=True)
         except Exception as e:
@@ -5,10 +5,19 @@ env_path = os.path.join(os.path.dirname(__file__), "..", "..", "api", ".env")
 load_dotenv(dotenv_path=env_path)
 
 import os
+import re
 import sys
 import json
 import requests
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import events
+from common.hedging import Hedger
+from common.metadata_translation import batches, default_translations, pack, unpack
+from common.profiling import AgentProfiler
+from common.ratelimit import RateLimiter
+from common.transcript import Transcript
+
 # Cargar las variables de entorno desde el archivo .env
 load_dotenv("/workspaces/GlobalPodcaster/devcontainer/.env")
 
@@ -18,42 +27,180 @@ MISTRAL_API_URL = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/c
 if not MISTRAL_API_KEY:
     raise ValueError("MISTRAL_API_KEY no está configurada. Asegúrate de que esté definida en el archivo .env o en las variables de entorno.")
 
+# Tamaño máximo de cada bloque de párrafos enviado en una sola petición
+TRANSLATE_CHUNK_CHARS = int(os.getenv("TRANSLATE_CHUNK_CHARS", "2000"))
+
+# Tiempo máximo de una petición de traducción
+TRANSLATE_TIMEOUT = float(os.getenv("TRANSLATE_TIMEOUT", "120"))
+MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-tiny")  # Modelo gratuito por defecto
+
+# Respaldo para el hedging: otro endpoint/modelo compatible o, si no se
+# configura, una réplica de la misma petición. Como se paga aparte, solo se
+# usa con HEDGE_TRANSLATE=1 y HEDGE_TRANSLATE_BACKUPS=mistral-backup
+MISTRAL_BACKUP_URL = os.getenv("MISTRAL_BACKUP_URL") or MISTRAL_API_URL
+MISTRAL_BACKUP_MODEL = os.getenv("MISTRAL_BACKUP_MODEL") or MISTRAL_MODEL
+MISTRAL_BACKUP_API_KEY = os.getenv("MISTRAL_BACKUP_API_KEY") or MISTRAL_API_KEY
+
+# Ritmo/presupuesto compartido con el resto de agentes (presupuesto en tokens)
+mistral_limiter = RateLimiter("mistral")
+backup_limiter = mistral_limiter if MISTRAL_BACKUP_API_KEY == MISTRAL_API_KEY else RateLimiter("mistral-backup")
+hedger = Hedger("translate")
+
 HEADERS = {
     "Authorization": f"Bearer {MISTRAL_API_KEY}",
     "Content-Type": "application/json"
 }
+BACKUP_HEADERS = {**HEADERS, "Authorization": f"Bearer {MISTRAL_BACKUP_API_KEY}"}
 
-def mistral_translate(text, target_lang):
-    # Prompt para traducción usando LLM
-    prompt = f"Translate the following text to {target_lang}:\n{text}"
+def _chat(prompt, url, headers, model, limiter, estimated_tokens, max_tokens=1024):
     data = {
-        "model": "mistral-tiny",  # Modelo gratuito por defecto
+        "model": model,
         "messages": [
             {"role": "user", "content": prompt}
         ],
-        "max_tokens": 1024,
+        "max_tokens": max_tokens,
         "temperature": 0.2
     }
-    response = requests.post(MISTRAL_API_URL, headers=HEADERS, json=data)
+    with limiter.acquire(cost=estimated_tokens):
+        response = requests.post(url, headers=headers, json=data, timeout=TRANSLATE_TIMEOUT)
     response.raise_for_status()
     result = response.json()
+    limiter.record(result.get("usage", {}).get("total_tokens", estimated_tokens))
     return result["choices"][0]["message"]["content"].strip()
 
+def _hedged_chat(prompt, max_tokens=1024):
+    # Estimación previa (~4 caracteres por token, entrada + salida)
+    estimated_tokens = len(prompt) // 2
+    translated, _ = hedger.run(
+        ("mistral", lambda: _chat(prompt, MISTRAL_API_URL, HEADERS, MISTRAL_MODEL, mistral_limiter,
+                                  estimated_tokens, max_tokens)),
+        ("mistral-backup", lambda: _chat(prompt, MISTRAL_BACKUP_URL, BACKUP_HEADERS, MISTRAL_BACKUP_MODEL,
+                                         backup_limiter, estimated_tokens, max_tokens)),
+        cost=estimated_tokens,
+    )
+    return translated
+
+def mistral_translate(text, target_lang):
+    # Prompt para traducción usando LLM
+    prompt = (
+        f"Translate the following text to {target_lang}. "
+        f"Keep the same paragraph breaks and reply with the translation only:\n{text}"
+    )
+    return _hedged_chat(prompt)
+
+def _translate_packed(strings, target_lang):
+    """
+    Traduce un bloque de cadenas en una petición (objeto JSON con una clave
+    por cadena). Las que no vuelvan se reintentan en dos mitades y, ya
+    sueltas, con ``mistral_translate``.
+    """
+    if len(strings) == 1:
+        return [mistral_translate(strings[0], target_lang)]
+    prompt = (
+        f"Translate every value of the following JSON object to {target_lang}. "
+        "Reply with a JSON object with exactly the same keys and the translations as values, "
+        f"and nothing else:\n{pack(strings)}"
+    )
+    # La respuesta ocupa lo mismo que la entrada, más las claves
+    translated = unpack(_hedged_chat(prompt, max_tokens=len(prompt) // 2 + 256), len(strings))
+    missing = [i for i in range(len(strings)) if i not in translated]
+    if missing:
+        retry = [strings[i] for i in missing]
+        half = (len(retry) + 1) // 2
+        retried = _translate_packed(retry[:half], target_lang)
+        if retry[half:]:
+            retried += _translate_packed(retry[half:], target_lang)
+        translated.update(zip(missing, retried))
+    return [translated[i] for i in range(len(strings))]
+
+def translate_strings(strings, target_lang):
+    """
+    Traduce muchas cadenas cortas (títulos, descripciones) empaquetadas en
+    pocas peticiones. Solo se piden las que no están en la caché por
+    (hash, idioma), y las nuevas se guardan en ella.
+    """
+    cache = default_translations()
+    translated = cache.get(strings, target_lang)
+    missing = [text for text in dict.fromkeys(strings) if text and text not in translated]
+    for batch in batches(missing):
+        results = dict(zip(batch, _translate_packed(batch, target_lang)))
+        cache.put(results, target_lang)
+        translated.update(results)
+    return [translated.get(text, text) for text in strings]
+
+def _batches(paragraphs, max_chars):
+    batch, size = [], 0
+    for p in paragraphs:
+        if batch and size + len(p) > max_chars:
+            yield batch
+            batch, size = [], 0
+        batch.append(p)
+        size += len(p) + 2
+    if batch:
+        yield batch
+
+def translate_paragraphs(paragraphs, target_lang, on_batch=None):
+    """
+    Traduce párrafos agrupados en bloques, conservando la correspondencia 1:1.
+    Si el modelo no respeta los saltos de párrafo se traduce uno a uno.
+    ``on_batch(partes, traducidos, total)`` se llama tras cada bloque.
+    """
+    out = []
+    for batch in _batches(paragraphs, TRANSLATE_CHUNK_CHARS):
+        translated = mistral_translate("\n\n".join(batch), target_lang)
+        parts = [p.strip() for p in re.split(r"\n\s*\n", translated) if p.strip()]
+        if len(parts) != len(batch):
+            parts = [mistral_translate(p, target_lang) for p in batch]
+        out.extend(parts)
+        if on_batch:
+            on_batch(parts, len(out), len(paragraphs))
+    return out
+
+def translate_transcript(transcript, target_lang, on_batch=None):
+    """Traduce un Transcript párrafo a párrafo y conserva sus tiempos."""
+    texts = translate_paragraphs(transcript.paragraph_texts(), target_lang, on_batch)
+    return transcript.with_paragraphs(texts, target_lang)
+
+def publish_batch(job_id, parts, done, total):
+    """Cada bloque traducido se entrega en cuanto existe (evento ``translating``)."""
+    events.publish(job_id, "translating", {
+        "percent": round(100 * done / max(total, 1)),
+        "chunk": "\n\n".join(parts)
+    })
+
 def log_with_spacing(message):
     print("\n" + message, file=sys.stderr)
 
 if __name__ == "__main__":
-    for line in sys.stdin:
+    profiler = AgentProfiler("translation-agent")
+    for line in profiler.lines(sys.stdin):
         try:
             msg = json.loads(line)
+            if msg.get("command") == "HEDGE_STATS":
+                print(json.dumps({
+                    "sender": msg.get("receiver", "translation-agent"),
+                    "receiver": msg.get("sender", "orchestrator"),
+                    "content": hedger.stats()
+                }), flush=True)
+                continue
             text = msg.get("content")
             target_lang = msg.get("target_lang", "es")  # Default: Spanish
-            translated = mistral_translate(text, target_lang)
             response = {
                 "sender": msg["receiver"],
                 "receiver": msg["sender"],
-                "content": translated
             }
+            if msg.get("strings") is not None:
+                response["content"] = translate_strings(msg["strings"], target_lang)
+            elif msg.get("transcript"):
+                on_batch = None
+                if msg.get("job_id") is not None:
+                    def on_batch(parts, done, total, job_id=msg["job_id"]):
+                        publish_batch(job_id, parts, done, total)
+                translated = translate_transcript(Transcript.from_dict(msg["transcript"]), target_lang, on_batch)
+                response["content"] = translated.text
+                response["transcript"] = translated.to_dict()
+            else:
+                response["content"] = mistral_translate(text, target_lang)
             print(json.dumps(response), flush=True)
         except Exception as e:
             import traceback
@@ -1,9 +1,9 @@
 # agents/tts-agent/agent.py
+import io
 import os
 import sys
 import json
-import uuid
-import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import os
 
@@ -11,6 +11,14 @@ env_path = os.path.join(os.path.dirname(__file__), "..", "..", "api", ".env")
 load_dotenv(dotenv_path=env_path)
 
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.hedging import Hedger
+from common.media_store import STORAGE_DIR, public_url
+from common.profiling import AgentProfiler
+from common.ratelimit import BudgetExhausted, RateLimiter, RateLimitTimeout
+from common.transcript import Transcript
+from synthesis_cache import SynthesisCache, plan_chunks
+
 # Official SDK
 from elevenlabs import ElevenLabs  # client wrapper
 # alternative direct helpers (some SDK versions also expose generate/save functions)
@@ -19,8 +27,16 @@ load_dotenv("/workspaces/GlobalPodcaster/devcontainer/.env")
 
 ELEVEN_API_KEY = os.getenv("ELEVENLABS_API_KEY")
 DEFAULT_VOICE_ID = os.getenv("TTS_DEFAULT_VOICE_ID", None)
-STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
-STORAGE_BASE_URL = os.getenv("STORAGE_BASE_URL", "http://localhost:5001/media")
+ELEVEN_MODEL_ID = "eleven_multilingual_v2"
+ELEVEN_OUTPUT_FORMAT = "mp3_44100_128"
+# Clave de caché del fallback: (idioma, "gtts", "mp3") en lugar de la voz
+GTTS_MODEL_ID = "gtts"
+GTTS_OUTPUT_FORMAT = "mp3"
+# Tamaño de bloque y peticiones simultáneas al sintetizar un Transcript
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "2500"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "2"))
+# Espera máxima por un turno de ElevenLabs antes de degradar a gTTS
+TTS_RATE_LIMIT_TIMEOUT = float(os.getenv("TTS_RATE_LIMIT_TIMEOUT", "30"))
 
 # Create storage dir
 os.makedirs(STORAGE_DIR, exist_ok=True)
@@ -34,95 +50,173 @@ if not ELEVEN_API_KEY:
     sys.exit(1)
 
 client = ElevenLabs(api_key=ELEVEN_API_KEY)
+cache = SynthesisCache()
+eleven_limiter = RateLimiter("elevenlabs")
+gtts_limiter = RateLimiter("gtts")
+# Con HEDGE_TTS=1, si ElevenLabs tarda más que su p90 se pide también a gTTS
+hedger = Hedger("tts")
 
-def make_filename(prefix="tts", ext="mp3"):
-    ts = int(time.time())
-    unique = uuid.uuid4().hex[:8]
-    return f"{prefix}_{ts}_{unique}.{ext}"
-
-def tts_to_file_elevenlabs(text, voice_id):
+def synthesize_elevenlabs(text, voice_id):
     """
-    Uses ElevenLabs SDK to synthesize speech and save an mp3 file.
-    Returns the local path to the saved file.
+    Uses ElevenLabs SDK to synthesize speech.
+    Returns the mp3 bytes.
     """
-    out_name = make_filename("tts_eleven", "mp3")
-    out_path = os.path.join(STORAGE_DIR, out_name)
-
     # This returns a generator of byte chunks
     audio_gen = client.text_to_speech.convert(
         voice_id=voice_id,
         text=text,
-        model_id="eleven_multilingual_v2",
-        output_format="mp3_44100_128"
+        model_id=ELEVEN_MODEL_ID,
+        output_format=ELEVEN_OUTPUT_FORMAT
     )
 
     # Combine all chunks into one bytes object
-    audio_bytes = b"".join(audio_gen)
+    return b"".join(audio_gen)
 
-    with open(out_path, "wb") as f:
-        f.write(audio_bytes)
-
-    return out_path
+def detect_lang(text):
+    # Detectar idioma (simple heurística)
+    return 'es' if any(char in text.lower() for char in 'ñáéíóúü') else 'en'
 
-def tts_to_file_gtts_fallback(text):
+def synthesize_gtts(text, lang=None):
     """
     Fallback TTS usando Google TTS (gratuito) cuando ElevenLabs no está disponible.
     """
     from gtts import gTTS
-    
-    out_name = make_filename("tts_gtts", "mp3")
-    out_path = os.path.join(STORAGE_DIR, out_name)
-    
-    # Detectar idioma (simple heurística)
-    lang = 'es' if any(char in text.lower() for char in 'ñáéíóúü') else 'en'
-    
-    tts = gTTS(text=text, lang=lang, slow=False)
-    tts.save(out_path)
-    
-    return out_path
-
-def tts_to_file(text, voice_id):
+
+    buf = io.BytesIO()
+    with gtts_limiter.acquire():
+        gTTS(text=text, lang=lang or detect_lang(text), slow=False).write_to_fp(buf)
+    return buf.getvalue()
+
+def synthesize(text, voice_id, lang=None):
     """
     TTS con fallback automático: intenta ElevenLabs, si falla usa gTTS.
+    Si ElevenLabs está cerca de su presupuesto o no hay turno a tiempo se
+    usa gTTS directamente, sin esperar al error. Con hedging activo, gTTS
+    también responde si ElevenLabs tarda más que su p90. Devuelve (bytes, proveedor).
     """
+    if eleven_limiter.near_limit(len(text)):
+        print(f"⚠️  ElevenLabs cerca del límite de créditos, usando fallback gratuito...", file=sys.stderr)
+        return synthesize_gtts(text, lang), "gtts"
+    def eleven():
+        with eleven_limiter.acquire(cost=len(text), timeout=TTS_RATE_LIMIT_TIMEOUT):
+            audio = synthesize_elevenlabs(text, voice_id)
+        eleven_limiter.record(len(text))
+        return audio
+
     try:
-        # Intentar ElevenLabs primero
-        return tts_to_file_elevenlabs(text, voice_id)
+        # Intentar ElevenLabs primero (cubierto con gTTS si la política de hedging está activa)
+        return hedger.run(("eleven", eleven), ("gtts", lambda: synthesize_gtts(text, lang)), cost=len(text))
+    except (RateLimitTimeout, BudgetExhausted) as e:
+        print(f"⚠️  {e}, usando fallback gratuito...", file=sys.stderr)
+        return synthesize_gtts(text, lang), "gtts"
     except Exception as e:
         error_str = str(e)
         if 'quota_exceeded' in error_str or 'credits' in error_str.lower():
             print(f"⚠️  ElevenLabs sin créditos, usando fallback gratuito...", file=sys.stderr)
-            return tts_to_file_gtts_fallback(text)
+            # Avisar al resto de agentes para que degraden sin llamar
+            eleven_limiter.mark_exhausted()
+            return synthesize_gtts(text, lang), "gtts"
         else:
             # Otro tipo de error, propagar
             raise
 
+def cached_audio(text, voice_id, lang=None, chunk=False):
+    """
+    (ruta, proveedor) del audio en caché: el de ElevenLabs o, si ElevenLabs
+    no se va a usar (cerca del límite o sin créditos), el de gTTS.
+    (None, None) si no hay ninguno.
+    """
+    path = cache.get(text, voice_id, ELEVEN_MODEL_ID, ELEVEN_OUTPUT_FORMAT, chunk=chunk)
+    if path:
+        return path, "eleven"
+    if eleven_limiter.near_limit(len(text)):
+        path = cache.get(text, lang or detect_lang(text), GTTS_MODEL_ID, GTTS_OUTPUT_FORMAT, chunk=chunk)
+        if path:
+            return path, "gtts"
+    return None, None
+
+def store_audio(text, voice_id, lang, provider, audio):
+    """Guarda el audio en caché con la clave de su proveedor; devuelve la ruta."""
+    if provider == "eleven":
+        return cache.put(text, voice_id, ELEVEN_MODEL_ID, ELEVEN_OUTPUT_FORMAT, audio)
+    return cache.put(text, lang or detect_lang(text), GTTS_MODEL_ID, GTTS_OUTPUT_FORMAT, audio)
+
+def synthesize_chunks(chunks, voice_id, lang=None):
+    """
+    Sintetiza los bloques en paralelo reutilizando los que ya están en caché.
+    Devuelve (bytes concatenados, proveedor): "gtts" si algún bloque usó el fallback.
+    """
+    def one(chunk):
+        path, provider = cached_audio(chunk, voice_id, lang, chunk=True)
+        if path:
+            with open(path, "rb") as f:
+                return f.read(), provider
+        audio, provider = synthesize(chunk, voice_id, lang)
+        store_audio(chunk, voice_id, lang, provider, audio)
+        return audio, provider
+
+    with ThreadPoolExecutor(max_workers=TTS_MAX_CONCURRENCY) as pool:
+        results = list(pool.map(one, chunks))
+    provider = "eleven" if all(p == "eleven" for _, p in results) else "gtts"
+    # los frames mp3 se pueden concatenar sin recodificar
+    return b"".join(audio for audio, _ in results), provider
+
+def synthesize_cached(paragraphs, voice_id, lang=None):
+    """
+    Devuelve la ruta local del mp3 de unos párrafos. Primero busca el texto
+    completo; si no está, lo compone a partir de bloques de frases cacheados.
+    """
+    full_text = "\n".join(paragraphs)
+    cached, _ = cached_audio(full_text, voice_id, lang)
+    if cached:
+        return cached
+    audio, provider = synthesize_chunks(plan_chunks(paragraphs, TTS_CHUNK_CHARS), voice_id, lang)
+    return store_audio(full_text, voice_id, lang, provider, audio)
+
+def tts_to_file(text, voice_id, lang=None):
+    """Ruta local del mp3 de un texto (desde caché cuando es posible)."""
+    return synthesize_cached([text], voice_id, lang)
+
+def tts_transcript_to_file(transcript, voice_id):
+    """Sintetiza un Transcript párrafo a párrafo reutilizando la caché."""
+    return synthesize_cached(transcript.paragraph_texts(), voice_id, transcript.lang)
+
 def log_with_spacing(message):
     print("\n" + message + "\n", file=sys.stderr)
 
 if __name__ == "__main__":
+    profiler = AgentProfiler("tts-agent")
     # read incoming JSON messages from stdin (one per line)
-    for line in sys.stdin:
+    for line in profiler.lines(sys.stdin):
         try:
             msg = json.loads(line)
+            if msg.get("command") in ("CACHE_STATS", "HEDGE_STATS"):
+                print(json.dumps({
+                    "sender": msg.get("receiver", "tts-agent"),
+                    "receiver": msg.get("sender", "orchestrator"),
+                    "content": cache.stats() if msg["command"] == "CACHE_STATS" else hedger.stats()
+                }), flush=True)
+                continue
             text = msg.get("content", "")
+            transcript = msg.get("transcript")
             voice_id = msg.get("voice_id") or DEFAULT_VOICE_ID
-            if not text:
+            if not text and not transcript:
                 raise ValueError("No text provided in content.")
             if not voice_id:
                 raise ValueError("No voice_id provided and no TTS_DEFAULT_VOICE_ID set.")
 
             # synthesize
-            local_path = tts_to_file(text, voice_id)
-            filename = os.path.basename(local_path)
-            public_url = f"{STORAGE_BASE_URL}/{filename}"
+            if transcript:
+                local_path = tts_transcript_to_file(Transcript.from_dict(transcript), voice_id)
+            else:
+                local_path = tts_to_file(text, voice_id)
 
             response = {
                 "sender": msg.get("receiver", "tts-agent"),
                 "receiver": msg.get("sender", "orchestrator"),
                 "content": {
                     "local_path": local_path,
-                    "audio_url": public_url
+                    "audio_url": public_url(local_path)
                 }
             }
             print(json.dumps(response), flush=True)
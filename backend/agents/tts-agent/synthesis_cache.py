@@ -0,0 +1,120 @@
+# agents/tts-agent/synthesis_cache.py
+"""
+Caché persistente de síntesis TTS sobre ``common.media_store``.
+
+- Clave: texto normalizado + voice_id + model_id + output_format.
+- Trabaja a nivel de bloques de frases: los cortes entre bloques dependen del
+  contenido de cada frase (no de su posición), así dos textos que comparten
+  frases generan los mismos bloques y reutilizan su audio.
+- Métricas de aciertos/fallos y caracteres ahorrados en SQLite
+  (``DATA_DIR/tts_cache.db``), compartidas por todos los procesos del agente.
+- Expulsión LRU cuando el audio almacenado supera TTS_CACHE_MAX_BYTES.
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, List, Optional
+
+from common import media_store
+from common.db import connect, db_path
+
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(media_store.STORAGE_MAX_BYTES)))
+# Número medio de frases por bloque (los cortes se eligen por hash de la frase)
+TTS_CACHE_CHUNK_SENTENCES = int(os.getenv("TTS_CACHE_CHUNK_SENTENCES", "4"))
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize(text: str) -> str:
+    """Forma canónica del texto: NFC y espacios colapsados."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in _SENTENCE_SPLIT.split(normalize(text)) if s]
+
+
+def plan_chunks(paragraphs: List[str], max_chars: int) -> List[str]:
+    """
+    Agrupa las frases de cada párrafo en bloques definidos por contenido.
+
+    Un bloque termina tras una frase cuyo hash es múltiplo de
+    TTS_CACHE_CHUNK_SENTENCES, al final del párrafo o al alcanzar ``max_chars``.
+    """
+    chunks = []
+    for paragraph in paragraphs:
+        cur: List[str] = []
+        size = 0
+        for sentence in split_sentences(paragraph):
+            if cur and size + len(sentence) + 1 > max_chars:
+                chunks.append(" ".join(cur))
+                cur, size = [], 0
+            cur.append(sentence)
+            size += len(sentence) + 1
+            digest = hashlib.blake2b(sentence.encode(), digest_size=4).digest()
+            if int.from_bytes(digest, "big") % TTS_CACHE_CHUNK_SENTENCES == 0:
+                chunks.append(" ".join(cur))
+                cur, size = [], 0
+        if cur:
+            chunks.append(" ".join(cur))
+    return chunks
+
+
+class SynthesisCache:
+    """Acceso a la caché de síntesis con métricas y presupuesto de disco."""
+
+    COUNTERS = ("hits", "misses", "chunk_hits", "chunk_misses", "chars_saved",
+                "bytes_stored", "evictions")
+
+    def __init__(self, max_bytes: int = TTS_CACHE_MAX_BYTES, path: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.conn = connect(path or db_path("tts_cache.db"))
+        self.conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", [(c,) for c in self.COUNTERS])
+
+    def _incr(self, **deltas: int):
+        with self._lock:
+            self.conn.executemany("UPDATE counters SET value = value + ? WHERE name = ?",
+                                  [(v, k) for k, v in deltas.items() if v])
+
+    @staticmethod
+    def key(text: str, voice_id: str, model: str, fmt: str) -> str:
+        return media_store.content_key(normalize(text), voice_id, model, fmt)
+
+    def get(self, text: str, voice_id: str, model: str, fmt: str, chunk: bool = False) -> Optional[str]:
+        path = media_store.lookup(self.key(text, voice_id, model, fmt), "mp3")
+        prefix = "chunk_" if chunk else ""
+        if path:
+            self._incr(**{f"{prefix}hits": 1, "chars_saved": len(text)})
+        else:
+            self._incr(**{f"{prefix}misses": 1})
+        return path
+
+    def put(self, text: str, voice_id: str, model: str, fmt: str, data: bytes) -> str:
+        # Solo cuenta lo escrito: un audio idéntico ya almacenado no ocupa más disco
+        path, written = media_store.store(self.key(text, voice_id, model, fmt), "mp3", data)
+        self._incr(bytes_stored=written)
+        self._maybe_evict()
+        return path
+
+    def _maybe_evict(self):
+        """Lanza el GC de media_store cuando el contador de bytes supera el presupuesto."""
+        if not self.max_bytes or self.stats()["bytes_stored"] <= self.max_bytes:
+            return
+        result = media_store.gc(int(self.max_bytes * 0.9))
+        with self._lock:
+            self.conn.execute("UPDATE counters SET value = ? WHERE name = 'bytes_stored'", (result["bytes"],))
+            self.conn.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (result["removed"],))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = {row["name"]: row["value"] for row in self.conn.execute("SELECT name, value FROM counters")}
+        lookups = stats["hits"] + stats["misses"]
+        chunk_lookups = stats["chunk_hits"] + stats["chunk_misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        stats["chunk_hit_ratio"] = stats["chunk_hits"] / chunk_lookups if chunk_lookups else 0.0
+        return stats
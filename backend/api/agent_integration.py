@@ -1,29 +1,116 @@
 # backend/api/agent_integration.py
-import subprocess, sys, json
+import asyncio, json, os, sys
+from contextlib import aclosing
 from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# Procesos de orquestador simultáneos; el resto de peticiones espera turno
+# en el event loop sin ocupar hilos.
+AGENT_MAX_PROCS = int(os.getenv("AGENT_MAX_PROCS", "32"))
+
 
 class AgentManager:
-    def __init__(self):
+    def __init__(self, max_procs: int = AGENT_MAX_PROCS):
         base = Path(__file__).resolve().parent.parent  # project-root/backend
         self.orchestrator_path = str(base / "agents" / "orchestrator" / "agent_api_integrated.py")
+        self._slots = asyncio.Semaphore(max_procs)
+        self._background = set()
 
-    def process_rss_feed(self, feed_url: str, target_lang: str = "es", podcast_id: int = 1):
+    def _message(self, feed_url: str, target_lang: str, podcast_id: Optional[int] = None,
+                 **extra) -> Dict[str, Any]:
         msg = {
             "sender": "api",
             "receiver": "orchestrator",
             "content": feed_url,
-            "podcast_id": podcast_id,
             "target_lang": target_lang
         }
-        proc = subprocess.run(
-            [sys.executable, self.orchestrator_path],
-            input=json.dumps(msg) + "\n",
-            text=True,
-            capture_output=True
-        )
+        # Sin podcast_id, el orquestador usa el id del feed en el catálogo;
+        # el tenant lo decide el orquestador a partir del feed
+        if podcast_id is not None:
+            msg["podcast_id"] = podcast_id
+        msg.update({k: v for k, v in extra.items() if v})
+        return msg
+
+    async def process_rss_feed(self, feed_url: str, target_lang: str = "es", podcast_id: Optional[int] = None,
+                               include_text: bool = False, fields: Optional[List[str]] = None):
+        msg = self._message(feed_url, target_lang, podcast_id, include_text=include_text, fields=fields)
+        async with self._slots:
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, self.orchestrator_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await proc.communicate((json.dumps(msg) + "\n").encode())
         if proc.returncode != 0:
-            raise RuntimeError(f"Agent error: {proc.stderr}")
+            raise RuntimeError(f"Agent error: {stderr.decode(errors='replace')}")
         try:
-            return json.loads(proc.stdout)
+            lines = [line for line in stdout.decode().splitlines() if line.startswith("{")]
+            return json.loads(lines[-1])
         except Exception:
-            raise RuntimeError(f"Invalid JSON from orchestrator: {proc.stdout}")
+            raise RuntimeError(f"Invalid JSON from orchestrator: {stdout.decode(errors='replace')}")
+
+    async def submit_rss_feed(self, feed_url: str, target_lang: str = "es",
+                              podcast_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Encola el episodio y devuelve en cuanto el orquestador responde con el
+        ``job_id``; el procesamiento continúa y se sigue por eventos.
+        """
+        async with aclosing(self._lines(self._message(feed_url, target_lang, podcast_id, detach=True))) as lines:
+            async for msg in lines:
+                return msg
+        raise RuntimeError("Orchestrator exited without a response")
+
+    async def stream_rss_feed(self, feed_url: str, target_lang: str = "es",
+                              podcast_id: Optional[int] = None, include_text: bool = False,
+                              fields: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Igual que ``process_rss_feed`` pero produce cada línea del orquestador
+        según llega: mensajes de progreso por etapa y la respuesta final.
+        """
+        async with aclosing(self._lines(self._message(feed_url, target_lang, podcast_id,
+                                                 stream=True, include_text=include_text,
+                                                 fields=fields))) as lines:
+            async for msg in lines:
+                yield msg
+
+    async def _lines(self, msg: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        await self._slots.acquire()
+        detached = False
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                sys.executable, self.orchestrator_path,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=None,  # los logs del orquestador van a los de la API
+            )
+            proc.stdin.write((json.dumps(msg) + "\n").encode())
+            await proc.stdin.drain()
+            proc.stdin.close()
+            try:
+                async for line in proc.stdout:
+                    if line.startswith(b"{"):
+                        yield json.loads(line)
+                await proc.wait()
+            finally:
+                if proc.returncode is None:
+                    # Lectura abandonada (respuesta ya entregada o cliente
+                    # desconectado): el episodio termina igualmente y se sigue
+                    # leyendo para que el orquestador no se bloquee en stdout.
+                    # La plaza pasa a la tarea y se libera cuando el proceso sale.
+                    task = asyncio.ensure_future(self._drain(proc))
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                    detached = True
+        finally:
+            if not detached:
+                self._slots.release()
+        if proc.returncode:
+            raise RuntimeError(f"Agent error: orchestrator exited with code {proc.returncode}")
+
+    async def _drain(self, proc: asyncio.subprocess.Process):
+        """Lee la salida de un orquestador abandonado hasta que termina y libera su plaza."""
+        try:
+            await proc.communicate()
+        finally:
+            self._slots.release()
@@ -0,0 +1,83 @@
+# backend/api/catalog_endpoints.py
+import asyncio, os, sys
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents"))
+from common.catalog import Catalog
+from common.metadata_translation import start_metadata_translation
+from common.projection import CATALOG_EPISODE_FIELDS, parse_fields, project, project_all
+
+router = APIRouter(prefix="/catalog")
+catalog = Catalog()
+
+
+def _page(items, limit: int, offset: int, fields: Optional[str] = None, default=None):
+    return {
+        "items": project_all(items, parse_fields(fields, default)),
+        "limit": limit,
+        "offset": offset,
+        "next_offset": offset + limit if len(items) == limit else None
+    }
+
+
+@router.get("/feeds")
+async def list_feeds(limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0),
+                     fields: Optional[str] = None):
+    return _page(await asyncio.to_thread(catalog.list_feeds, limit, offset), limit, offset, fields)
+
+
+@router.get("/episodes")
+async def list_episodes(feed_url: Optional[str] = None, limit: int = Query(50, ge=1, le=200),
+                        cursor: Optional[str] = None, offset: int = Query(0, ge=0), fields: Optional[str] = None,
+                        lang: Optional[str] = None):
+    """
+    Episodios indexados (de un feed o de todos), los más recientes primero.
+    Se pagina con ``cursor`` (el ``next_cursor`` de la página anterior);
+    ``offset`` se mantiene por compatibilidad. Por defecto cada episodio va
+    solo con sus identificadores y su fecha (``fields=*`` para todo); con
+    ``lang``, también con su título traducido si ya existe.
+    """
+    default = CATALOG_EPISODE_FIELDS + ("translated_title",) if lang else CATALOG_EPISODE_FIELDS
+    if offset:
+        items = await asyncio.to_thread(catalog.list_episodes, feed_url, limit, offset)
+        if lang:
+            await asyncio.to_thread(catalog.localize, items, lang)
+        return _page(items, limit, offset, fields, default)
+    try:
+        page = await asyncio.to_thread(catalog.page_episodes, feed_url, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if lang:
+        await asyncio.to_thread(catalog.localize, page["items"], lang)
+    return {**page, "items": project_all(page["items"], parse_fields(fields, default))}
+
+
+@router.get("/episodes/{episode_key}")
+async def get_episode(episode_key: str, fields: Optional[str] = None, lang: Optional[str] = None):
+    episode = await asyncio.to_thread(catalog.get_episode, episode_key)
+    if episode is None:
+        raise HTTPException(status_code=404, detail=f"Episode {episode_key} not found")
+    if lang:
+        await asyncio.to_thread(catalog.localize, [episode], lang)
+    return project(episode, parse_fields(fields))
+
+
+@router.post("/feeds/translate")
+async def translate_feed(feed_url: str, lang: str):
+    """
+    Traduce en segundo plano títulos y descripciones del feed a ``lang``; el
+    resultado aparece en ``/catalog/episodes?lang=...`` según termina.
+    """
+    try:
+        return await asyncio.to_thread(start_metadata_translation, [feed_url], [lang])
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Could not read feed {feed_url}: {e}")
+
+
+@router.get("/search")
+async def search(q: str = Query(..., min_length=1), lang: Optional[str] = None, feed_url: Optional[str] = None,
+                 limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0), fields: Optional[str] = None):
+    """Búsqueda de texto completo en títulos, descripciones, transcripciones y traducciones."""
+    items = await asyncio.to_thread(catalog.search, q, lang, feed_url, limit, offset)
+    return _page(items, limit, offset, fields)
@@ -0,0 +1,42 @@
+# backend/api/feed_endpoints.py
+import asyncio, os, sys
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents"))
+from common.feed_registry import FeedRegistry, parse_opml
+from common.projection import parse_fields, project_all
+
+router = APIRouter()
+registry = FeedRegistry()
+
+
+class FeedBatch(BaseModel):
+    feeds: List[str] = []
+    opml: Optional[str] = None  # documento OPML completo
+
+
+@router.get("/feeds")
+async def list_feeds(status: Optional[str] = None, limit: int = Query(100, ge=1, le=1000),
+                     offset: int = Query(0, ge=0), fields: Optional[str] = None):
+    items = await asyncio.to_thread(registry.list, status, limit, offset)
+    return {"items": project_all(items, parse_fields(fields)), "limit": limit, "offset": offset,
+            "next_offset": offset + limit if len(items) == limit else None}
+
+
+@router.post("/feeds:batch")
+async def add_feeds(batch: FeedBatch):
+    """
+    Alta en lote: valida en paralelo las URLs (y las del OPML) y las guarda
+    en el registro en una sola transacción.
+    """
+    urls = list(batch.feeds)
+    if batch.opml:
+        try:
+            urls += [feed["url"] for feed in parse_opml(batch.opml.encode())]
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Invalid OPML: {e}")
+    if not urls:
+        raise HTTPException(status_code=422, detail="No feeds provided")
+    return await asyncio.to_thread(registry.add, urls)
@@ -0,0 +1,103 @@
+# backend/api/job_events.py
+import asyncio, json, os, sys, time
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "agents"))
+from common.events import TERMINAL_EVENTS, EventLog
+from common.jobqueue import DONE, FAILED, JobQueue
+from common.artifacts import load_text
+from common.pipeline import job_result
+from common.projection import parse_fields, project
+
+router = APIRouter(prefix="/jobs")
+
+SSE_POLL_S = float(os.getenv("SSE_POLL_SECONDS", "0.5"))
+SSE_KEEPALIVE_S = 15.0
+
+queue = JobQueue()
+event_log = EventLog()
+
+
+def _sse(event_id, event, data) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _get_job(job_id: int):
+    job = await asyncio.to_thread(queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: int, include_text: bool = False, fields: Optional[str] = None):
+    """
+    Estado y resultados del job; transcripción y traducción como referencia
+    salvo ``include_text``. ``fields`` (separados por comas) limita la respuesta.
+    """
+    job = await _get_job(job_id)
+    result = {"job_id": job_id, **await asyncio.to_thread(job_result, job, include_text)}
+    return project(result, parse_fields(fields))
+
+
+async def _job_text(job_id: int, stage: str):
+    job = await _get_job(job_id)
+    transcript = await asyncio.to_thread(load_text, job["episode_key"], job["results"].get(stage))
+    if transcript is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} has no {stage} result yet")
+    return {"job_id": job_id, "lang": transcript.lang, "text": transcript.text}
+
+
+@router.get("/{job_id}/transcript")
+async def get_job_transcript(job_id: int):
+    return await _job_text(job_id, "transcribe")
+
+
+@router.get("/{job_id}/translation")
+async def get_job_translation(job_id: int):
+    return await _job_text(job_id, "translate")
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: int, after: int = 0, last_event_id: str = Header(None)):
+    """
+    SSE con los eventos del job (detected, transcribing con porcentaje,
+    transcribed, translating con cada bloque, synthesized con la URL, done).
+    Un cliente que reconecta continúa desde ``Last-Event-ID``. 404 si el job
+    no existe; si desaparece con el stream abierto, un evento ``error`` lo cierra.
+    """
+    await _get_job(job_id)
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+
+    async def stream():
+        cursor, last_sent = after, time.monotonic()
+        while True:
+            batch = await asyncio.to_thread(event_log.since, cursor, job_id)
+            for ev in batch:
+                cursor = ev["id"]
+                yield _sse(ev["id"], ev["event"], ev["data"])
+                if ev["event"] in TERMINAL_EVENTS:
+                    return
+            if batch:
+                last_sent = time.monotonic()
+                continue
+            job = await asyncio.to_thread(queue.get, job_id)
+            if job is None:
+                # Job borrado con el stream abierto (el 404 solo cubre la conexión)
+                yield _sse(None, "error", {"detail": f"Job {job_id} not found"})
+                return
+            if job["state"] in (DONE, FAILED) and not await asyncio.to_thread(event_log.since, cursor, job_id):
+                # Job terminado sin evento final (p. ej. anterior a los eventos)
+                yield _sse(None, job["state"], job_result(job))
+                return
+            if time.monotonic() - last_sent > SSE_KEEPALIVE_S:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(SSE_POLL_S)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,30 +1,23 @@
 # backend/api/main_updated.py
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from agent_integration import AgentManager
+from fastapi import FastAPI
+from podcast_endpoints import router as podcasts_router
 from internal_endpoints import router as internal_router
+from job_events import router as jobs_router
+from catalog_endpoints import router as catalog_router
+from feed_endpoints import router as feeds_router
 
 app = FastAPI(title="Global Podcaster API")
-agent_manager = AgentManager()
-
-class PodcastRequest(BaseModel):
-    rss_feed_url: str
-    target_lang: str = "es"
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "healthy"}
 
-@app.post("/podcasts")
-def create_podcast(req: PodcastRequest):
-    try:
-        result = agent_manager.process_rss_feed(req.rss_feed_url, req.target_lang, podcast_id=1)
-        return {"episodes": result.get("content")}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
 # include internal agent routes
 app.include_router(internal_router)
+app.include_router(podcasts_router)
+app.include_router(jobs_router)
+app.include_router(catalog_router)
+app.include_router(feeds_router)
 
 if __name__ == "__main__":
     import uvicorn
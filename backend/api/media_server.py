@@ -0,0 +1,187 @@
+# backend/api/media_server.py
+"""
+Servidor estático para el audio y los subtítulos generados en STORAGE_DIR.
+
+Sirve ``/media/<ruta>`` en el puerto de STORAGE_BASE_URL (5001 por defecto),
+solo dentro de los subdirectorios públicos (``MEDIA_PUBLIC_DIRS``: audio y
+subtítulos); artefactos, descargas anticipadas y cachés dan 404:
+- Peticiones ``Range`` de un solo rango (206 / 416) para poder hacer seek.
+- ``ETag``, ``Last-Modified`` y respuestas 304 condicionales.
+- ``Cache-Control`` configurable.
+- Cuerpo enviado con ``socket.sendfile`` (``os.sendfile``, sin copiar a userspace).
+
+Uso:
+  python media_server.py [--dir storage] [--port 5001]
+"""
+import argparse
+import email.utils
+import mimetypes
+import os
+import re
+import urllib.parse
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+MEDIA_PREFIX = "/media/"
+MEDIA_PORT = int(os.getenv("MEDIA_PORT", "5001"))
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "86400"))
+# Subdirectorios de STORAGE_DIR que se publican; el resto no es media pública
+MEDIA_PUBLIC_DIRS = [d.strip() for d in os.getenv("MEDIA_PUBLIC_DIRS", "audio,subtitles").split(",") if d.strip()]
+# El audio en media/audio/ está direccionado por contenido: nunca cambia
+IMMUTABLE_SUBDIR = "audio" + os.sep
+
+mimetypes.add_type("text/vtt", ".vtt")
+mimetypes.add_type("application/x-subrip", ".srt")
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def make_etag(st: os.stat_result) -> str:
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def parse_range(header: str, size: int):
+    """
+    Devuelve ``(inicio, fin)`` inclusivo, ``None`` si la cabecera no aplica
+    (se sirve el fichero completo) o ``False`` si el rango no es satisfacible.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None  # multi-rango u otra unidad: se ignora
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    server_version = "GlobalPodcasterMedia/1.0"
+    protocol_version = "HTTP/1.1"
+    root = os.path.realpath(STORAGE_DIR)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _resolve(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if not path.startswith(MEDIA_PREFIX):
+            return None
+        full = os.path.realpath(os.path.join(self.root, path[len(MEDIA_PREFIX):]))
+        if not full.startswith(self.root + os.sep) or not os.path.isfile(full):
+            return None
+        if os.path.relpath(full, self.root).split(os.sep, 1)[0] not in MEDIA_PUBLIC_DIRS:
+            return None
+        return full
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def _serve(self, send_body: bool):
+        full = self._resolve()
+        if full is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        self._full_path = full
+
+        with open(full, "rb") as f:
+            st = os.fstat(f.fileno())
+            size = st.st_size
+            etag = make_etag(st)
+            last_modified = email.utils.formatdate(st.st_mtime, usegmt=True)
+
+            if self._not_modified(etag, st.st_mtime):
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self._common_headers(etag, last_modified)
+                self.end_headers()
+                return
+
+            byte_range = None
+            range_header = self.headers.get("Range")
+            if_range = self.headers.get("If-Range")
+            if range_header and (not if_range or if_range.strip() in (etag, last_modified)):
+                byte_range = parse_range(range_header, size)
+
+            if byte_range is False:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self._common_headers(etag, last_modified)
+                self.end_headers()
+                return
+
+            if byte_range:
+                start, end = byte_range
+                self.send_response(HTTPStatus.PARTIAL_CONTENT)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                start, end = 0, size - 1
+                self.send_response(HTTPStatus.OK)
+            length = end - start + 1 if size else 0
+            self.send_header("Content-Type", mimetypes.guess_type(full)[0] or "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self._common_headers(etag, last_modified)
+            self.end_headers()
+
+            if send_body and length:
+                try:
+                    self.connection.sendfile(f, offset=start, count=length)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El reproductor canceló la descarga al hacer seek
+                    self.close_connection = True
+
+    def _common_headers(self, etag: str, last_modified: str):
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", last_modified)
+        if self._full_path.startswith(os.path.join(self.root, IMMUTABLE_SUBDIR)):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        else:
+            self.send_header("Cache-Control", f"public, max-age={MEDIA_CACHE_MAX_AGE}")
+        # Necesario para <track> de subtítulos y reproductores en otro origen
+        self.send_header("Access-Control-Allow-Origin", "*")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve generated media from STORAGE_DIR")
+    parser.add_argument("--dir", default=STORAGE_DIR)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=MEDIA_PORT)
+    args = parser.parse_args()
+
+    MediaHandler.root = os.path.realpath(args.dir)
+    os.makedirs(MediaHandler.root, exist_ok=True)
+    server = ThreadingHTTPServer((args.host, args.port), MediaHandler)
+    print(f"[media] Serving {MediaHandler.root} at http://{args.host}:{args.port}{MEDIA_PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# backend/api/podcast_endpoints.py
+import json, os, sys
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from agent_integration import AgentManager
+
+router = APIRouter(prefix="/podcasts")
+agent_manager = AgentManager()
+
+
+class PodcastRequest(BaseModel):
+    rss_feed_url: str
+    target_lang: str = "es"
+    podcast_id: Optional[int] = None  # por defecto, el id del feed en el catálogo
+    include_text: bool = False        # por defecto, transcripción y traducción como referencia
+    fields: Optional[List[str]] = None  # campos del episodio en la respuesta (por defecto, todos)
+
+
+@router.post("")
+async def create_podcast(req: PodcastRequest):
+    try:
+        result = await agent_manager.process_rss_feed(req.rss_feed_url, req.target_lang,
+                                                      podcast_id=req.podcast_id, include_text=req.include_text,
+                                                      fields=req.fields)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"episodes": result.get("content")}
+
+
+@router.post("/stream")
+async def create_podcast_stream(req: PodcastRequest):
+    """NDJSON: una línea por etapa completada y la respuesta final."""
+    async def lines():
+        try:
+            async for msg in agent_manager.stream_rss_feed(req.rss_feed_url, req.target_lang,
+                                                           podcast_id=req.podcast_id, include_text=req.include_text,
+                                                           fields=req.fields):
+                if msg.get("progress"):
+                    yield json.dumps({"event": "progress", **msg["content"]}) + "\n"
+                else:
+                    yield json.dumps({"event": "result", "episodes": msg.get("content")}) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.post("/jobs")
+async def submit_podcast(req: PodcastRequest):
+    """Encola y responde con el job; el progreso llega por /jobs/{id}/events."""
+    try:
+        response = await agent_manager.submit_rss_feed(req.rss_feed_url, req.target_lang,
+                                                       podcast_id=req.podcast_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    content = response.get("content")
+    if not isinstance(content, dict):
+        raise HTTPException(status_code=422, detail=content)
+    return {**content, "events_url": f"/jobs/{content['job_id']}/events"}
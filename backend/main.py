@@ -1,36 +1,17 @@
 # backend/main.py
-import subprocess, sys, json
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI
+from api.podcast_endpoints import router as podcasts_router
+from api.job_events import router as jobs_router
+from api.catalog_endpoints import router as catalog_router
+from api.feed_endpoints import router as feeds_router
 
 app = FastAPI()
 
-class PodcastRequest(BaseModel):
-    rss_feed_url: str
-    target_lang: str = "es"
-
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
-@app.post("/podcasts")
-def create_podcast(req: PodcastRequest):
-    msg = {
-        "sender": "api",
-        "receiver": "orchestrator",
-        "content": req.rss_feed_url,
-        "target_lang": req.target_lang
-    }
-    proc = subprocess.run(
-        [sys.executable, "agents/orchestrator/agent_api_integrated.py"],
-        input=json.dumps(msg) + "\n",
-        text=True,
-        capture_output=True
-    )
-    if proc.returncode != 0:
-        raise HTTPException(status_code=500, detail=proc.stderr)
-    try:
-        response = json.loads(proc.stdout)
-        return {"episodes": response.get("content")}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Parse error: {proc.stdout}")
\ No newline at end of file
+app.include_router(podcasts_router)
+app.include_router(jobs_router)
+app.include_router(catalog_router)
+app.include_router(feeds_router)
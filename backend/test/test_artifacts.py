@@ -0,0 +1,102 @@
+"""
+Pruebas de los artefactos de texto (common/artifacts.py): ida y vuelta del
+Transcript comprimido, diccionarios por idioma y referencias de la cola.
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_artifacts.py
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+
+import zstandard  # noqa: E402
+
+from common import artifacts  # noqa: E402
+from common.artifacts import ORIGINAL, episode_key, load_text, load_transcript, save_transcript, text_ref  # noqa: E402
+from common.transcript import Transcript  # noqa: E402
+
+WORDS = ("the", "podcast", "episode", "today", "we", "talk", "about", "music", "science", "history",
+         "and", "with", "our", "guest", "who", "has", "written", "a", "book", "on", "it.")
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "STORAGE_DIR", str(tmp_path))
+    # Sin entrenamiento en segundo plano: las pruebas entrenan explícitamente
+    monkeypatch.setattr(artifacts, "start_training", lambda lang: None)
+    return tmp_path
+
+
+def transcript(seed, n=400, lang="en"):
+    rng = random.Random(seed)
+    words, starts, ends, speakers, t = [], [], [], [], 0
+    for _ in range(n):
+        t += rng.randint(80, 400)
+        words.append(rng.choice(WORDS))
+        starts.append(t)
+        t += rng.randint(100, 600)
+        ends.append(t)
+        speakers.append(rng.randint(0, 1))
+    return Transcript(lang, words, starts, ends, speakers, [0, n // 2])
+
+
+def assert_same(a, b):
+    assert a.to_dict() == b.to_dict()
+
+
+def test_round_trip_keeps_words_and_timings():
+    key = episode_key("https://example.com/1.mp3")
+    original = transcript(1)
+    save_transcript(key, original)
+    assert_same(load_transcript(key), original)
+    assert artifacts.list_languages(key) == [ORIGINAL]
+
+
+def test_text_ref_and_load_text():
+    key = episode_key("https://example.com/2.mp3")
+    translation = transcript(2, lang="es")
+    ref = text_ref(key, translation, "es")
+    assert ref["artifact"] == "es" and ref["lang"] == "es" and ref["chars"] == len(translation.text)
+    assert_same(load_text(key, ref), translation)
+    # Jobs anteriores a las referencias: el texto va en el propio resultado
+    assert load_text(key, {"text": "hola"}).text == "hola"
+    assert load_text(key, None) is None
+    assert load_text(key, {"artifact": "fr"}) is None
+
+
+def test_dictionary_training_keeps_old_artifacts_readable():
+    keys = [episode_key(f"https://example.com/{i}.mp3") for i in range(40)]
+    for i, key in enumerate(keys[:20]):
+        save_transcript(key, transcript(i))
+
+    first = artifacts.train_dictionary("en")
+    assert first
+    for i, key in enumerate(keys[20:30], start=20):
+        save_transcript(key, transcript(i))
+    with open(artifacts._artifact_path(keys[25], ORIGINAL), "rb") as f:
+        assert zstandard.get_frame_parameters(f.read()).dict_id == first
+
+    # Reentrenar no invalida los artefactos comprimidos con el diccionario anterior
+    assert artifacts.train_dictionary("en", if_missing=True) is None
+    assert artifacts.train_dictionary("en")
+    for i, key in enumerate(keys[:30]):
+        assert_same(load_transcript(key), transcript(i))
+
+
+@pytest.mark.parametrize("key", ["../../etc", "ABCDEF0123456789", "abc", ""])
+def test_invalid_keys_are_rejected(key):
+    with pytest.raises(ValueError):
+        save_transcript(key, transcript(0))
+    with pytest.raises(ValueError):
+        load_transcript(key)
+
+
+def test_invalid_languages_are_rejected():
+    key = episode_key("https://example.com/3.mp3")
+    with pytest.raises(ValueError):
+        save_transcript(key, transcript(0), "../x")
@@ -0,0 +1,77 @@
+"""
+Pruebas del catálogo (common/catalog.py): paginación por cursor.
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_catalog.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+
+from common.catalog import Catalog  # noqa: E402
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return Catalog(str(tmp_path / "catalog.db"))
+
+
+def entries(feed, n, same_day_every=3):
+    # Varios episodios con la misma fecha: el cursor desempata por id
+    return [{"audio_url": f"https://example.com/{feed}/{i}.mp3", "guid": f"{feed}-{i}", "title": f"{feed} {i}",
+             "published": f"Mon, {1 + i // same_day_every:02d} Jan 2024 10:00:00 +0000"} for i in range(n)]
+
+
+def all_pages(catalog, feed_url=None, limit=4):
+    guids, cursor = [], None
+    while True:
+        page = catalog.page_episodes(feed_url, limit, cursor)
+        guids += [item["guid"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return guids
+
+
+def test_keyset_pages_cover_every_episode_once_in_order(catalog):
+    catalog.index_feed("https://a.example/rss", entries("a", 10))
+    catalog.index_feed("https://b.example/rss", entries("b", 7))
+    guids = all_pages(catalog)
+    assert sorted(guids) == sorted([f"a-{i}" for i in range(10)] + [f"b-{i}" for i in range(7)])
+    assert len(guids) == len(set(guids))
+    listed = catalog.page_episodes(limit=100)["items"]
+    assert guids == [item["guid"] for item in listed]
+
+    assert all_pages(catalog, "https://b.example/rss", limit=3) == [f"b-{i}" for i in reversed(range(7))]
+
+
+def test_new_episodes_do_not_shift_later_pages(catalog):
+    catalog.index_feed("https://a.example/rss", entries("a", 6))
+    first = catalog.page_episodes(limit=3)
+    # Un episodio más reciente llega entre dos páginas
+    catalog.index_feed("https://a.example/rss", [{"audio_url": "https://example.com/new.mp3", "guid": "new",
+                                                  "published": "Mon, 01 Jul 2024 10:00:00 +0000"}])
+    second = catalog.page_episodes(limit=3, cursor=first["next_cursor"])
+    assert [item["guid"] for item in first["items"] + second["items"]] == [f"a-{i}" for i in reversed(range(6))]
+
+
+def test_keyset_page_seeks_the_index(catalog):
+    catalog.index_feed("https://a.example/rss", entries("a", 5))
+    cursor = catalog.page_episodes(limit=2)["next_cursor"]
+    sql = []
+    catalog.conn.set_trace_callback(sql.append)
+    catalog.page_episodes(limit=2, cursor=cursor)
+    catalog.page_episodes("https://a.example/rss", limit=2, cursor=cursor)
+    catalog.conn.set_trace_callback(None)
+    for statement in [s for s in sql if s.startswith("SELECT")]:
+        plan = " ".join(row[3] for row in catalog.conn.execute("EXPLAIN QUERY PLAN " + statement))
+        assert "SEARCH episodes USING" in plan
+        assert "TEMP B-TREE" not in plan
+
+
+def test_invalid_cursor_is_rejected(catalog):
+    with pytest.raises(ValueError):
+        catalog.page_episodes(cursor="not-a-cursor")
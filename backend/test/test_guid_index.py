@@ -0,0 +1,69 @@
+"""
+Pruebas del índice de GUIDs vistos (common/guid_index.py): pertenencia por
+feed y filtro de Bloom sin falsos negativos.
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_guid_index.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+
+from common.guid_index import GuidIndex  # noqa: E402
+
+BLOOM_BITS = 1 << 16
+
+
+def guids(prefix, n):
+    return [f"{prefix}-{i}" for i in range(n)]
+
+
+def test_contains_and_new_guids(tmp_path):
+    index = GuidIndex(str(tmp_path))
+    assert not index.known("feed")
+    index.add("feed", guids("a", 50))
+    assert index.known("feed") and index.count("feed") == 50
+    assert index.new_guids("feed", ["a-3", "b-1", "a-49", "b-2"]) == ["b-1", "b-2"]
+    # Los feeds no comparten GUIDs
+    assert index.new_guids("other", ["a-3"]) == ["a-3"]
+
+
+def test_bloom_has_no_false_negatives(tmp_path):
+    index = GuidIndex(str(tmp_path), bloom_bits=BLOOM_BITS)
+    index.add("feed", guids("a", 500))
+    index.add("feed", guids("b", 500))
+    seen = guids("a", 500) + guids("b", 500)
+    assert index.contains("feed", seen).all()
+    assert not index.contains("feed", guids("c", 500)).any()
+
+
+def test_bloom_covers_guids_written_without_it(tmp_path):
+    reader = GuidIndex(str(tmp_path), bloom_bits=BLOOM_BITS)
+    reader.add("feed", guids("a", 100))
+    assert reader.contains("feed", guids("a", 100)).all()
+
+    # Otro proceso sin GUID_BLOOM_BITS añade GUIDs sin tocar el filtro
+    GuidIndex(str(tmp_path), bloom_bits=0).add("feed", guids("b", 100))
+    assert reader.contains("feed", guids("a", 100) + guids("b", 100)).all()
+
+    # Si el lector escribe sobre una versión ajena, vuelca también lo que faltaba
+    GuidIndex(str(tmp_path), bloom_bits=0).add("feed", guids("c", 100))
+    reader.add("feed", guids("d", 100))
+    assert reader.contains("feed", guids("c", 100) + guids("d", 100)).all()
+
+
+def test_bloom_created_after_the_index(tmp_path):
+    GuidIndex(str(tmp_path)).add("feed", guids("a", 200))
+    index = GuidIndex(str(tmp_path), bloom_bits=BLOOM_BITS)
+    assert index.contains("feed", guids("a", 200)).all()
+
+
+def test_migrates_legacy_state(tmp_path):
+    with open(tmp_path / "last_check_feed.json", "w") as f:
+        f.write('{"episodes": ["x", "y"]}')
+    index = GuidIndex(str(tmp_path))
+    assert index.known("feed")
+    assert index.new_guids("feed", ["x", "y", "z"]) == ["z"]
+    assert not os.path.exists(tmp_path / "last_check_feed.json")
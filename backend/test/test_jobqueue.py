@@ -0,0 +1,149 @@
+"""
+Pruebas de la cola de jobs (common/jobqueue.py): leases, checkpoints,
+reintentos y reparto justo entre tenants.
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_jobqueue.py
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+
+from common.jobqueue import FAILED, JobQueue, LeaseLost  # noqa: E402
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def enqueue(queue, n, tenant="t", **kwargs):
+    return [queue.enqueue(f"{tenant}-{i}", f"https://example.com/{tenant}/{i}.mp3", tenant=tenant, **kwargs)
+            for i in range(n)]
+
+
+def test_claim_takes_lease(queue):
+    job_id, = enqueue(queue, 1)
+    job = queue.claim("w1")
+    assert job["id"] == job_id
+    assert job["lease_owner"] == "w1"
+    # Con el lease vigente nadie más lo reclama
+    assert queue.claim("w2") is None
+
+
+def test_complete_stage_checkpoints_and_advances(queue):
+    enqueue(queue, 1)
+    job = queue.claim("w1")
+    queue.complete_stage(job, "transcribe", {"text": "hola"})
+    assert job["state"] == "transcribed"
+    stored = queue.get(job["id"])
+    assert stored["state"] == "transcribed"
+    assert stored["results"]["transcribe"] == {"text": "hola"}
+
+
+def test_fail_backs_off_then_fails(queue):
+    enqueue(queue, 1)
+    job = queue.claim("w1")
+    queue.fail(job, "boom", max_attempts=2)
+    assert job["attempts"] == 1 and job["state"] == "pending"
+    # En backoff: no se puede reclamar todavía
+    assert queue.claim("w1") is None
+
+    job = queue.claim_job(job["id"], "w1")
+    queue.fail(job, "boom", max_attempts=2)
+    assert queue.get(job["id"])["state"] == FAILED
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_loses_it(queue):
+    enqueue(queue, 1)
+    old = queue.claim("w1", lease_s=0.05)
+    time.sleep(0.1)
+    new = queue.claim("w2")
+    assert new["id"] == old["id"]
+
+    with pytest.raises(LeaseLost):
+        queue.complete_stage(old, "transcribe", {"text": "tarde"})
+    with pytest.raises(LeaseLost):
+        queue.fail(old, "tarde")
+    assert old["state"] == "pending" and "transcribe" not in old["results"]
+    assert not queue.renew(old)
+
+    # El antiguo dueño no suelta el lease del nuevo
+    queue.release(old)
+    assert queue.claim("w3") is None
+    queue.complete_stage(new, "transcribe", {"text": "a tiempo"})
+    assert queue.get(new["id"])["results"]["transcribe"] == {"text": "a tiempo"}
+
+
+def test_keep_lease_renews_during_long_stage(queue):
+    enqueue(queue, 1)
+    job = queue.claim("w1", lease_s=0.2)
+    with queue.keep_lease(job, lease_s=0.2, every=0.05):
+        time.sleep(0.5)
+        assert queue.claim("w2") is None
+    queue.complete_stage(job, "transcribe", {})
+
+
+def claim_tenants(queue, n):
+    """
+    Tenant de cada uno de ``n`` claims de jobs ``pending``; cada job avanza y
+    se suelta para no topar con max_running.
+    """
+    order = []
+    for i in range(n):
+        job = queue.claim(f"w{i}", states=["pending"])
+        order.append(job["tenant"])
+        queue.complete_stage(job, "transcribe", {})
+        queue.release(job)
+    return order
+
+
+def test_charge_shares_equally_between_equal_tenants(queue):
+    enqueue(queue, 20, tenant="a")
+    enqueue(queue, 20, tenant="b")
+    order = claim_tenants(queue, 20)
+    assert abs(order.count("a") - order.count("b")) <= 2
+    # Ningún tenant acapara la cola: nunca más de dos seguidos del mismo
+    assert all(order[i:i + 3] not in (["a"] * 3, ["b"] * 3) for i in range(len(order)))
+
+
+def test_charge_shares_by_weight(queue):
+    queue.set_tenant("heavy", weight=2)
+    queue.set_tenant("light", weight=1)
+    enqueue(queue, 30, tenant="heavy")
+    enqueue(queue, 30, tenant="light")
+    order = claim_tenants(queue, 30)
+    assert abs(order.count("heavy") - 20) <= 1
+    assert abs(order.count("light") - 10) <= 1
+
+
+def test_migrates_not_null_podcast_id(tmp_path):
+    import sqlite3
+    path = str(tmp_path / "jobs.db")
+    # Esquema de las primeras versiones de la cola
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            episode_key TEXT NOT NULL, target_lang TEXT NOT NULL, feed_url TEXT, audio_url TEXT NOT NULL,
+            title TEXT, podcast_id INTEGER NOT NULL DEFAULT 1, voice_id TEXT,
+            priority REAL NOT NULL DEFAULT 0, state TEXT NOT NULL DEFAULT 'pending',
+            results TEXT NOT NULL DEFAULT '{}', attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT,
+            lease_owner TEXT, lease_expires REAL NOT NULL DEFAULT 0, not_before REAL NOT NULL DEFAULT 0,
+            created REAL NOT NULL, updated REAL NOT NULL, UNIQUE (episode_key, target_lang));
+        INSERT INTO jobs (episode_key, target_lang, audio_url, podcast_id, created, updated)
+        VALUES ('old', 'es', 'https://example.com/old.mp3', 7, 0, 0);
+    """)
+    conn.close()
+
+    queue = JobQueue(path)
+    old = queue.get(1)
+    assert old["episode_key"] == "old" and old["podcast_id"] == 7 and old["tenant"] == "podcast:7"
+    job_id = queue.enqueue("new", "https://example.com/new.mp3", podcast_id=None, tenant="t")
+    assert job_id == 2 and queue.get(job_id)["podcast_id"] is None
+    assert queue.claim("w1")["id"] == 1
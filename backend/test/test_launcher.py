@@ -0,0 +1,92 @@
+"""
+Pruebas del lanzador de agentes (common/launcher.py).
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_launcher.py
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+AGENTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents")
+sys.path.insert(0, AGENTS_DIR)
+
+from common import launcher  # noqa: E402
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="el lanzador usa fork")
+
+
+def serve(path, idle):
+    return subprocess.Popen(
+        [sys.executable, "-m", "common.launcher", "serve", "--socket", path, "--idle", str(idle)],
+        cwd=AGENTS_DIR, env={**os.environ, "AGENT_PRELOAD": "json"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until(check, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    # Las rutas de socket Unix tienen un límite de longitud
+    path = os.path.join(str(tmp_path), "l.sock")
+    monkeypatch.setattr(launcher, "AGENT_LAUNCHER_SOCKET", path)
+    return path
+
+
+def test_launch_runs_agent_with_pipes(socket_path, tmp_path):
+    agent = tmp_path / "echo_agent.py"
+    agent.write_text("import sys\nprint(sys.stdin.readline().strip().upper())\n")
+    server = serve(socket_path, idle=30)
+    try:
+        assert wait_until(lambda: launcher.status(socket_path) is not None)
+        proc = launcher.spawn_agent(str(agent), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        assert isinstance(proc, launcher.LaunchedProcess)
+        stdout, _ = proc.communicate("hola\n", timeout=10)
+        assert stdout.strip() == "HOLA"
+        assert proc.returncode == 0
+    finally:
+        server.kill()
+        server.wait()
+
+
+def test_server_restarts_after_idle_while_agent_still_runs(socket_path, tmp_path):
+    agent = tmp_path / "slow_agent.py"
+    agent.write_text("import time\ntime.sleep(30)\n")
+    first = serve(socket_path, idle=0.5)
+    proc = None
+    second = None
+    try:
+        assert wait_until(lambda: launcher.status(socket_path) is not None)
+        proc = launcher.spawn_agent(str(agent), stdout=subprocess.DEVNULL)
+        assert isinstance(proc, launcher.LaunchedProcess)
+
+        # El servidor termina por inactividad con el agente todavía vivo...
+        assert first.wait(timeout=10) == 0
+        assert proc.poll() is None
+        # ...y ni el agente ni su supervisor retienen el cerrojo
+        assert not launcher._server_running(socket_path)
+
+        second = serve(socket_path, idle=30)
+        assert wait_until(lambda: launcher.status(socket_path) is not None)
+        assert launcher.status(socket_path)["pid"] == second.pid
+    finally:
+        if proc is not None:
+            proc.kill()
+            proc.wait(timeout=10)
+        for server in (first, second):
+            if server is not None and server.poll() is None:
+                server.send_signal(signal.SIGKILL)
+                server.wait()
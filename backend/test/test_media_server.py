@@ -0,0 +1,55 @@
+"""
+Pruebas del servidor de media (api/media_server.py): qué rutas se publican.
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_media_server.py
+"""
+
+import http.client
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "api"))
+
+import media_server  # noqa: E402
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    for rel in ("audio/ab/cd/abcd.mp3", "subtitles/k/en.vtt", "artifacts/k/transcript.json.zst",
+                "prefetch/ab/abcd.mp3", "top.mp3"):
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"data")
+    monkeypatch.setattr(media_server.MediaHandler, "root", os.path.realpath(str(tmp_path)))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), media_server.MediaHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def status(port, path):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request("GET", path)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.status
+
+
+@pytest.mark.parametrize("path", ["/media/audio/ab/cd/abcd.mp3", "/media/subtitles/k/en.vtt"])
+def test_public_media_is_served(server, path):
+    assert status(server, path) == 200
+
+
+@pytest.mark.parametrize("path", ["/media/artifacts/k/transcript.json.zst", "/media/prefetch/ab/abcd.mp3",
+                                  "/media/top.mp3", "/media/audio/../artifacts/k/transcript.json.zst",
+                                  "/media/%2e%2e/etc/passwd"])
+def test_everything_else_is_not_found(server, path):
+    assert status(server, path) == 404
@@ -0,0 +1,91 @@
+"""
+Pruebas de la descarga anticipada (common/prefetch.py): la transcripción no
+descarga dos veces y los descartes durante una descarga no dejan ficheros.
+
+Ejecutar desde backend/:
+  python -m pytest -q test/test_prefetch.py
+"""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+
+from common import prefetch  # noqa: E402
+from common.prefetch import DOWNLOADING, Prefetcher, Throttle  # noqa: E402
+
+AUDIO = b"ID3" + b"\0" * 4096
+
+
+class AudioHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(AUDIO)))
+        self.end_headers()
+        self.wfile.write(AUDIO)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url(tmp_path, monkeypatch):
+    monkeypatch.setattr(prefetch, "STORAGE_DIR", str(tmp_path / "storage"))
+    AudioHandler.requests = 0
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), AudioHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/episode.mp3"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def prefetcher(tmp_path):
+    return Prefetcher(str(tmp_path / "prefetch.db"))
+
+
+def test_resolve_claims_and_downloads_queued_audio(prefetcher, url):
+    prefetcher.request([url])
+    path = prefetcher.resolve(url, wait=5)
+    assert path is not None
+    with open(path, "rb") as f:
+        assert f.read() == AUDIO
+    # Ya descargado: ni el worker ni otra consulta lo vuelven a pedir
+    assert prefetcher.claim() is None
+    assert prefetcher.resolve(url, wait=5) == path
+    assert AudioHandler.requests == 1
+
+
+def test_resolve_without_prefetch_returns_none(prefetcher, url):
+    assert prefetcher.resolve(url, wait=5) is None
+    assert AudioHandler.requests == 0
+
+
+def test_discard_during_download_removes_file_when_done(prefetcher, url):
+    prefetcher.request([url])
+    job = prefetcher.claim()
+    assert job["state"] == "queued" and prefetcher.get(url)["state"] == DOWNLOADING
+
+    prefetcher.discard(url)
+    assert prefetcher.get(url)["discard"] == 1
+
+    prefetcher.download(job, Throttle(0))
+    assert prefetcher.get(url) is None
+    assert not os.path.exists(job["path"])
+    assert not os.path.exists(job["path"] + ".part")
+
+
+def test_discard_removes_downloaded_file(prefetcher, url):
+    prefetcher.request([url])
+    path = prefetcher.resolve(url, wait=5)
+    prefetcher.discard(url)
+    assert prefetcher.get(url) is None
+    assert not os.path.exists(path)
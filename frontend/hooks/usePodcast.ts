@@ -1,4 +1,7 @@
+import { useEffect, useState } from 'react';
 import { useApp } from 'contexts/appContext';
+import { fetchJobText, subscribeToJobEvents } from 'services/api';
+import type { JobEvent, JobProgress } from 'types';
 
 export function usePodcasts() {
   const { 
@@ -19,4 +22,46 @@ export function usePodcasts() {
       await Promise.all([fetchPodcasts(), fetchTranslations()]);
     },
   };
-}
\ No newline at end of file
+}
+
+const INITIAL_PROGRESS: JobProgress = { stage: null, percent: 0, finished: false };
+
+function applyEvent(progress: JobProgress, { event, data }: JobEvent): JobProgress {
+  const next: JobProgress = { ...progress, stage: event };
+  if (data.percent !== undefined) next.percent = data.percent;
+  if (data.chunk) {
+    // Bloques traducidos a medida que llegan
+    next.translation = progress.translation ? `${progress.translation}\n\n${data.chunk}` : data.chunk;
+  }
+  if (data.audio_url) next.audioUrl = data.audio_url;
+  if (data.error) next.error = data.error;
+  if (event === 'transcribed' || event === 'translated' || event === 'synthesized') next.percent = 100;
+  if (event === 'done' || event === 'failed') next.finished = true;
+  return next;
+}
+
+// Progreso en vivo de un episodio: etapa, porcentaje y resultados parciales
+export function usePodcastJob(jobId: number | null) {
+  const [progress, setProgress] = useState<JobProgress>(INITIAL_PROGRESS);
+
+  useEffect(() => {
+    setProgress(INITIAL_PROGRESS);
+    if (jobId === null) return;
+    let active = true;
+    const unsubscribe = subscribeToJobEvents(jobId, (event) => {
+      setProgress((current) => applyEvent(current, event));
+      // 'transcribed' solo trae la referencia: el texto se pide aparte
+      if (event.event === 'transcribed') {
+        fetchJobText(jobId, 'transcript')
+          .then(({ text }) => active && setProgress((current) => ({ ...current, transcript: text })))
+          .catch(() => undefined);
+      }
+    });
+    return () => {
+      active = false;
+      unsubscribe();
+    };
+  }, [jobId]);
+
+  return progress;
+}
@@ -1,4 +1,4 @@
-import type { User } from "types";
+import type { JobEvent, JobEventName, JobText, PodcastJob, User } from "types";
 
 const API_BASE_URL = 'http://localhost:5555';
 
@@ -107,6 +107,63 @@ export async function createPodcast(podcastData: {
   return response.json();
 }
 
+// Encola el episodio y devuelve el job; el progreso se sigue con subscribeToJobEvents
+export async function submitPodcastJob(podcastData: {
+  rss_feed_url: string;
+  target_lang?: string;
+}): Promise<PodcastJob> {
+  const response = await fetchWithAuth('/podcasts/jobs', {
+    method: 'POST',
+    body: JSON.stringify(podcastData),
+  });
+  return response.json();
+}
+
+// Texto completo de la transcripción o la traducción de un job (los eventos solo traen la referencia)
+export async function fetchJobText(jobId: number, kind: 'transcript' | 'translation'): Promise<JobText> {
+  const response = await fetchWithAuth(`/jobs/${jobId}/${kind}`);
+  return response.json();
+}
+
+const JOB_EVENT_NAMES: JobEventName[] = [
+  'detected',
+  'transcribing',
+  'transcribed',
+  'translating',
+  'translated',
+  'synthesizing',
+  'synthesized',
+  'subtitling',
+  'done',
+  'retrying',
+  'failed',
+];
+
+// Eventos SSE de un job; devuelve la función para cerrar la suscripción.
+// EventSource reconecta solo y reanuda desde el último id recibido.
+export function subscribeToJobEvents(
+  jobId: number,
+  onEvent: (event: JobEvent) => void,
+): () => void {
+  const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events`);
+
+  JOB_EVENT_NAMES.forEach((name) => {
+    source.addEventListener(name, (e) => {
+      const message = e as MessageEvent;
+      onEvent({
+        id: message.lastEventId ? Number(message.lastEventId) : null,
+        event: name,
+        data: JSON.parse(message.data),
+      });
+      if (name === 'done' || name === 'failed') {
+        source.close();
+      }
+    });
+  });
+
+  return () => source.close();
+}
+
 export async function validateRssFeed(url: string) {
   const response = await fetchWithAuth('/podcasts/validate-rss', {
     method: 'POST',
@@ -64,3 +64,60 @@ export interface AppState {
   isLoading: boolean;
   error: string | null;
 }
+
+export type JobEventName =
+  | 'detected'
+  | 'transcribing'
+  | 'transcribed'
+  | 'translating'
+  | 'translated'
+  | 'synthesizing'
+  | 'synthesized'
+  | 'subtitling'
+  | 'done'
+  | 'retrying'
+  | 'failed';
+
+// Referencia a un texto guardado en el servidor (se pide con fetchJobText)
+export interface TextRef {
+  lang: string;
+  chars: number;
+  url?: string;
+}
+
+export interface JobText {
+  job_id: number;
+  lang: string;
+  text: string;
+}
+
+export interface JobEvent {
+  id: number | null;
+  event: JobEventName;
+  data: {
+    percent?: number;
+    transcript?: TextRef;
+    chunk?: string;
+    translation?: TextRef;
+    audio_url?: string;
+    error?: string;
+    [key: string]: any;
+  };
+}
+
+export interface PodcastJob {
+  job_id: number;
+  episode_key: string;
+  state: string;
+  events_url: string;
+}
+
+export interface JobProgress {
+  stage: JobEventName | null;
+  percent: number;
+  transcript?: string;
+  translation?: string;
+  audioUrl?: string;
+  error?: string;
+  finished: boolean;
+}